@@ -0,0 +1,153 @@
+"""
+Shared fixtures for the benchmark suite: synthetic price history, a mocked yfinance
+provider with configurable latency, a local SMTP sink and a measuring harness that
+reports wall time, peak memory and rows/sec per benchmarked path.
+
+Run with: uv run pytest benchmarks/ -s
+Compare against a previous run with --bench-json new.json --bench-baseline old.json.
+"""
+
+import gc
+import json
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from merkato.smtp_sink import SmtpSink
+
+HOURS_PER_YEAR = 24 * 365
+
+
+def synthetic_prices(n_symbols, hours, end=None, seed=42):
+    """Hourly random-walk prices for ``n_symbols`` symbols over ``hours`` hours, sorted by time"""
+    end = end or datetime.now()
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(end=end, periods=hours, freq="h").astype("datetime64[us]")
+    symbols = pd.Categorical([f"SYM{i:04d}" for i in range(n_symbols)])
+    steps = rng.normal(0, 0.01, size=(hours, n_symbols))
+    prices = 100 * np.exp(np.cumsum(steps, axis=0))
+    return pd.DataFrame(
+        {
+            "timestamp": np.repeat(timestamps, n_symbols),
+            "symbol": pd.Categorical.from_codes(np.tile(np.arange(n_symbols), hours), symbols.categories),
+            "price": prices.ravel(),
+        }
+    )
+
+
+def write_history(root, df):
+    """Write a synthetic frame as yearly ``<root>/<year>.csv`` files, like the monitor does"""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    out = df.assign(timestamp=df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S"))
+    for year, rows in out.groupby(df["timestamp"].dt.year):
+        rows.to_csv(root / f"{year}.csv", index=False)
+    return root
+
+
+class FakeYahoo:
+    """Stands in for ``yf.download``: random closes after ``latency`` seconds per call"""
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def download(self, symbols, **kwargs):
+        with self.lock:
+            self.calls += 1
+            prices = 100 + self.rng.random(len(symbols)) * 10
+        time.sleep(self.latency)
+        columns = pd.MultiIndex.from_product([["Close"], symbols], names=["Price", "Ticker"])
+        return pd.DataFrame([prices], index=pd.DatetimeIndex([pd.Timestamp.now().normalize()]), columns=columns)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("merkato benchmarks")
+    group.addoption("--bench-json", help="write the benchmark results to this JSON file")
+    group.addoption("--bench-baseline", help="fail benchmarks whose rows/sec drop below this JSON baseline")
+    group.addoption("--bench-tolerance", type=float, default=0.5, help="allowed rows/sec drop vs the baseline")
+
+
+RESULTS = []
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    path = request.config.getoption("--bench-baseline")
+    if not path:
+        return {}
+    return {result["name"]: result for result in json.loads(Path(path).read_text())}
+
+
+@pytest.fixture
+def measure(request, baseline):
+    """Run ``func`` and record wall time (best of ``rounds``), peak traced memory and rows/sec
+
+    With ``max_wall``, the benchmark fails when its best wall time exceeds that many seconds.
+    """
+    tolerance = request.config.getoption("--bench-tolerance")
+
+    def run(name, func, rows, rounds=1, max_wall=None):
+        wall = float("inf")
+        for _ in range(rounds):
+            gc.collect()
+            start = time.perf_counter()
+            result = func()
+            wall = min(wall, time.perf_counter() - start)
+
+        # Separate traced run, so tracemalloc overhead does not skew the timing
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        entry = {"name": name, "wall": wall, "peak_mb": peak / 2**20, "rows": rows, "rows_per_sec": rows / wall}
+        RESULTS.append(entry)
+        print(f"\n{name}: {wall:.3f}s, peak {entry['peak_mb']:.1f} MiB, {entry['rows_per_sec']:,.0f} rows/s")
+
+        if max_wall is not None and wall > max_wall:
+            pytest.fail(f"{name} took {wall:.3f}s, above its {max_wall:.3f}s bound")
+        previous = baseline.get(name)
+        if previous and entry["rows_per_sec"] < previous["rows_per_sec"] * (1 - tolerance):
+            pytest.fail(
+                f"{name} regressed: {entry['rows_per_sec']:,.0f} rows/s vs baseline {previous['rows_per_sec']:,.0f}"
+            )
+        return result
+
+    return run
+
+
+@pytest.fixture
+def fake_yahoo():
+    return FakeYahoo()
+
+
+@pytest.fixture
+def smtp_sink():
+    with SmtpSink() as sink:
+        yield sink
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not RESULTS:
+        return
+    terminalreporter.section("merkato benchmarks")
+    terminalreporter.write_line(f"{'path':<55} {'wall s':>9} {'peak MiB':>9} {'rows/s':>14}")
+    for entry in RESULTS:
+        terminalreporter.write_line(
+            f"{entry['name']:<55} {entry['wall']:>9.3f} {entry['peak_mb']:>9.1f} {entry['rows_per_sec']:>14,.0f}"
+        )
+    path = config.getoption("--bench-json")
+    if path:
+        Path(path).write_text(json.dumps(RESULTS, indent=2) + "\n")
@@ -0,0 +1,38 @@
+"""
+Benchmark for the weekly report analytics: pivot, risk metrics and correlations.
+"""
+
+import pytest
+from conftest import synthetic_prices
+
+from merkato.analytics import AnalyticsSettings, analyze
+
+# The README promises a thousand symbols "well under a second" on a single process
+MAX_WALL = {100: 0.25, 1000: 1.0}
+
+
+@pytest.mark.parametrize("n_symbols", [100, 1000])
+def test_analyze_scaling(measure, n_symbols):
+    """Volatility, drawdown, moving averages and the correlation matrix over 90 days of hourly prices"""
+    df = synthetic_prices(n_symbols, 90 * 24)
+
+    metrics, correlations = measure(
+        f"analyze[{n_symbols} symbols x 90d]", lambda: analyze(df), len(df), rounds=3, max_wall=MAX_WALL[n_symbols]
+    )
+
+    assert len(metrics) == n_symbols
+    assert correlations.shape == (n_symbols, n_symbols)
+
+
+def test_analyze_process_pool(measure):
+    """The same metrics chunked across a process pool, for comparison with the single-process run
+
+    At this size the pivot and correlations dominate and the chunks are pickled to each
+    worker, so the pool is no faster; that is why ``workers`` defaults to 1.
+    """
+    df = synthetic_prices(1000, 90 * 24)
+    settings = AnalyticsSettings(workers=4, chunk_size=250)
+
+    metrics, _ = measure("analyze[1000 symbols x 90d, 4 processes]", lambda: analyze(df, settings), len(df))
+
+    assert len(metrics) == 1000
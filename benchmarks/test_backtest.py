@@ -0,0 +1,26 @@
+"""
+Benchmark for backtesting: a sweep of threshold variants over years of hourly history.
+"""
+
+import pytest
+from conftest import HOURS_PER_YEAR, synthetic_prices
+
+from merkato.backtest import backtest, parse_sweep
+
+
+@pytest.mark.parametrize("n_thresholds", [100, 1000])
+def test_backtest_sweep(measure, n_thresholds):
+    """Threshold sweep per symbol over three years of hourly history for 10 symbols"""
+    df = synthetic_prices(10, 3 * HOURS_PER_YEAR)
+    step = 100 / n_thresholds
+    rules = [
+        rule for symbol in df["symbol"].cat.categories for rule in parse_sweep(f"{symbol}:<=:50:{150 - step}:{step}")
+    ]
+
+    results, _ = measure(
+        f"backtest_sweep[10 symbols x 3y, {n_thresholds} thresholds]",
+        lambda: backtest(df, rules),
+        len(df) * n_thresholds,
+    )
+
+    assert len(results) == len(rules)
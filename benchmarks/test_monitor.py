@@ -0,0 +1,78 @@
+"""
+Benchmarks for the monitor hot paths: a full check against a mocked yfinance provider
+and loading the recorded price history.
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from conftest import HOURS_PER_YEAR, synthetic_prices, write_history
+
+from merkato.stock_monitor import check_and_record_prices
+from merkato.util import load_or_create_data, load_prices
+
+
+def monitor_config(root, n_symbols):
+    return {
+        "fetch": {"max_workers": 4, "batch_size": 50, "backoff_base": 0.0},
+        "storage": {"root": str(root / "data"), "rollups": str(root / "rollups.sqlite")},
+        "alerts": {"state_file": str(root / "alert_state.json")},
+        "cache": {"enabled": False},
+        # Half of the symbols meet their target on every check
+        "stocks": [
+            {"symbol": f"SYM{i:04d}", "target_price": 105.0, "exchange": "XNYS" if i % 2 else "XSWX"}
+            for i in range(n_symbols)
+        ],
+    }
+
+
+@pytest.mark.parametrize("latency", [0.0, 0.05])
+@pytest.mark.parametrize("n_symbols", [50, 500])
+def test_check_and_record_prices(measure, fake_yahoo, tmp_path, n_symbols, latency):
+    """One monitor run: fetch, evaluate rules, append rows and update the rollups"""
+    fake_yahoo.latency = latency
+    config = monitor_config(tmp_path, n_symbols)
+    write_history(tmp_path / "data", synthetic_prices(n_symbols, 24 * 7))
+
+    # Markets may be closed while the benchmark runs; check every symbol regardless
+    with (
+        patch("merkato.stock_monitor.yf.download", side_effect=fake_yahoo.download),
+        patch("merkato.stock_monitor.select_due_stocks", side_effect=lambda stocks, *args: stocks),
+    ):
+        measure(
+            f"check_and_record_prices[{n_symbols} symbols, {latency * 1000:.0f}ms latency]",
+            lambda: check_and_record_prices(config),
+            n_symbols,
+        )
+
+    assert fake_yahoo.calls >= 2 * -(-n_symbols // 50)
+
+
+@pytest.mark.parametrize("n_symbols", [10, 100])
+def test_load_or_create_data(measure, tmp_path, monkeypatch, n_symbols):
+    """Full read of the current year's CSV"""
+    monkeypatch.chdir(tmp_path)
+    df = synthetic_prices(n_symbols, HOURS_PER_YEAR, end=datetime(datetime.now().year, 12, 31))
+    write_history(tmp_path / "data", df[df["timestamp"].dt.year == datetime.now().year])
+
+    loaded = measure(f"load_or_create_data[{n_symbols} symbols x 1y]", load_or_create_data, len(df), rounds=3)
+
+    assert len(loaded) > 0
+
+
+@pytest.mark.parametrize("n_symbols", [10, 100])
+def test_load_prices_last_week(measure, tmp_path, n_symbols):
+    """Range read of the last 7 days out of three years of history"""
+    df = synthetic_prices(n_symbols, 3 * HOURS_PER_YEAR)
+    config = {"storage": {"root": str(write_history(tmp_path / "data", df))}}
+    start = df["timestamp"].max() - timedelta(days=7)
+
+    week = measure(
+        f"load_prices[{n_symbols} symbols x 3y, last 7 days]",
+        lambda: load_prices(start=start, config=config),
+        len(df),
+        rounds=3,
+    )
+
+    assert len(week) >= 7 * 24 * n_symbols
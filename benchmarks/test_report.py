@@ -0,0 +1,33 @@
+"""
+Benchmark for the weekly report: range read, trends, rollup-backed long-term trends and
+delivery to a local SMTP sink.
+"""
+
+from unittest.mock import patch
+
+import pytest
+from conftest import HOURS_PER_YEAR, synthetic_prices, write_history
+
+from merkato.rollups import open_rollups
+from merkato.util import close_dispatchers
+from merkato.weekly_report import send_weekly_report
+
+
+@pytest.mark.parametrize("n_symbols", [10, 100])
+def test_send_weekly_report(measure, smtp_sink, tmp_path, n_symbols):
+    """Weekly report over two years of hourly history, with warm rollups"""
+    df = synthetic_prices(n_symbols, 2 * HOURS_PER_YEAR)
+    config = {
+        "email": smtp_sink.email_config,
+        "storage": {"root": str(write_history(tmp_path / "data", df)), "rollups": str(tmp_path / "rollups.sqlite")},
+        "stocks": [{"symbol": symbol, "target_price": 100.0} for symbol in df["symbol"].cat.categories],
+    }
+    # Build the rollup cache once, as the hourly monitor runs would have
+    open_rollups(config).close()
+
+    with patch.dict("merkato.util._dispatchers", clear=True):
+        measure(f"send_weekly_report[{n_symbols} symbols x 2y]", lambda: send_weekly_report(config), len(df))
+        close_dispatchers()
+
+    assert len(smtp_sink.messages) == 2
+    assert smtp_sink.connections == 1
@@ -0,0 +1,24 @@
+"""
+Benchmark for loading recorded history: parsing the yearly CSV files versus mapping the
+binary tick files.
+"""
+
+import pytest
+from conftest import HOURS_PER_YEAR, synthetic_prices, write_history
+
+from merkato.storage import CsvStore, TickStore
+
+
+@pytest.mark.parametrize("backend", ["csv", "ticks"])
+def test_read_history(measure, tmp_path, backend):
+    """Full read of three years of hourly history for 100 symbols"""
+    df = synthetic_prices(100, 3 * HOURS_PER_YEAR)
+    if backend == "csv":
+        store = CsvStore(write_history(tmp_path / "data", df))
+    else:
+        store = TickStore(tmp_path / "ticks")
+        store.write(df)
+
+    result = measure(f"read_history[{backend}, 100 symbols x 3y]", store.read, len(df))
+
+    assert len(result) == len(df)
@@ -0,0 +1,37 @@
+"""
+Scaling benchmark for the weekly trend computation.
+Run with: uv run pytest benchmarks/ -s
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import HOURS_PER_YEAR, synthetic_prices
+
+from merkato.weekly_report import calculate_trends, calculate_weekly_trends
+
+
+@pytest.mark.parametrize("n_symbols", [10, 100, 1000])
+def test_calculate_trends_scaling(measure, n_symbols):
+    """Vectorized trends over one year of hourly data"""
+    df = synthetic_prices(n_symbols, HOURS_PER_YEAR)
+
+    trends = measure(f"calculate_trends[{n_symbols} symbols x 1y]", lambda: calculate_trends(df), len(df), rounds=3)
+
+    assert len(trends) == n_symbols
+
+
+def test_calculate_weekly_trends_per_symbol(measure):
+    """The per-symbol helper the report used before, for comparison with calculate_trends"""
+    df = synthetic_prices(100, HOURS_PER_YEAR)
+    since = datetime.now() - timedelta(days=7)
+    symbols = df["symbol"].cat.categories
+
+    trends = measure(
+        "calculate_weekly_trends[100 symbols x 1y, per symbol]",
+        lambda: [calculate_weekly_trends(df, symbol) for symbol in symbols],
+        len(df),
+    )
+    vectorized = calculate_trends(df, since)
+
+    assert len(trends) == len(vectorized) == 100
@@ -0,0 +1,125 @@
+"""
+Merkato: Alert State
+Persistent per-rule alert state, so an alert fires on transitions (or configured
+re-notify intervals) instead of on every tick while its condition holds.
+"""
+
+import json
+import os
+from dataclasses import dataclass, fields
+from datetime import datetime
+from pathlib import Path
+
+ALERT_STATE_FILE = "data/alert_state.json"
+
+
+@dataclass
+class AlertSettings:
+    """Alert policy from the "alerts" section of config.json; stocks may override each key
+
+    Intervals are in seconds and ``hysteresis`` is a percentage of the target price the
+    price must move back past before a fired rule re-arms.
+    """
+
+    renotify_interval: float | None = None
+    cooldown: float = 0.0
+    hysteresis: float = 0.0
+    state_file: str = ALERT_STATE_FILE
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("alerts", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown alert settings: {', '.join(sorted(unknown))}")
+        return cls(**section)
+
+
+def _rearmed(rule, price, hysteresis):
+    """Whether the price moved back past the hysteresis band around a price rule's target"""
+    if rule.kind != "price":
+        return True
+    band = abs(rule.value) * hysteresis / 100
+    if rule.operator in ("<", "<="):
+        return price > rule.value + band
+    return price < rule.value - band
+
+
+class AlertState:
+    """Rule states keyed by rule id, held in a dict for O(1) lookups and saved as JSON"""
+
+    def __init__(self, settings=None, states=None):
+        self.settings = settings or AlertSettings()
+        self.states = states or {}
+        # symbol -> ids of its active rules, so ticks only revisit rules that may re-arm
+        self.active = {}
+        for key, state in self.states.items():
+            if state["active"]:
+                self.active.setdefault(key.split("|", 1)[0], set()).add(key)
+
+    @classmethod
+    def load(cls, config):
+        settings = AlertSettings.from_config(config)
+        path = Path(settings.state_file)
+        states = json.loads(path.read_text()) if path.exists() else {}
+        return cls(settings, states)
+
+    def save(self):
+        """Atomically write the state file"""
+        path = Path(self.settings.state_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.states, f, indent=2, sort_keys=True)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def setting(self, rule, name):
+        return rule.options.get(name, getattr(self.settings, name))
+
+    def _set_active(self, rule, state, active):
+        state["active"] = active
+        keys = self.active.setdefault(rule.symbol, set())
+        if active:
+            keys.add(rule.id)
+        else:
+            keys.discard(rule.id)
+
+    def update(self, rule, price, condition_met, when):
+        """Record an evaluation of ``rule`` and return whether to notify"""
+        state = self.states.get(rule.id)
+        if state is None:
+            state = self.states[rule.id] = {"active": False, "last_fired": None, "last_price": None}
+        state["last_price"] = price
+
+        if not condition_met:
+            if state["active"] and _rearmed(rule, price, self.setting(rule, "hysteresis")):
+                self._set_active(rule, state, False)
+            return False
+
+        last_fired = datetime.fromisoformat(state["last_fired"]) if state["last_fired"] else None
+        elapsed = (when - last_fired).total_seconds() if last_fired else None
+
+        if state["active"]:
+            renotify = self.setting(rule, "renotify_interval")
+            notify = renotify is not None and elapsed >= renotify
+        else:
+            self._set_active(rule, state, True)
+            notify = elapsed is None or elapsed >= self.setting(rule, "cooldown")
+
+        if notify:
+            state["last_fired"] = when.isoformat()
+        return notify
+
+    def notify(self, symbol, price, matches, rules, when):
+        """Update the rules of ``symbol`` after a tick and keep the ``(rule, condition)`` matches to send
+
+        ``rules`` maps rule ids to rules; active rules that no longer match may re-arm.
+        """
+        met = {rule.id for rule, _ in matches}
+        for key in list(self.active.get(symbol, ())):
+            if key not in met and key in rules:
+                self.update(rules[key], price, False, when)
+        return [(rule, condition) for rule, condition in matches if self.update(rule, price, True, when)]
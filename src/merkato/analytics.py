@@ -0,0 +1,180 @@
+"""
+Merkato: Portfolio Analytics
+Realized volatility, max drawdown, moving averages and return correlations for the
+weekly report. The price history is pivoted once into a symbol x day matrix and every
+metric is computed on whole rows of it, optionally split across a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+
+from merkato.util import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+TRADING_DAYS = 252
+# Columns of row_metrics besides one ma_<window> column per moving average window
+METRIC_COLUMNS = ["last_price", "return", "volatility", "max_drawdown"]
+
+
+@dataclass
+class AnalyticsSettings:
+    """History window in days, moving average windows in daily closes and process pool size,
+    from the "analytics" section of config.json"""
+
+    days: int = 90
+    windows: list = field(default_factory=lambda: [20, 50])
+    workers: int = 1
+    chunk_size: int = 1000
+    correlations: int = 10
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("analytics", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown analytics settings: {', '.join(sorted(unknown))}")
+        settings = cls(**section)
+        if settings.days < 2 or settings.workers < 1 or settings.chunk_size < 1:
+            raise ValueError("analytics days must be at least 2, workers and chunk_size at least 1")
+        if not all(isinstance(window, int) and window > 0 for window in settings.windows):
+            raise ValueError("analytics windows must be positive numbers of days")
+        return settings
+
+
+def price_matrix(df):
+    """``(symbols, days, closes)`` of a price frame
+
+    ``closes`` is a ``symbols x days`` array of the last price per symbol and day, NaN
+    where a symbol has no price that day. ``days`` are the trading days, the dates with
+    at least one price, so weekends and holidays do not count as flat days.
+    """
+    if df.empty:
+        return [], np.empty(0, dtype="datetime64[D]"), np.empty((0, 0))
+    symbol = df["symbol"].astype("category")
+    codes = symbol.cat.codes.to_numpy()
+    timestamps = df["timestamp"].to_numpy(dtype="datetime64[us]")
+    trading_days, columns = np.unique(timestamps.astype("datetime64[D]"), return_inverse=True)
+    columns = columns.astype(np.int64)
+    n_days = len(trading_days)
+
+    # Stable sort by cell keeps the time order inside each cell, so its last entry is the close
+    order = np.argsort(timestamps, kind="stable")
+    keys = codes[order].astype(np.int64) * n_days + columns[order]
+    order = order[np.argsort(keys, kind="stable")]
+    keys = codes[order].astype(np.int64) * n_days + columns[order]
+    last = np.append(keys[1:] != keys[:-1], True)
+
+    closes = np.full((len(symbol.cat.categories), n_days), np.nan)
+    closes.ravel()[keys[last]] = df["price"].to_numpy(dtype=float)[order[last]]
+    present = np.flatnonzero(np.isfinite(closes).any(axis=1))
+    symbols = [str(name) for name in symbol.cat.categories[present]]
+    return symbols, trading_days, closes[present]
+
+
+def forward_fill(closes):
+    """Carry each row's last price over the trading days without one; leading gaps stay NaN"""
+    index = np.where(np.isfinite(closes), np.arange(closes.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return closes[np.arange(len(closes))[:, None], index]
+
+
+def log_returns(closes):
+    """Daily log returns of a forward-filled close matrix, one column fewer"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(np.log(closes), axis=1)
+
+
+def row_metrics(closes, windows=(20, 50)):
+    """Per-row metrics of a non-empty, forward-filled ``symbols x days`` close matrix
+
+    Returns and drawdowns are in percent, volatility is annualized from daily log returns.
+    """
+    returns = log_returns(closes)
+    valid = np.isfinite(returns)
+    count = valid.sum(axis=1)
+    filled = np.where(valid, returns, 0.0)
+    mean = filled.sum(axis=1) / np.maximum(count, 1)
+    squares = np.where(valid, (returns - mean[:, None]) ** 2, 0.0).sum(axis=1)
+    volatility = np.where(count > 1, np.sqrt(squares / np.maximum(count - 1, 1) * TRADING_DAYS), np.nan)
+
+    with np.errstate(invalid="ignore"):
+        drawdowns = closes / np.fmax.accumulate(closes, axis=1) - 1
+    last = closes[:, -1]
+    first = closes[np.arange(len(closes)), np.argmax(np.isfinite(closes), axis=1)]
+    metrics = {
+        "last_price": last,
+        "return": (last / first - 1) * 100,
+        "volatility": volatility * 100,
+        "max_drawdown": np.fmin.reduce(drawdowns, axis=1) * 100,
+    }
+    for window in windows:
+        recent = closes[:, -window:]
+        complete = np.isfinite(recent).all(axis=1) & (recent.shape[1] == window)
+        metrics[f"ma_{window}"] = np.where(complete, recent.mean(axis=1), np.nan)
+    return metrics
+
+
+def correlation(returns):
+    """Pairwise correlation of the rows of ``returns`` over the days both have a return
+
+    Masked sums as matrix products, so a thousand symbols cost a few matrix
+    multiplications instead of a million pairwise loops.
+    """
+    valid = np.isfinite(returns).astype(float)
+    x = np.where(valid > 0, returns, 0.0)
+    n = valid @ valid.T
+    sx = x @ valid.T
+    sxx = (x * x) @ valid.T
+    sxy = x @ x.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = (n * sxy - sx * sx.T) / np.sqrt((n * sxx - sx**2) * (n * sxx.T - sx.T**2))
+    corr[n < 3] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _chunk_metrics(args):
+    closes, windows = args
+    return row_metrics(closes, windows)
+
+
+def analyze(df, settings=None):
+    """``(metrics, correlations)`` DataFrames of a price frame, indexed by symbol
+
+    With more symbols than ``chunk_size`` and more than one worker, the per-symbol
+    metrics are computed in row chunks on a process pool.
+    """
+    settings = settings or AnalyticsSettings()
+    symbols, _, closes = price_matrix(df)
+    index = pd.Index(symbols, name="symbol", dtype=object)
+    windows = tuple(settings.windows)
+    if not symbols:
+        columns = [*METRIC_COLUMNS, *(f"ma_{window}" for window in windows)]
+        return pd.DataFrame(columns=columns, index=index, dtype=float), pd.DataFrame(index=index, columns=index)
+    closes = forward_fill(closes)
+
+    if settings.workers > 1 and len(symbols) > settings.chunk_size:
+        chunks = [
+            (closes[start : start + settings.chunk_size], windows)
+            for start in range(0, len(symbols), settings.chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=settings.workers) as executor:
+            parts = list(executor.map(_chunk_metrics, chunks))
+        metrics = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    else:
+        metrics = row_metrics(closes, windows)
+
+    correlations = pd.DataFrame(correlation(log_returns(closes)), index=index, columns=index)
+    return pd.DataFrame(metrics, index=index), correlations
+
+
+def top_pairs(correlations, count=10):
+    """The ``count`` most correlated distinct symbol pairs, as ``(a, b, correlation)``"""
+    values = correlations.to_numpy()
+    rows, cols = np.triu_indices(len(values), k=1)
+    pairs = values[rows, cols]
+    keep = np.flatnonzero(np.isfinite(pairs))
+    best = keep[np.argsort(-pairs[keep], kind="stable")[:count]]
+    names = correlations.index
+    return [(names[rows[i]], names[cols[i]], float(pairs[i])) for i in best]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Merkato: Backfill
+Finds trading days without a recorded price per symbol and fills them with daily closes
+from bulk yfinance range downloads, merged into storage without duplicates.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from merkato.fetch import FetchSettings
+from merkato.markets import get_exchange
+from merkato.portfolios import all_stocks
+from merkato.rollups import update_rollups
+from merkato.storage import get_store
+from merkato.util import lazy_import, load_config
+
+yf = lazy_import("yfinance")
+
+DEFAULT_DAYS = 30
+# Calendar days covered by one bulk download
+WINDOW_DAYS = 30
+
+
+def find_gaps(stocks, df, start, end, config=None):
+    """Trading days in [start, end) without any recorded price, per symbol
+
+    ``df`` holds the stored prices; each symbol is checked against its exchange calendar.
+    """
+    recorded = {}
+    if not df.empty:
+        days = df["timestamp"].dt.date
+        for symbol, symbol_days in days.groupby(df["symbol"].astype(str), sort=False):
+            recorded[symbol] = set(symbol_days)
+
+    gaps = {}
+    for stock in stocks:
+        symbol = stock["symbol"]
+        exchange = get_exchange(stock, config)
+        have = recorded.get(symbol, set())
+        missing = [
+            day
+            for day in (start + timedelta(days=offset) for offset in range((end - start).days))
+            if exchange.is_trading_day(day) and day not in have
+        ]
+        if missing:
+            gaps[symbol] = missing
+    return gaps
+
+
+def gap_ranges(days):
+    """Collapse sorted days into ``(first, last)`` runs, bridging weekends and holidays"""
+    ranges = []
+    for day in days:
+        if ranges and (day - ranges[-1][1]).days <= 4:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(run) for run in ranges]
+
+
+def plan_downloads(gaps, window_days=WINDOW_DAYS, batch_size=50):
+    """Split gaps into ``(start, end, symbols)`` jobs of at most ``window_days`` and ``batch_size`` symbols"""
+    windows = {}
+    for symbol, days in gaps.items():
+        for day in days:
+            windows.setdefault(day.toordinal() // window_days, set()).add(symbol)
+
+    jobs = []
+    for index, symbols in sorted(windows.items()):
+        start = date.fromordinal(index * window_days)
+        end = start + timedelta(days=window_days)
+        symbols = sorted(symbols)
+        for i in range(0, len(symbols), batch_size):
+            jobs.append((start, end, symbols[i : i + batch_size]))
+    return jobs
+
+
+def download_closes(symbols, start, end, timeout=30):
+    """Daily closes for ``symbols`` in [start, end) from one bulk yfinance download"""
+    data = yf.download(
+        symbols,
+        start=start.isoformat(),
+        end=end.isoformat(),
+        interval="1d",
+        group_by="column",
+        progress=False,
+        threads=True,
+        timeout=timeout,
+    )
+    if data is None or data.empty:
+        return {}
+    closes = data["Close"]
+    return {
+        symbol: {timestamp.date(): float(price) for timestamp, price in closes[symbol].dropna().items()}
+        for symbol in symbols
+        if symbol in closes
+    }
+
+
+def close_timestamp(exchange, day):
+    """ISO timestamp of a session close in local time, like the monitor's own rows"""
+    return datetime.combine(day, exchange.close, tzinfo=exchange.tz).astimezone().replace(tzinfo=None).isoformat()
+
+
+def backfill(config, days=DEFAULT_DAYS, symbols=None, today=None, dry_run=False):
+    """Fill the gaps of the last ``days`` days before ``today``; returns the number of rows added"""
+    today = today or date.today()
+    start = today - timedelta(days=days)
+    # One entry per symbol, however many portfolios watch it
+    stocks = {}
+    for stock in all_stocks(config):
+        if symbols is None or stock["symbol"] in symbols:
+            stocks.setdefault(stock["symbol"], stock)
+    stocks = list(stocks.values())
+    exchanges = {stock["symbol"]: get_exchange(stock, config) for stock in stocks}
+
+    store = get_store(config)
+    df = store.read([stock["symbol"] for stock in stocks], start=start, end=today)
+    gaps = find_gaps(stocks, df, start, today, config)
+    for symbol, missing in gaps.items():
+        runs = ", ".join(f"{first}..{last}" if first != last else str(first) for first, last in gap_ranges(missing))
+        print(f"{symbol}: {len(missing)} missing days ({runs})")
+    if not gaps or dry_run:
+        return 0
+
+    settings = FetchSettings.from_config(config)
+    jobs = plan_downloads(gaps, batch_size=settings.batch_size)
+    print(f"Downloading {len(jobs)} ranges for {len(gaps)} symbols...")
+
+    def run(job):
+        job_start, job_end, job_symbols = job
+        try:
+            return job, download_closes(job_symbols, job_start, job_end, settings.request_timeout)
+        except Exception as e:
+            print(f"Error downloading {job_symbols[0]}..{job_symbols[-1]} {job_start}..{job_end}: {e}")
+            return job, {}
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=settings.max_workers, thread_name_prefix="merkato-backfill") as executor:
+        for (job_start, job_end, job_symbols), closes in executor.map(run, jobs):
+            for symbol in job_symbols:
+                prices = closes.get(symbol, {})
+                for day in gaps[symbol]:
+                    if job_start <= day < job_end and day in prices:
+                        rows.append((close_timestamp(exchanges[symbol], day), symbol, prices[day]))
+
+    added = store.merge(rows)
+    if added:
+        try:
+            update_rollups(config, store, rows)
+        except Exception as e:
+            print(f"Failed to update rollups: {e}")
+    print(f"Backfill complete: {added} rows added")
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill missing days of recorded prices from Yahoo Finance history")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="how many days back to scan for gaps")
+    parser.add_argument("--symbols", nargs="+", help="only backfill these configured symbols")
+    parser.add_argument("--dry-run", action="store_true", help="only report the gaps")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    backfill(config, days=args.days, symbols=args.symbols, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Merkato: Backtest
+Replays alert rules over the stored price history as array operations, to see how often
+a rule or a sweep of threshold variants would have fired and how many emails it would
+have sent.
+"""
+
+import argparse
+import json
+from datetime import timedelta
+
+from merkato.portfolios import all_stocks, get_recipients
+from merkato.rules import OPERATORS, Rule, parse_rules
+from merkato.util import lazy_import, load_config, load_prices
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Upper bound of one (rows x thresholds) condition matrix
+MAX_CELLS = 1 << 24
+
+
+def price_series(df):
+    """``symbol -> (timestamps, prices)`` arrays of a typed, time-sorted price frame"""
+    timestamps = df["timestamp"].to_numpy(dtype="datetime64[us]")
+    prices = df["price"].to_numpy(dtype=float)
+    return {
+        symbol: (timestamps[positions], prices[positions])
+        for symbol, positions in df.groupby(df["symbol"].astype(str), sort=False).indices.items()
+    }
+
+
+def daily_closes(timestamps, prices):
+    """Last price of each day, as ``(days, closes)``"""
+    days = timestamps.astype("datetime64[D]")
+    last = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+    return days[last], prices[last]
+
+
+def compare(values, operator, thresholds):
+    """``values[None, :] <operator> thresholds[:, None]``: one row of conditions per threshold"""
+    values, thresholds = values[None, :], np.asarray(thresholds, dtype=float)[:, None]
+    if operator == "<":
+        return values < thresholds
+    if operator == "<=":
+        return values <= thresholds
+    if operator == ">":
+        return values > thresholds
+    return values >= thresholds
+
+
+def rising_edges(conditions):
+    """Points where a condition becomes true, like the alert state's first fire per episode"""
+    fires = conditions.copy()
+    fires[..., 1:] &= ~conditions[..., :-1]
+    return fires
+
+
+def percent_changes(timestamps, prices, days, daily):
+    """Percent change of each price against the last close at least ``days`` before its day"""
+    close_days, closes = daily
+    reference = timestamps.astype("datetime64[D]") - np.timedelta64(days, "D")
+    index = np.searchsorted(close_days, reference, side="right") - 1
+    base = np.where(index >= 0, closes[np.maximum(index, 0)], np.nan)
+    return (prices - base) / base * 100
+
+
+def moving_averages(timestamps, window, daily):
+    """Average of the ``window`` daily closes before each price's day (NaN until there are enough)"""
+    close_days, closes = daily
+    sums = np.concatenate([[0.0], np.cumsum(closes)])
+    count = np.searchsorted(close_days, timestamps.astype("datetime64[D]"), side="left")
+    start = np.maximum(count - window, 0)
+    return np.where(count >= window, (sums[count] - sums[start]) / window, np.nan)
+
+
+def rule_fires(rule, timestamps, prices, daily):
+    """Boolean array of the rows where a non-price ``rule`` would have sent an alert"""
+    if rule.kind == "range":
+        inside = (prices >= rule.value) & (prices <= rule.high)
+        return rising_edges(~inside if rule.outside else inside)
+    if rule.kind == "change":
+        changes = percent_changes(timestamps, prices, rule.days, daily)
+        return rising_edges(compare(changes, rule.operator, [rule.value])[0])
+    averages = moving_averages(timestamps, rule.window, daily)
+    previous = np.concatenate([[np.nan], prices[:-1]])
+    if rule.direction == "above":
+        return (previous < averages) & (averages <= prices)
+    return (previous > averages) & (averages >= prices)
+
+
+def _summaries(rules, fires, timestamps):
+    """Result records of ``rules`` from their ``(rules x rows)`` fire matrix"""
+    counts = fires.sum(axis=1)
+    firsts = fires.argmax(axis=1) if fires.shape[1] else counts
+    return [
+        {
+            "rule": rule.id,
+            "symbol": rule.symbol,
+            "condition": rule.describe(),
+            "portfolio": rule.portfolio,
+            "fires": int(count),
+            "first_fire": pd.Timestamp(timestamps[first]) if count else None,
+        }
+        for rule, count, first in zip(rules, counts, firsts)
+    ]
+
+
+def backtest(df, rules):
+    """Fire counts and first-fire times per rule, plus fire timestamps per portfolio
+
+    Price rules of a symbol sharing an operator are evaluated together as one
+    ``(rows x thresholds)`` matrix, so sweeping thousands of thresholds costs a few
+    vectorized comparisons rather than a loop over rows.
+    """
+    series = price_series(df)
+    results = []
+    fired_at = {}
+
+    def record(rules, fires, timestamps):
+        results.extend(_summaries(rules, fires, timestamps))
+        for portfolio in {rule.portfolio for rule in rules}:
+            selected = [rule.portfolio == portfolio for rule in rules]
+            fired_at.setdefault(portfolio, []).append(timestamps[fires[selected].any(axis=0)])
+
+    groups = {}
+    for rule in rules:
+        if rule.symbol not in series:
+            results.extend(_summaries([rule], np.zeros((1, 0), dtype=bool), None))
+        elif rule.kind == "price":
+            groups.setdefault((rule.symbol, rule.operator), []).append(rule)
+        else:
+            timestamps, prices = series[rule.symbol]
+            record([rule], rule_fires(rule, timestamps, prices, daily_closes(timestamps, prices))[None, :], timestamps)
+
+    for (symbol, operator), group in groups.items():
+        timestamps, prices = series[symbol]
+        step = max(1, MAX_CELLS // max(1, len(prices)))
+        for first in range(0, len(group), step):
+            chunk = group[first : first + step]
+            record(chunk, rising_edges(compare(prices, operator, [rule.value for rule in chunk])), timestamps)
+
+    # One email per portfolio and monitor run, however many of its rules fire in that run
+    emails = {portfolio: len(np.unique(np.concatenate(times))) for portfolio, times in fired_at.items()}
+    return pd.DataFrame(results), emails
+
+
+def parse_candidate(spec):
+    """Rule from ``SYMBOL:OPERATOR:VALUE``"""
+    symbol, operator, value = spec.rsplit(":", 2)
+    if operator not in OPERATORS:
+        raise ValueError(f"invalid operator '{operator}'")
+    return Rule(symbol, "price", operator, float(value))
+
+
+def parse_sweep(spec):
+    """Price rules from ``SYMBOL:OPERATOR:LOW:HIGH:STEP``, thresholds from LOW to HIGH inclusive"""
+    symbol, operator, low, high, step = spec.rsplit(":", 4)
+    if operator not in OPERATORS:
+        raise ValueError(f"invalid operator '{operator}'")
+    low, high, step = float(low), float(high), float(step)
+    if step <= 0:
+        raise ValueError("step must be positive")
+    return [Rule(symbol, "price", operator, float(round(value, 10))) for value in np.arange(low, high + step / 2, step)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest alert rules against the recorded price history")
+    parser.add_argument("--days", type=int, default=365, help="how many days of history to replay")
+    parser.add_argument("--symbols", nargs="+", help="only backtest rules of these symbols")
+    parser.add_argument("--rule", action="append", default=[], metavar="SYMBOL:OP:VALUE", help="candidate price rule")
+    parser.add_argument(
+        "--sweep", action="append", default=[], metavar="SYMBOL:OP:LOW:HIGH:STEP", help="sweep of price thresholds"
+    )
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    try:
+        candidates = [parse_candidate(spec) for spec in args.rule]
+        candidates += [rule for spec in args.sweep for rule in parse_sweep(spec)]
+    except ValueError as e:
+        parser.error(f"invalid rule: {e}")
+    rules = candidates or [rule for stock in all_stocks(config) for rule in parse_rules(stock)]
+    if args.symbols:
+        rules = [rule for rule in rules if rule.symbol in args.symbols]
+    if not rules:
+        parser.error("no rules to backtest")
+
+    symbols = sorted({rule.symbol for rule in rules})
+    df = load_prices(symbols, start=pd.Timestamp.now() - timedelta(days=args.days), config=config)
+    results, emails = backtest(df, rules)
+
+    if args.json:
+        records = [
+            {**record, "first_fire": record["first_fire"].isoformat() if record["fires"] else None}
+            for record in results.to_dict(orient="records")
+        ]
+        emails = {portfolio or "default": count for portfolio, count in emails.items()}
+        print(json.dumps({"rules": records, "emails": emails}, indent=2))
+        return
+
+    print(f"Backtested {len(rules)} rules over {len(df)} prices of {len(symbols)} symbols ({args.days} days)")
+    for row in results.itertuples():
+        first = row.first_fire.strftime("%Y-%m-%d %H:%M") if row.fires else "never"
+        print(f"{row.symbol:<10} {row.condition:<40} {row.fires:>6} fires, first {first}")
+    if not candidates:
+        for portfolio, count in emails.items():
+            recipients = len(get_recipients(config, portfolio))
+            print(f"{portfolio or 'default'}: {count} alert emails to {recipients} recipient(s)")
+
+
+if __name__ == "__main__":
+    main()
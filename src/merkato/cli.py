@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Merkato: Command Line
+Single entry point for every merkato command. Command modules are imported only when
+their command runs, and pandas, numpy and yfinance only when a code path uses them.
+"""
+
+import argparse
+import importlib
+import re
+import sys
+
+from merkato.portfolios import all_stocks, get_portfolios, unique_symbols
+from merkato.util import CONFIG_FILE, load_config
+
+# command -> (module with a main(argv) function, help)
+COMMANDS = {
+    "monitor": ("merkato.stock_monitor", "check prices, record them and send target alerts"),
+    "report": ("merkato.weekly_report", "send the weekly trend report"),
+    "it": ("merkato.it", "check the local setup"),
+    "backfill": ("merkato.backfill", "fill missing days of recorded prices"),
+    "backtest": ("merkato.backtest", "replay alert rules over the recorded history"),
+    "migrate-storage": ("merkato.storage", "convert the CSV files into the Parquet or tick store"),
+}
+
+
+def _check_stock(config, stock, index, portfolio):
+    """Problems of one configured stock"""
+    from merkato.markets import get_exchange
+    from merkato.rules import OPERATORS, parse_rule
+
+    symbol = stock.get("symbol")
+    if not symbol:
+        where = f" of portfolio '{portfolio}'" if portfolio else ""
+        return [f"Stock #{index + 1}{where} has no symbol"]
+    problems = []
+    if stock.get("operator", "<=") not in OPERATORS:
+        problems.append(f"Invalid operator '{stock['operator']}' for {symbol}")
+    try:
+        get_exchange(stock, config)
+    except ValueError as e:
+        problems.append(str(e))
+    if "currency" in stock and not re.fullmatch(r"[A-Z]{2}[A-Za-z]", str(stock["currency"])):
+        problems.append(f"Invalid currency '{stock['currency']}' for {symbol}")
+    for definition in stock.get("rules", []):
+        try:
+            parse_rule(symbol, definition)
+        except ValueError as e:
+            problems.append(f"Invalid rule {definition} for {symbol}: {e}")
+    return problems
+
+
+def check_config(config):
+    """Validate every section of a loaded config; returns a list of problems"""
+    # Only light modules: they define the settings and rules but import nothing heavy at module level
+    from merkato.alert_state import AlertSettings
+    from merkato.analytics import AnalyticsSettings
+    from merkato.daemon import DaemonSettings
+    from merkato.fetch import FetchSettings
+    from merkato.fx import FxSettings
+    from merkato.history import HistorySettings
+    from merkato.metrics import MetricsSettings
+    from merkato.providers import ProviderSettings
+    from merkato.quote_cache import CacheSettings
+    from merkato.storage import BACKENDS
+    from merkato.stream import StreamSettings
+
+    problems = []
+    for settings in (
+        FetchSettings,
+        DaemonSettings,
+        AlertSettings,
+        CacheSettings,
+        MetricsSettings,
+        HistorySettings,
+        StreamSettings,
+        ProviderSettings,
+        FxSettings,
+        AnalyticsSettings,
+    ):
+        try:
+            settings.from_config(config)
+        except (TypeError, ValueError) as e:
+            problems.append(str(e))
+
+    backend = config.get("storage", {}).get("backend", "csv")
+    if backend not in BACKENDS:
+        problems.append(f"Unknown storage backend '{backend}'")
+
+    if not isinstance(config.get("stocks", []), list):
+        return problems + ["'stocks' must be a list"]
+    if "stocks" not in config and not config.get("portfolios"):
+        return problems + ["No 'stocks' or 'portfolios' configured"]
+    try:
+        portfolios = get_portfolios(config)
+    except (AttributeError, ValueError) as e:
+        return problems + [str(e)]
+    for portfolio in portfolios:
+        for index, stock in enumerate(portfolio.stocks):
+            problems += _check_stock(config, stock, index, portfolio.name)
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="merkato", description="Stock price monitor and reports")
+    parser.add_argument("--check-config", action="store_true", help=f"validate {CONFIG_FILE} and exit")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    for name, (_, help) in COMMANDS.items():
+        subparsers.add_parser(name, help=help, add_help=False)
+    args, rest = parser.parse_known_args(argv)
+
+    if args.check_config:
+        try:
+            config = load_config()
+        except Exception as e:
+            sys.exit(f"Cannot load {CONFIG_FILE}: {e}")
+        problems = check_config(config)
+        for problem in problems:
+            print(f"✗ {problem}")
+        if problems:
+            sys.exit(1)
+        portfolios = len(config.get("portfolios", []))
+        summary = f"{len(unique_symbols(all_stocks(config)))} stocks"
+        if portfolios:
+            summary += f", {portfolios} portfolios"
+        print(f"✓ {CONFIG_FILE} is valid: {summary}")
+        return
+
+    if args.command is None:
+        parser.print_help()
+        sys.exit(2)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(rest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Merkato: Monitor Daemon
+Keeps the stock monitor resident: config, yfinance session and recent prices stay in memory,
+symbols are checked on an internal scheduler and recorded prices are flushed in batches.
+"""
+
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+from merkato import stock_monitor
+from merkato.alert_state import AlertSettings, AlertState
+from merkato.history import HistorySettings, PriceHistory, load_price_history
+from merkato.markets import get_exchange
+from merkato.metrics import metrics, write_report
+from merkato.portfolios import unique_symbols
+from merkato.quote_cache import disable_cache
+from merkato.rules import RuleSet
+from merkato.util import CONFIG_FILE, load_config
+
+
+@dataclass
+class DaemonSettings:
+    """Scheduler cadences in seconds, read from the "daemon" section of config.json"""
+
+    interval: float = 3600.0
+    closed_interval: float = 3600.0
+    flush_interval: float = 300.0
+    reload_interval: float = 30.0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build settings from config, falling back to defaults for missing keys"""
+        section = config.get("daemon", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown daemon settings: {', '.join(sorted(unknown))}")
+        return cls(**section)
+
+
+class MonitorDaemon:
+    """In-process scheduler around the stock monitor check/record/alert steps"""
+
+    def __init__(self, config_loader=load_config, config_file=CONFIG_FILE, clock=time.monotonic, now=datetime.now):
+        self.config_loader = config_loader
+        self.config_file = config_file
+        self.clock = clock
+        self.now = now
+        self.stop_event = threading.Event()
+
+        self.config = None
+        self.settings = None
+        self.stocks = []
+        self.config_mtime = None
+        self.next_due = {}
+        # symbol -> (timestamp, price) of the latest recorded price
+        self.recent = {}
+        self.pending_rows = []
+        self.alert_state = None
+        self.rules = None
+        # (day, closes) cached for the rules' change and moving average lookbacks
+        self.history = (None, None)
+        self.history_settings = None
+        # Ring buffers of the prices seen since (and loaded at) start-up
+        self.prices = None
+        self.next_flush = 0.0
+        self.next_reload = 0.0
+        self.reload_config(force=True)
+
+    def reload_config(self, force=False):
+        """Reload config.json when it changed on disk, keeping the old config if it is invalid"""
+        try:
+            mtime = os.stat(self.config_file).st_mtime_ns
+        except OSError as e:
+            if force:
+                raise
+            print(f"Cannot stat {self.config_file}: {e}")
+            return False
+        if not force and mtime == self.config_mtime:
+            return False
+
+        try:
+            config = self.config_loader()
+            settings = DaemonSettings.from_config(config)
+            alert_settings = AlertSettings.from_config(config)
+            history_settings = HistorySettings.from_config(config)
+            stocks = stock_monitor.get_monitored_stocks(config)
+            rules = RuleSet(stocks)
+        except Exception as e:
+            if force:
+                raise
+            print(f"Ignoring invalid config reload: {e}")
+            self.config_mtime = mtime
+            return False
+
+        self.config, self.settings, self.stocks, self.config_mtime = config, settings, stocks, mtime
+        self.rules, self.history = rules, (None, None)
+        if self.history_settings != history_settings:
+            self.history_settings = history_settings
+            window = (history_settings.capacity, history_settings.retention_days * 86400, history_settings.dtype)
+            # A changed window resizes the buffers in place instead of dropping the prices seen so far
+            self.prices = PriceHistory(*window) if self.prices is None else self.prices.resize(*window)
+        if self.alert_state is None:
+            self.alert_state = AlertState.load(config)
+        else:
+            self.alert_state.settings = alert_settings
+        now = self.clock()
+        symbols = {stock["symbol"] for stock in stocks}
+        # Keep schedules of known symbols, check new ones right away
+        self.next_due = {symbol: self.next_due.get(symbol, now) for symbol in symbols}
+        self.recent = {symbol: record for symbol, record in self.recent.items() if symbol in symbols}
+        if not force:
+            print(f"Reloaded config: monitoring {len(symbols)} symbols")
+        return True
+
+    def interval(self, stock, when):
+        """Seconds until ``stock`` is due again"""
+        if not get_exchange(stock, self.config).is_open(when):
+            return self.settings.closed_interval
+        return stock.get("interval", self.settings.interval)
+
+    def due_stocks(self, now):
+        return [stock for stock in self.stocks if self.next_due.get(stock["symbol"], now) <= now]
+
+    def tick(self):
+        """Check every due symbol once, buffering rows and sending alerts"""
+        now = self.clock()
+        when = self.now()
+        due = self.due_stocks(now)
+        for stock in due:
+            self.next_due[stock["symbol"]] = now + self.interval(stock, when)
+
+        due = stock_monitor.select_due_stocks(due, self.config, when, self.recent)
+        if not due:
+            return []
+
+        symbols = unique_symbols(due)
+        print(f"Checking {len(symbols)} symbols...")
+        results = stock_monitor.fetch_stock_prices(symbols, self.config)
+        results = stock_monitor.drop_unchanged_closes(due, results, self.config, when, self.recent)
+        rows, alerts = stock_monitor.evaluate_prices(
+            due, results, when.isoformat(), self.alert_state, self.rules, self.daily_history(when.date()), self.recent
+        )
+        for _, symbol, price in rows:
+            self.recent[symbol] = (when, price)
+            self.prices.append(symbol, when, price)
+        self.pending_rows.extend(rows)
+
+        if alerts:
+            stock_monitor.send_price_alerts(stock_monitor.convert_alerts(alerts, self.config), self.config)
+        return alerts
+
+    def daily_history(self, today):
+        """Daily closes for the rules, once per day from memory or, for longer lookbacks, the rollup cache"""
+        day, history = self.history
+        if day != today:
+            symbols = unique_symbols(self.stocks)
+            if not self.rules.needs_history:
+                history = None
+            elif self.rules.lookback <= self.history_settings.retention_days:
+                history = self.prices.daily_closes(symbols, today, self.rules.lookback)
+            else:
+                history = stock_monitor.load_rule_history(self.config, self.rules, symbols, today)
+            self.history = (today, history)
+        return history
+
+    def flush(self):
+        """Write buffered rows to storage and persist the alert state"""
+        try:
+            self.alert_state.save()
+        except Exception as e:
+            print(f"Failed to save alert state: {e}")
+        if not self.pending_rows:
+            return 0
+        rows, self.pending_rows = self.pending_rows, []
+        try:
+            stock_monitor.record_prices(rows, self.config)
+        except Exception as e:
+            print(f"Failed to flush {len(rows)} rows, will retry: {e}")
+            self.pending_rows = rows + self.pending_rows
+            return 0
+        print(f"Flushed {len(rows)} rows")
+        return len(rows)
+
+    def write_report(self):
+        """Write the cumulative run report, so the Prometheus textfile tracks the daemon"""
+        try:
+            write_report(self.config)
+        except Exception as e:
+            print(f"Failed to write run report: {e}")
+
+    def run_once(self):
+        """One scheduler iteration; returns the number of seconds to sleep"""
+        now = self.clock()
+        if now >= self.next_reload:
+            self.reload_config()
+            self.next_reload = now + self.settings.reload_interval
+
+        try:
+            self.tick()
+        except Exception as e:
+            print(f"Tick failed, will retry: {e}")
+            # Symbols the failed tick did not reschedule wait an interval instead of retrying in a busy loop
+            now = self.clock()
+            for symbol, due in self.next_due.items():
+                if due <= now:
+                    self.next_due[symbol] = now + self.settings.interval
+
+        now = self.clock()
+        if now >= self.next_flush:
+            self.flush()
+            self.write_report()
+            self.next_flush = now + self.settings.flush_interval
+
+        wake_at = min([self.next_reload, self.next_flush, *self.next_due.values()])
+        return max(0.0, wake_at - self.clock())
+
+    def run(self):
+        """Run until stop() is called, flushing buffered rows on the way out"""
+        symbols = unique_symbols(self.stocks)
+        try:
+            self.recent = stock_monitor.load_last_records(self.config, symbols)
+        except Exception as e:
+            print(f"Cannot read last recorded prices: {e}")
+        try:
+            self.prices = load_price_history(self.config, symbols, self.now())
+        except Exception as e:
+            print(f"Cannot load price history: {e}")
+        self.next_flush = self.clock() + self.settings.flush_interval
+        self.next_reload = self.clock() + self.settings.reload_interval
+        metrics.start_run("stock-monitor-daemon")
+        print(f"Daemon started: monitoring {len(symbols)} symbols")
+        try:
+            while not self.stop_event.is_set():
+                self.stop_event.wait(self.run_once())
+        finally:
+            self.flush()
+            self.write_report()
+            print("Daemon stopped")
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+
+def run_daemon(use_cache=True):
+    """Run the monitor daemon until SIGINT or SIGTERM"""
+    daemon = MonitorDaemon() if use_cache else MonitorDaemon(config_loader=lambda: disable_cache(load_config()))
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
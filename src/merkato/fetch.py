@@ -0,0 +1,151 @@
+"""
+Merkato: Fetch Engine
+Runs price lookups on a bounded worker pool with timeouts, retries and jittered backoff.
+"""
+
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class FetchSettings:
+    """Worker pool, deadline and retry policy, read from the "fetch" section of config.json"""
+
+    max_workers: int = 4
+    batch_size: int = 50
+    request_timeout: float = 15.0
+    run_timeout: float = 120.0
+    max_attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build settings from config, falling back to defaults for missing keys"""
+        section = config.get("fetch", {})
+        known = {f.name for f in fields(cls)}
+        unknown = set(section) - known
+        if unknown:
+            raise ValueError(f"Unknown fetch settings: {', '.join(sorted(unknown))}")
+        settings = cls(**section)
+        if settings.max_workers < 1 or settings.batch_size < 1 or settings.max_attempts < 1:
+            raise ValueError("fetch max_workers, batch_size and max_attempts must be at least 1")
+        return settings
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff delay before retry number ``attempt``"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a single symbol"""
+
+    symbol: str
+    price: float | None = None
+    latency: float = 0.0
+    attempts: int = 0
+    error: str | None = None
+
+    @property
+    def ok(self):
+        return self.price is not None
+
+
+def _chunks(symbols, size):
+    return [symbols[i : i + size] for i in range(0, len(symbols), size)]
+
+
+def fetch_prices(symbols, fetch_batch, settings=None):
+    """Fetch prices for ``symbols`` concurrently and return a symbol -> FetchResult mapping
+
+    ``fetch_batch(chunk, timeout)`` must return a ``(prices, failures)`` tuple, as
+    ``stock_monitor.get_stock_prices`` does. Chunks run on a bounded thread pool; a chunk
+    that raises or exceeds ``request_timeout`` has its symbols retried with backoff until
+    ``max_attempts`` is reached or the whole-run ``run_timeout`` expires.
+    """
+    settings = settings or FetchSettings()
+    symbols = list(dict.fromkeys(symbols))
+    results = {symbol: FetchResult(symbol) for symbol in symbols}
+    deadline = time.monotonic() + settings.run_timeout
+
+    # (ready_at, chunk) jobs waiting to be submitted
+    queue = [(0.0, chunk) for chunk in _chunks(symbols, settings.batch_size)]
+    inflight = {}
+
+    def fail(chunk, error, now):
+        retry = []
+        for symbol in chunk:
+            result = results[symbol]
+            if error is not None:
+                result.error = error
+            if result.attempts < settings.max_attempts:
+                retry.append(symbol)
+        if retry:
+            attempt = max(results[symbol].attempts for symbol in retry)
+            ready_at = now + settings.backoff(attempt)
+            if ready_at >= deadline:
+                return
+            queue.extend((ready_at, chunk) for chunk in _chunks(retry, settings.batch_size))
+
+    executor = ThreadPoolExecutor(max_workers=settings.max_workers, thread_name_prefix="merkato-fetch")
+    try:
+        while queue or inflight:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            # Submit every ready job while there is room in the pool
+            queue.sort(key=lambda job: job[0])
+            while queue and queue[0][0] <= now and len(inflight) < settings.max_workers:
+                _, chunk = queue.pop(0)
+                for symbol in chunk:
+                    results[symbol].attempts += 1
+                future = executor.submit(fetch_batch, chunk, settings.request_timeout)
+                inflight[future] = (chunk, now)
+
+            wake_at = [deadline]
+            wake_at += [started + settings.request_timeout for _, started in inflight.values()]
+            if queue and len(inflight) < settings.max_workers:
+                wake_at.append(queue[0][0])
+            done, _ = wait(inflight, timeout=max(0.0, min(wake_at) - now), return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in done:
+                chunk, started = inflight.pop(future)
+                latency = now - started
+                for symbol in chunk:
+                    results[symbol].latency = latency
+                try:
+                    prices, failures = future.result()
+                except Exception as e:
+                    fail(chunk, str(e) or type(e).__name__, now)
+                    continue
+                for symbol in chunk:
+                    if symbol in prices:
+                        results[symbol].price = prices[symbol]
+                        results[symbol].error = None
+                failed = [symbol for symbol in chunk if symbol not in prices]
+                for symbol in failed:
+                    results[symbol].error = failures.get(symbol, "no data returned")
+                if failed:
+                    fail(failed, None, now)
+
+            # Abandon requests that overran their timeout; the worker thread is left to finish on its own
+            for future, (chunk, started) in list(inflight.items()):
+                if now - started >= settings.request_timeout:
+                    del inflight[future]
+                    future.cancel()
+                    for symbol in chunk:
+                        results[symbol].latency = now - started
+                    fail(chunk, f"timed out after {settings.request_timeout:.1f}s", now)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    pending = [symbol for _, chunk in queue for symbol in chunk]
+    pending += [symbol for chunk, _ in inflight.values() for symbol in chunk]
+    for symbol in pending:
+        results[symbol].error = "run deadline exceeded"
+    return results
@@ -0,0 +1,131 @@
+"""
+Merkato: Currency Conversion
+Converts prices from their quote currencies into one reporting currency, with the FX
+rates of a run fetched in a single batch and kept in the quote cache.
+"""
+
+import re
+from dataclasses import dataclass, fields
+
+from merkato.markets import get_currency
+from merkato.metrics import incr, span
+from merkato.providers import get_provider_chain
+from merkato.quote_cache import open_quote_cache
+from merkato.util import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Minor-unit quote currencies: their major currency and its value in minor units
+MINOR_UNITS = {"GBp": ("GBP", 100), "GBX": ("GBP", 100), "ZAc": ("ZAR", 100), "ILA": ("ILS", 100)}
+SIGNS = {"USD": "$", "EUR": "€", "GBP": "£"}
+FX_INTERVAL = "fx"
+REQUEST_TIMEOUT = 15
+
+
+@dataclass
+class FxSettings:
+    """Reporting currency and FX rate TTL in seconds, from the "fx" section of config.json
+
+    Without a ``currency`` prices are reported in their own quote currencies.
+    """
+
+    currency: str | None = None
+    ttl: float = 3600.0
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("fx", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown fx settings: {', '.join(sorted(unknown))}")
+        settings = cls(**section)
+        if settings.currency is not None and not re.fullmatch(r"[A-Z]{3}", str(settings.currency)):
+            raise ValueError(f"Invalid fx currency '{settings.currency}', expected an ISO code like USD")
+        return settings
+
+
+def format_money(value, currency="USD"):
+    """``$12.50`` for currencies with a sign, ``CHF 12.50`` for the others"""
+    sign = SIGNS.get(currency)
+    return f"{sign}{value:.2f}" if sign else f"{currency} {value:.2f}"
+
+
+def fx_symbol(currency, target):
+    """Yahoo Finance ticker of the ``currency`` -> ``target`` rate"""
+    return f"{currency}{target}=X"
+
+
+def symbol_currencies(stocks, config=None):
+    """``symbol -> quote currency`` of ``stocks``"""
+    return {stock["symbol"]: get_currency(stock, config) for stock in stocks}
+
+
+class Converter:
+    """Converts prices into the reporting ``currency``
+
+    ``rates`` maps a quote currency to the value of one unit of it in the reporting
+    currency. Prices in a currency without a rate stay in that currency.
+    """
+
+    def __init__(self, currency=None, rates=None):
+        self.currency = currency
+        self.rates = dict(rates or {})
+        if currency is not None:
+            self.rates[currency] = 1.0
+
+    def factors(self, currencies):
+        """Conversion factor per entry of ``currencies``, 1.0 where there is no rate"""
+        return pd.Index(list(currencies), dtype=object).map(self.rates).to_numpy(dtype=float, na_value=1.0)
+
+    def labels(self, currencies):
+        """Currency each entry of ``currencies`` is reported in after conversion"""
+        return [self.currency if currency in self.rates else currency for currency in currencies]
+
+    def convert(self, prices, currencies):
+        """``(prices, labels)``: aligned arrays of prices and their currencies, converted in one multiplication"""
+        currencies = list(currencies)
+        return np.asarray(prices, dtype=float) * self.factors(currencies), self.labels(currencies)
+
+
+def fetch_rates(pairs, config, ttl):
+    """Prices of the FX ``pairs``, from the quote cache or one batched provider request"""
+    cache = open_quote_cache(config)
+    try:
+        rates = cache.get_many(pairs, FX_INTERVAL, ttl) if cache is not None else {}
+        missing = [pair for pair in pairs if pair not in rates]
+        if missing:
+            with span("fx.fetch"):
+                fetched, failures = get_provider_chain(config).fetch(missing, REQUEST_TIMEOUT)
+            incr("fx.fetched", len(fetched))
+            for pair, error in failures.items():
+                print(f"Error fetching FX rate {pair}: {error}")
+            if cache is not None:
+                cache.put_many(fetched, FX_INTERVAL)
+            rates.update(fetched)
+        return rates
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def load_converter(currencies, config):
+    """Converter from ``currencies`` into the configured reporting currency, fetching the rates it needs"""
+    settings = FxSettings.from_config(config)
+    target = settings.currency
+    if target is None:
+        return Converter()
+
+    # Minor units convert through their major currency
+    majors = {currency: MINOR_UNITS.get(currency, (currency, 1)) for currency in set(currencies)}
+    pairs = sorted({fx_symbol(major, target) for major, _ in majors.values() if major != target})
+    quotes = fetch_rates(pairs, config, settings.ttl) if pairs else {}
+
+    rates = {}
+    for currency, (major, units) in majors.items():
+        rate = 1.0 if major == target else quotes.get(fx_symbol(major, target))
+        if rate is None:
+            print(f"No {major}/{target} rate, reporting {currency} prices unconverted")
+        else:
+            rates[currency] = rate / units
+    return Converter(target, rates)
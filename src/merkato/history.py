@@ -0,0 +1,207 @@
+"""
+Merkato: Price History
+Compact in-memory price history for long-running processes: one ring buffer of int64
+epoch-microsecond timestamps and float prices per symbol, readable as zero-copy views.
+"""
+
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+
+from merkato.util import lazy_import, load_prices
+
+np = lazy_import("numpy")
+
+US_PER_DAY = 86_400_000_000
+PRICE_DTYPES = ("float64", "float32")
+
+
+@dataclass
+class HistorySettings:
+    """Size of the in-memory history, from the "history" section of config.json"""
+
+    retention_days: float = 30.0
+    capacity: int = 4096
+    dtype: str = "float64"
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("history", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown history settings: {', '.join(sorted(unknown))}")
+        settings = cls(**section)
+        if settings.dtype not in PRICE_DTYPES:
+            raise ValueError(f"Invalid history dtype '{settings.dtype}', expected one of {', '.join(PRICE_DTYPES)}")
+        return settings
+
+
+def to_epoch_us(timestamp):
+    """Microseconds since the epoch of a naive local timestamp (aware ones are converted to local time)"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return int(np.datetime64(timestamp, "us").astype(np.int64))
+
+
+class RingBuffer:
+    """Fixed-capacity time series that overwrites its oldest points
+
+    Every point is written twice, at ``i`` and ``i + capacity``, so the live window is
+    always one contiguous slice and view() never copies. Views are only valid until the
+    next write.
+    """
+
+    __slots__ = ("timestamps", "prices", "capacity", "start", "size")
+
+    def __init__(self, capacity, dtype="float64"):
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.prices = np.zeros(2 * capacity, dtype=dtype)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def view(self):
+        """``(timestamps, prices)`` of the live window, oldest first, without copying"""
+        end = self.start + self.size
+        return self.timestamps[self.start : end], self.prices[self.start : end]
+
+    def append(self, timestamp, price):
+        if self.size and timestamp < self.timestamps[self.start + self.size - 1]:
+            raise ValueError("Points must be appended in time order")
+        position = (self.start + self.size) % self.capacity
+        self.timestamps[position] = self.timestamps[position + self.capacity] = timestamp
+        self.prices[position] = self.prices[position + self.capacity] = price
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def extend(self, timestamps, prices):
+        """Append time-sorted arrays in one vectorized write"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)[-self.capacity :]
+        prices = np.asarray(prices)[-self.capacity :]
+        if not len(timestamps):
+            return
+        if self.size and timestamps[0] < self.timestamps[self.start + self.size - 1]:
+            raise ValueError("Points must be appended in time order")
+        positions = (self.start + self.size + np.arange(len(timestamps))) % self.capacity
+        for offset in (0, self.capacity):
+            self.timestamps[positions + offset] = timestamps
+            self.prices[positions + offset] = prices
+        overflow = max(0, self.size + len(timestamps) - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.size += len(timestamps) - overflow
+
+    def trim(self, before):
+        """Drop the points older than ``before`` (epoch microseconds)"""
+        dropped = int(np.searchsorted(self.view()[0], before, side="left"))
+        self.start = (self.start + dropped) % self.capacity
+        self.size -= dropped
+        return dropped
+
+
+class PriceHistory:
+    """Per-symbol ring buffers with an optional retention window in seconds"""
+
+    __slots__ = ("buffers", "capacity", "retention", "dtype")
+
+    def __init__(self, capacity=4096, retention=None, dtype="float64"):
+        self.buffers = {}
+        self.capacity = capacity
+        self.retention = retention
+        self.dtype = dtype
+
+    def resize(self, capacity, retention=None, dtype="float64"):
+        """Change the window in place, keeping the points that still fit into it"""
+        if (capacity, dtype) != (self.capacity, self.dtype):
+            for symbol, buffer in self.buffers.items():
+                timestamps, prices = buffer.view()
+                resized = RingBuffer(capacity, dtype)
+                resized.extend(timestamps, prices.astype(dtype))
+                self.buffers[symbol] = resized
+        self.capacity, self.retention, self.dtype = capacity, retention, dtype
+        for buffer in self.buffers.values():
+            self._expire(buffer)
+        return self
+
+    def _buffer(self, symbol):
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = self.buffers[symbol] = RingBuffer(self.capacity, self.dtype)
+        return buffer
+
+    def _expire(self, buffer):
+        if self.retention is not None and buffer.size:
+            buffer.trim(buffer.view()[0][-1] - int(self.retention * 1_000_000))
+
+    def append(self, symbol, timestamp, price):
+        """Append a live point; one older than the last (the repeated hour at a DST fall-back) is clamped to it"""
+        buffer = self._buffer(symbol)
+        timestamp = to_epoch_us(timestamp)
+        if buffer.size:
+            timestamp = max(timestamp, int(buffer.timestamps[buffer.start + buffer.size - 1]))
+        buffer.append(timestamp, price)
+        self._expire(buffer)
+
+    def extend(self, rows):
+        """Append ``(timestamp, symbol, price)`` rows"""
+        for timestamp, symbol, price in rows:
+            self.append(symbol, timestamp, price)
+
+    def load_frame(self, df):
+        """Bulk-load a typed price DataFrame (see util.typed_prices), sorted by time"""
+        if df.empty:
+            return self
+        timestamps = df["timestamp"].to_numpy(dtype="datetime64[us]").view(np.int64)
+        prices = df["price"].to_numpy()
+        for symbol, positions in df.groupby(df["symbol"].astype(str), sort=False).indices.items():
+            buffer = self._buffer(symbol)
+            buffer.extend(timestamps[positions], prices[positions])
+            self._expire(buffer)
+        return self
+
+    def series(self, symbol, start=None):
+        """Zero-copy ``(timestamps, prices)`` of a symbol, optionally from ``start`` on"""
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=self.dtype)
+        timestamps, prices = buffer.view()
+        if start is not None:
+            first = int(np.searchsorted(timestamps, to_epoch_us(start), side="left"))
+            timestamps, prices = timestamps[first:], prices[first:]
+        return timestamps, prices
+
+    def daily_closes(self, symbols, today, lookback):
+        """Last price per day in the ``lookback`` days before ``today``, in the format of rules.load_history"""
+        end = to_epoch_us(datetime.combine(today, datetime.min.time()))
+        first_day = end // US_PER_DAY - lookback
+        closes = {}
+        for symbol in symbols:
+            timestamps, prices = self.series(symbol)
+            stop = int(np.searchsorted(timestamps, end, side="left"))
+            days = timestamps[:stop] // US_PER_DAY
+            last = np.flatnonzero(np.append(np.diff(days) != 0, True))[: len(days)]
+            last = last[days[last] >= first_day]
+            if not len(last):
+                continue
+            closes[symbol] = (days[last].astype("datetime64[D]"), prices[last].astype(float))
+        return closes
+
+    @property
+    def nbytes(self):
+        return sum(buffer.timestamps.nbytes + buffer.prices.nbytes for buffer in self.buffers.values())
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+
+def load_price_history(config, symbols, now=None):
+    """PriceHistory of ``symbols`` bulk-loaded from storage over the configured retention window"""
+    settings = HistorySettings.from_config(config)
+    now = now or datetime.now()
+    history = PriceHistory(settings.capacity, settings.retention_days * 86400, settings.dtype)
+    return history.load_frame(load_prices(symbols, start=now - timedelta(days=settings.retention_days), config=config))
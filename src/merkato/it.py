@@ -3,8 +3,13 @@
 Test script to verify the stock monitor works locally before deploying
 """
 
+import argparse
+
 import merkato.stock_monitor as stock_monitor
-from merkato.util import load_config
+from merkato.fx import format_money
+from merkato.markets import get_currency
+from merkato.quote_cache import disable_cache, open_quote_cache
+from merkato.util import load_config, load_or_create_data
 
 
 def test_config():
@@ -21,24 +26,28 @@ def test_config():
         return None
 
 
-def test_price_fetch():
+def test_price_fetch(config=None):
     """Test fetching stock prices"""
     print("\nTesting price fetching...")
     test_symbols = ["SPY", "AAPL"]
 
+    cache = open_quote_cache(config)
     for symbol in test_symbols:
-        price = stock_monitor.get_stock_price(symbol)
+        price = stock_monitor.get_stock_price(symbol, cache, config)
         if price:
-            print(f"✓ {symbol}: ${price:.2f}")
+            print(f"✓ {symbol}: {format_money(price, get_currency({'symbol': symbol}))}")
         else:
             print(f"✗ Failed to fetch {symbol}")
+    if cache is not None:
+        cache.report()
+        cache.close()
 
 
 def test_data_storage():
     """Test CSV data storage"""
     print("\nTesting data storage...")
     try:
-        df = stock_monitor.load_or_create_data()
+        df = load_or_create_data()
         print("✓ Data file loaded/created")
         print(f"  - Current records: {len(df)}")
         if len(df) > 0:
@@ -74,7 +83,11 @@ def test_email_config():
         return False
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the stock monitor setup")
+    parser.add_argument("--no-cache", action="store_true", help="always fetch fresh quotes, bypassing the quote cache")
+    args = parser.parse_args(argv)
+
     print("=" * 60)
     print("Stock Monitor Bot - Test Suite")
     print("=" * 60)
@@ -82,7 +95,9 @@ def main():
     # Run tests
     config = test_config()
     if config:
-        test_price_fetch()
+        if args.no_cache:
+            disable_cache(config)
+        test_price_fetch(config)
         test_data_storage()
         test_email_config()
 
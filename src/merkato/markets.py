@@ -0,0 +1,182 @@
+"""
+Merkato: Market Calendars
+Trading hours and holidays per exchange, used to skip fetches while a symbol's market is closed.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# Yahoo Finance delays some quotes, so a closing price may show up shortly after the bell
+CLOSE_GRACE = timedelta(minutes=20)
+
+
+def easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    m = (32 + 2 * e + 2 * i - h - k) % 7
+    n = (a + 11 * h + 22 * m) // 451
+    month, day = divmod(h + m - 7 * n + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """The n-th ``weekday`` (0=Monday) of a month; n=-1 for the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day):
+    """US rule: Saturday holidays are observed on Friday, Sunday holidays on Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    holidays = {
+        _observed(date(year, 1, 1)),
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Presidents' Day
+        easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 6, 19)),
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),
+    }
+    # New Year's Day on a Saturday is not observed on the previous Friday
+    holidays.discard(date(year - 1, 12, 31))
+    return holidays
+
+
+def six_holidays(year):
+    return {
+        date(year, 1, 1),
+        date(year, 1, 2),  # Berchtoldstag
+        easter(year) - timedelta(days=2),  # Good Friday
+        easter(year) + timedelta(days=1),  # Easter Monday
+        date(year, 5, 1),
+        easter(year) + timedelta(days=39),  # Ascension Day
+        easter(year) + timedelta(days=50),  # Whit Monday
+        date(year, 8, 1),  # Swiss National Day
+        date(year, 12, 24),
+        date(year, 12, 25),
+        date(year, 12, 26),
+        date(year, 12, 31),
+    }
+
+
+def no_holidays(year):
+    return set()
+
+
+@dataclass(frozen=True)
+class Exchange:
+    """Regular trading session of an exchange, in its local timezone"""
+
+    code: str
+    timezone: str
+    open: time
+    close: time
+    holiday_rules: object = no_holidays
+    extra_holidays: frozenset = field(default_factory=frozenset)
+
+    @property
+    def tz(self):
+        return ZoneInfo(self.timezone)
+
+    def is_trading_day(self, day):
+        return (
+            day.weekday() < 5 and day not in self.extra_holidays and day not in _holidays(self.holiday_rules, day.year)
+        )
+
+    def is_open(self, when):
+        """Whether the regular session is open at ``when`` (naive datetimes are local time)"""
+        local = when.astimezone(self.tz)
+        return self.is_trading_day(local.date()) and self.open <= local.time() < self.close
+
+    def last_close(self, when):
+        """Most recent session close at or before ``when``, as an aware datetime"""
+        local = when.astimezone(self.tz)
+        day = local.date()
+        if local.time() < self.close:
+            day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return datetime.combine(day, self.close, tzinfo=self.tz)
+
+
+@lru_cache(maxsize=None)
+def _holidays(rules, year):
+    return frozenset(rules(year))
+
+
+EXCHANGES = {
+    "XNYS": Exchange("XNYS", "America/New_York", time(9, 30), time(16, 0), nyse_holidays),
+    "XSWX": Exchange("XSWX", "Europe/Zurich", time(9, 0), time(17, 30), six_holidays),
+    "XLON": Exchange("XLON", "Europe/London", time(8, 0), time(16, 30)),
+    "XETR": Exchange("XETR", "Europe/Berlin", time(9, 0), time(17, 30)),
+    "XTSE": Exchange("XTSE", "America/Toronto", time(9, 30), time(16, 0)),
+}
+
+# Yahoo Finance ticker suffix -> exchange; symbols without a suffix trade in the US
+SUFFIXES = {"SW": "XSWX", "L": "XLON", "DE": "XETR", "TO": "XTSE"}
+DEFAULT_EXCHANGE = "XNYS"
+
+# Quote currency per exchange as Yahoo Finance reports it; London quotes in pence
+CURRENCIES = {"XNYS": "USD", "XSWX": "CHF", "XLON": "GBp", "XETR": "EUR", "XTSE": "CAD"}
+
+
+def get_exchange(stock, config=None):
+    """Exchange of a configured stock, from its "exchange" key or its ticker suffix
+
+    The optional "markets" section of config.json adds holidays per exchange code,
+    e.g. ``{"markets": {"XSWX": {"holidays": ["2026-12-29"]}}}``.
+    """
+    code = stock.get("exchange")
+    if code is None:
+        _, _, suffix = stock["symbol"].rpartition(".")
+        code = SUFFIXES.get(suffix, DEFAULT_EXCHANGE) if "." in stock["symbol"] else DEFAULT_EXCHANGE
+    if code not in EXCHANGES:
+        raise ValueError(f"Unknown exchange '{code}' for {stock['symbol']}")
+
+    exchange = EXCHANGES[code]
+    extra = (config or {}).get("markets", {}).get(code, {}).get("holidays")
+    if extra:
+        exchange = Exchange(
+            exchange.code,
+            exchange.timezone,
+            exchange.open,
+            exchange.close,
+            exchange.holiday_rules,
+            frozenset(date.fromisoformat(day) for day in extra),
+        )
+    return exchange
+
+
+def get_currency(stock, config=None):
+    """Quote currency of a configured stock, from its "currency" key or its exchange"""
+    return stock.get("currency") or CURRENCIES[get_exchange(stock, config).code]
+
+
+def needs_fetch(exchange, now, last_recorded=None):
+    """Whether a symbol should be fetched: its market is open or a close was not recorded yet"""
+    if exchange.is_open(now):
+        return True
+    if last_recorded is None:
+        return True
+    return last_recorded.astimezone(exchange.tz) < exchange.last_close(now) + CLOSE_GRACE
@@ -0,0 +1,184 @@
+"""
+Merkato: Run Metrics
+Timing spans and counters collected during a run, written as a JSON run report and
+optionally as a Prometheus textfile (node_exporter textfile collector format).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from datetime import datetime
+from pathlib import Path
+
+
+@dataclass
+class MetricsSettings:
+    """Report destinations from the "metrics" section of config.json; unset paths are not written"""
+
+    report: str | None = None
+    prometheus: str | None = None
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("metrics", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown metrics settings: {', '.join(sorted(unknown))}")
+        return cls(**section)
+
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Latency counts per LATENCY_BUCKETS bucket, plus one bucket for slower observations"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the ``percent`` percentile, or None without observations"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self):
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative[str(bound)] = seen
+        cumulative["+Inf"] = self.count
+        return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+
+class Metrics:
+    """Span timings (count, total, max seconds), latency histograms and counters of the current run"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_run()
+
+    def start_run(self, name="merkato"):
+        with self.lock:
+            self.run = name
+            self.started = datetime.now()
+            self.started_clock = time.perf_counter()
+            self.spans = {}
+            self.counters = {}
+            self.histograms = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            stats = self.spans.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def histogram(self, name, seconds):
+        with self.lock:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block as one occurrence of span ``name``, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def report(self):
+        with self.lock:
+            return {
+                "run": self.run,
+                "started": self.started.isoformat(),
+                "duration": time.perf_counter() - self.started_clock,
+                "spans": {
+                    name: {**stats, "mean": stats["total"] / stats["count"]}
+                    for name, stats in sorted(self.spans.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+            }
+
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def to_prometheus(report):
+    """Render a run report in the Prometheus text exposition format"""
+    run = report["run"]
+    started = datetime.fromisoformat(report["started"]).timestamp()
+    lines = [
+        "# TYPE merkato_run_duration_seconds gauge",
+        f'merkato_run_duration_seconds{{run="{run}"}} {report["duration"]:.6f}',
+        "# TYPE merkato_run_started_timestamp_seconds gauge",
+        f'merkato_run_started_timestamp_seconds{{run="{run}"}} {started:.3f}',
+    ]
+    for metric, key in (("span_seconds_total", "total"), ("span_seconds_max", "max"), ("span_count", "count")):
+        lines.append(f"# TYPE merkato_{metric} gauge")
+        for name, stats in report["spans"].items():
+            lines.append(f'merkato_{metric}{{run="{run}",span="{name}"}} {stats[key]}')
+    if report.get("histograms"):
+        lines.append("# TYPE merkato_latency_seconds histogram")
+    for name, histogram in report.get("histograms", {}).items():
+        labels = f'run="{run}",name="{name}"'
+        for bound, count in histogram["buckets"].items():
+            lines.append(f'merkato_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f"merkato_latency_seconds_sum{{{labels}}} {histogram['sum']:.6f}")
+        lines.append(f"merkato_latency_seconds_count{{{labels}}} {histogram['count']}")
+    for name, value in report["counters"].items():
+        metric = f"merkato_{_metric_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f'{metric}{{run="{run}"}} {value}']
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def write_report(config, registry=None):
+    """Write the run report and Prometheus textfile configured under "metrics" in config.json"""
+    registry = registry or metrics
+    settings = MetricsSettings.from_config(config)
+    report = registry.report()
+    if settings.report:
+        _write_atomic(settings.report, json.dumps(report, indent=2) + "\n")
+    if settings.prometheus:
+        _write_atomic(settings.prometheus, to_prometheus(report))
+    return report
+
+
+# Process-wide registry used by the monitor, the report and the utilities
+metrics = Metrics()
+span = metrics.span
+incr = metrics.incr
@@ -0,0 +1,66 @@
+"""
+Merkato: Portfolios
+Named watchlists sharing one monitor: each portfolio has its own stocks, rules and
+recipients, while every symbol is fetched and recorded once for all of them.
+"""
+
+from dataclasses import dataclass, field
+
+PORTFOLIO_KEYS = ("name", "stocks", "recipients")
+
+
+@dataclass
+class Portfolio:
+    """Stocks alerting ``recipients``; the unnamed default portfolio mails the EMAIL_RECIPIENT"""
+
+    name: str | None
+    stocks: list = field(default_factory=list)
+    recipients: list = field(default_factory=list)
+
+
+def get_portfolios(config):
+    """The top-level "stocks" as the default portfolio, followed by the "portfolios" entries
+
+    Stocks of named portfolios are tagged with a "portfolio" key, which scopes their
+    alert rules and alert state to that portfolio.
+    """
+    portfolios = [Portfolio(None, config.get("stocks", []))]
+    names = set()
+    for index, section in enumerate(config.get("portfolios", [])):
+        name = section.get("name")
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"Portfolio #{index + 1} has no name")
+        if name in names:
+            raise ValueError(f"Duplicate portfolio '{name}'")
+        names.add(name)
+        unknown = set(section) - set(PORTFOLIO_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown portfolio settings for '{name}': {', '.join(sorted(unknown))}")
+        recipients = section.get("recipients", [])
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        if not isinstance(recipients, list) or not all(isinstance(r, str) and r for r in recipients):
+            raise ValueError(f"'recipients' of portfolio '{name}' must be a list of email addresses")
+        stocks = section.get("stocks", [])
+        if not isinstance(stocks, list):
+            raise ValueError(f"'stocks' of portfolio '{name}' must be a list")
+        portfolios.append(Portfolio(name, [{**stock, "portfolio": name} for stock in stocks], recipients))
+    return portfolios
+
+
+def all_stocks(config):
+    """Stocks of every portfolio; a symbol appears once per portfolio watching it"""
+    return [stock for portfolio in get_portfolios(config) for stock in portfolio.stocks]
+
+
+def unique_symbols(stocks):
+    """Symbols of ``stocks`` in order, each once"""
+    return list(dict.fromkeys(stock["symbol"] for stock in stocks))
+
+
+def get_recipients(config, name):
+    """Recipients of portfolio ``name``; ``[None]`` means the default EMAIL_RECIPIENT"""
+    for portfolio in get_portfolios(config):
+        if portfolio.name == name:
+            return portfolio.recipients or [None]
+    return [None]
@@ -0,0 +1,273 @@
+"""
+Merkato: Price Providers
+Ranked price backends behind one fetch function: a slow primary is hedged with a
+request to the next provider, unhealthy providers are skipped by a circuit breaker
+and failed symbols fail over down the ranking.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+from merkato.fetch import FetchSettings
+from merkato.metrics import Histogram, incr, metrics
+from merkato.util import lazy_import
+
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+
+
+class YahooProvider:
+    """Bulk yfinance downloads (stock_monitor.get_stock_prices)"""
+
+    name = "yahoo"
+
+    def fetch(self, symbols, timeout):
+        # Imported here because the monitor builds on this module
+        from merkato.stock_monitor import get_stock_prices
+
+        return get_stock_prices(symbols, timeout)
+
+
+class YahooTickerProvider:
+    """One yfinance Ticker history request per symbol, a separate path from the bulk download"""
+
+    name = "yahoo-ticker"
+
+    def fetch(self, symbols, timeout):
+        prices, failures = {}, {}
+        for symbol in symbols:
+            try:
+                data = yf.Ticker(symbol).history(period="1d", timeout=timeout)
+            except Exception as e:
+                failures[symbol] = str(e) or type(e).__name__
+                continue
+            if data.empty:
+                failures[symbol] = "no data returned"
+            else:
+                prices[symbol] = float(data["Close"].iloc[-1])
+        return prices, failures
+
+
+class FileProvider:
+    """Latest prices from a local file: a ``{"SYMBOL": price}`` JSON object or a recorded price CSV
+
+    Stands in for a live backend in tests and offline runs.
+    """
+
+    name = "file"
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def fetch(self, symbols, timeout):
+        if self.path.suffix == ".json":
+            quotes = json.loads(self.path.read_text())
+        else:
+            df = pd.read_csv(self.path)
+            quotes = df.groupby("symbol", sort=False)["price"].last().to_dict()
+        prices = {symbol: float(quotes[symbol]) for symbol in symbols if symbol in quotes}
+        return prices, {symbol: "not in price file" for symbol in symbols if symbol not in prices}
+
+
+PROVIDERS = {"yahoo": YahooProvider, "yahoo-ticker": YahooTickerProvider, "file": FileProvider}
+
+
+@dataclass
+class ProviderSettings:
+    """Provider ranking, hedging and circuit breaker policy from the "providers" section of config.json
+
+    The primary is hedged once its request runs past the ``hedge_percentile`` of its
+    observed latencies, or past ``hedge_delay`` seconds until ``hedge_min_samples``
+    latencies were observed.
+    """
+
+    order: list = field(default_factory=lambda: ["yahoo"])
+    file: str | None = None
+    hedge_percentile: float = 95.0
+    hedge_min_samples: int = 20
+    hedge_delay: float = 2.0
+    failure_threshold: int = 3
+    reset_timeout: float = 300.0
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("providers", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown providers settings: {', '.join(sorted(unknown))}")
+        settings = cls(**section)
+        invalid = [name for name in settings.order if name not in PROVIDERS]
+        if invalid or not settings.order:
+            raise ValueError(f"providers order must name some of: {', '.join(PROVIDERS)}")
+        if "file" in settings.order and not settings.file:
+            raise ValueError("the file provider needs a providers 'file' path")
+        return settings
+
+    def build(self):
+        return [FileProvider(self.file) if name == "file" else PROVIDERS[name]() for name in self.order]
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures, then lets one trial request
+    through every ``reset_timeout`` seconds until one succeeds"""
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        """Whether a request may go out; a half-open breaker re-opens until its trial succeeds"""
+        state = self.state
+        if state == "half-open":
+            self.opened_at = self.clock()
+        return state != "open"
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+
+
+class ProviderChain:
+    """fetch_batch for fetch_prices over ranked providers with hedging, breakers and failover
+
+    ``concurrency`` is the number of threads calling fetch() at once; the pool has room
+    for each of them to run a request and its hedge side by side.
+    """
+
+    def __init__(self, providers, settings=None, clock=time.monotonic, concurrency=1):
+        self.providers = providers
+        self.settings = settings or ProviderSettings()
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.breakers = {
+            provider.name: CircuitBreaker(self.settings.failure_threshold, self.settings.reset_timeout, clock)
+            for provider in providers
+        }
+        self.latency = {provider.name: Histogram() for provider in providers}
+        self.executor = ThreadPoolExecutor(
+            max_workers=2 * concurrency + len(providers), thread_name_prefix="merkato-provider"
+        )
+
+    def hedge_delay(self, provider):
+        """Seconds to wait for ``provider`` before hedging with the next one"""
+        with self.lock:
+            histogram = self.latency[provider.name]
+            if histogram.count < self.settings.hedge_min_samples:
+                return self.settings.hedge_delay
+            return histogram.percentile(self.settings.hedge_percentile)
+
+    def _healthy(self):
+        """Providers in rank order whose breaker lets a request through, checked lazily"""
+        for provider in self.providers:
+            with self.lock:
+                allowed = self.breakers[provider.name].allow()
+            if allowed:
+                yield provider
+            else:
+                incr(f"provider.{provider.name}.skipped")
+
+    def _call(self, provider, symbols, timeout, started=None):
+        if started is not None:
+            started.set()
+        start = self.clock()
+        try:
+            prices, failures = provider.fetch(symbols, timeout)
+        except Exception:
+            with self.lock:
+                self.breakers[provider.name].failure()
+            incr(f"provider.{provider.name}.failures")
+            raise
+        latency = self.clock() - start
+        with self.lock:
+            self.latency[provider.name].observe(latency)
+            if prices or not symbols:
+                self.breakers[provider.name].success()
+            else:
+                self.breakers[provider.name].failure()
+        metrics.histogram(f"provider.{provider.name}", latency)
+        incr(f"provider.{provider.name}.requests")
+        return prices, failures
+
+    def fetch(self, symbols, timeout):
+        """Return ``(prices, failures)`` for ``symbols`` like stock_monitor.get_stock_prices"""
+        symbols = list(symbols)
+        prices, failures = {}, {}
+        healthy = self._healthy()
+        provider = next(healthy, None)
+        if provider is None:
+            # Every breaker is open: still probe the best-ranked provider rather than drop the tick
+            provider = self.providers[0]
+
+        while provider is not None:
+            remaining = [symbol for symbol in symbols if symbol not in prices]
+            started = threading.Event()
+            futures = {self.executor.submit(self._call, provider, remaining, timeout, started): provider}
+            # The hedge timer starts once the request runs, not while it waits for a worker
+            started.wait(timeout)
+            done, _ = wait(futures, timeout=self.hedge_delay(provider))
+            if not done:
+                hedge = next(healthy, None)
+                if hedge is not None:
+                    incr("provider.hedges")
+                    futures[self.executor.submit(self._call, hedge, remaining, timeout)] = hedge
+
+            # Take results as they arrive until every symbol has a price or all requests are done
+            deadline = self.clock() + timeout
+            pending = set(futures)
+            while pending and remaining:
+                done, pending = wait(pending, timeout=max(0.0, deadline - self.clock()), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    name = futures[future].name
+                    try:
+                        got, failed = future.result()
+                    except Exception as e:
+                        failures.update({symbol: f"{name}: {e}" for symbol in remaining})
+                        continue
+                    prices.update({symbol: got[symbol] for symbol in remaining if symbol in got})
+                    failures.update({symbol: f"{name}: {error}" for symbol, error in failed.items()})
+                    remaining = [symbol for symbol in remaining if symbol not in prices]
+
+            # Fail the symbols still missing over to the next healthy provider
+            provider = next(healthy, None) if remaining else None
+
+        failures = {symbol: error for symbol, error in failures.items() if symbol not in prices}
+        for symbol in symbols:
+            if symbol not in prices:
+                failures.setdefault(symbol, "no data returned")
+        return prices, failures
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_chains = {}
+
+
+def get_provider_chain(config):
+    """Process-wide provider chain for the configured providers, so breakers and latencies persist across ticks"""
+    settings = ProviderSettings.from_config(config)
+    concurrency = FetchSettings.from_config(config).max_workers
+    key = json.dumps([settings.__dict__, concurrency], sort_keys=True)
+    if key not in _chains:
+        _chains[key] = ProviderChain(settings.build(), settings, concurrency=concurrency)
+    return _chains[key]
@@ -0,0 +1,141 @@
+"""
+Merkato: Quote Cache
+On-disk cache of fetched quotes with per-symbol TTLs and an LRU size bound, so reruns
+within minutes do not hit Yahoo Finance again.
+"""
+
+import sqlite3
+import time
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+QUOTE_CACHE_FILE = "data/quote_cache.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    price REAL NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (symbol, interval)
+);
+CREATE INDEX IF NOT EXISTS quotes_accessed_at ON quotes (accessed_at);
+"""
+
+INSERT_QUOTE = """
+INSERT OR REPLACE INTO quotes (symbol, interval, price, fetched_at, accessed_at)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+EVICT_LRU = """
+DELETE FROM quotes WHERE rowid NOT IN (
+    SELECT rowid FROM quotes ORDER BY accessed_at DESC LIMIT ?
+)
+"""
+
+
+@dataclass
+class CacheSettings:
+    """Quote cache policy from the "cache" section of config.json; TTLs are in seconds"""
+
+    enabled: bool = True
+    path: str = QUOTE_CACHE_FILE
+    ttl: float = 300.0
+    max_entries: int = 1000
+    symbol_ttl: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("cache", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown cache settings: {', '.join(sorted(unknown))}")
+        return cls(**section)
+
+
+class QuoteCache:
+    """SQLite quote store keyed by symbol and interval, counting hits and misses"""
+
+    def __init__(self, settings=None, clock=time.time):
+        self.settings = settings or CacheSettings()
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        path = Path(self.settings.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ttl(self, symbol):
+        return self.settings.symbol_ttl.get(symbol, self.settings.ttl)
+
+    def get_many(self, symbols, interval="1d", ttl=None):
+        """Fresh cached prices for ``symbols``; missing or expired symbols count as misses
+
+        ``ttl`` overrides the configured TTLs, e.g. for FX rates.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        now = self.clock()
+        query = "SELECT symbol, price, fetched_at FROM quotes WHERE interval = ?"
+        query += f" AND symbol IN ({', '.join('?' * len(symbols))})"
+        rows = self.db.execute(query, [interval, *symbols]).fetchall()
+        prices = {
+            symbol: price
+            for symbol, price, fetched_at in rows
+            if now - fetched_at < (self.ttl(symbol) if ttl is None else ttl)
+        }
+        with self.db:
+            self.db.executemany(
+                "UPDATE quotes SET accessed_at = ? WHERE symbol = ? AND interval = ?",
+                [(now, symbol, interval) for symbol in prices],
+            )
+        self.hits += len(prices)
+        self.misses += len(symbols) - len(prices)
+        return prices
+
+    def get(self, symbol, interval="1d"):
+        return self.get_many([symbol], interval).get(symbol)
+
+    def put_many(self, prices, interval="1d"):
+        """Store fetched prices, evicting the least recently used entries beyond ``max_entries``"""
+        if not prices:
+            return
+        now = self.clock()
+        with self.db:
+            self.db.executemany(
+                INSERT_QUOTE, [(symbol, interval, float(price), now, now) for symbol, price in prices.items()]
+            )
+            self.db.execute(EVICT_LRU, (self.settings.max_entries,))
+
+    def put(self, symbol, price, interval="1d"):
+        self.put_many({symbol: price}, interval)
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM quotes").fetchone()[0]
+
+    def report(self):
+        print(f"Quote cache: {self.hits} hits, {self.misses} misses")
+
+
+def open_quote_cache(config=None):
+    """Open the quote cache configured in config.json, or None when it is disabled"""
+    settings = CacheSettings.from_config(config or {})
+    return QuoteCache(settings) if settings.enabled else None
+
+
+def disable_cache(config):
+    """Turn the quote cache off for this run, as the --no-cache flags do"""
+    config.setdefault("cache", {})["enabled"] = False
+    return config
@@ -0,0 +1,357 @@
+"""
+Merkato: Rollup Cache
+Persisted per-symbol daily OHLC bars and running statistics, updated incrementally
+as prices are recorded so reports never rescan the raw history.
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from merkato.storage import CsvStore, get_store
+from merkato.util import DATA_COLUMNS, lazy_import
+
+pd = lazy_import("pandas")
+
+ROLLUP_FILE = "data/rollups.sqlite"
+FINGERPRINT_BYTES = 4096
+TAIL_BYTES = 64 * 1024
+# Bumped when the tables change; a cache with another version is rebuilt from scratch
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily (
+    symbol TEXT NOT NULL,
+    day TEXT NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    count INTEGER NOT NULL,
+    first_ts TEXT NOT NULL,
+    last_ts TEXT NOT NULL,
+    PRIMARY KEY (symbol, day)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    symbol TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    low REAL NOT NULL,
+    high REAL NOT NULL,
+    first_ts TEXT NOT NULL,
+    last_ts TEXT NOT NULL,
+    last_price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_days (
+    path TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (path, symbol, day)
+);
+"""
+
+INSERT_SOURCE_DAY = "INSERT OR IGNORE INTO source_days (path, symbol, day) VALUES (:path, :symbol, :day)"
+
+REBUILD_SYMBOLS = """
+INSERT INTO symbols (symbol, count, low, high, first_ts, last_ts, last_price)
+SELECT symbol, sum(count), min(low), max(high), min(first_ts), max(last_ts),
+       (SELECT close FROM daily AS d WHERE d.symbol = daily.symbol ORDER BY day DESC LIMIT 1)
+FROM daily GROUP BY symbol
+"""
+
+UPSERT_DAILY = """
+INSERT INTO daily (symbol, day, open, high, low, close, count, first_ts, last_ts)
+VALUES (:symbol, :day, :open, :high, :low, :close, :count, :first_ts, :last_ts)
+ON CONFLICT (symbol, day) DO UPDATE SET
+    open = CASE WHEN excluded.first_ts < daily.first_ts THEN excluded.open ELSE daily.open END,
+    close = CASE WHEN excluded.last_ts >= daily.last_ts THEN excluded.close ELSE daily.close END,
+    high = max(daily.high, excluded.high),
+    low = min(daily.low, excluded.low),
+    count = daily.count + excluded.count,
+    first_ts = min(daily.first_ts, excluded.first_ts),
+    last_ts = max(daily.last_ts, excluded.last_ts)
+"""
+
+UPSERT_SYMBOL = """
+INSERT INTO symbols (symbol, count, low, high, first_ts, last_ts, last_price)
+VALUES (:symbol, :count, :low, :high, :first_ts, :last_ts, :close)
+ON CONFLICT (symbol) DO UPDATE SET
+    last_price = CASE WHEN excluded.last_ts >= symbols.last_ts THEN excluded.last_price ELSE symbols.last_price END,
+    count = symbols.count + excluded.count,
+    low = min(symbols.low, excluded.low),
+    high = max(symbols.high, excluded.high),
+    first_ts = min(symbols.first_ts, excluded.first_ts),
+    last_ts = max(symbols.last_ts, excluded.last_ts)
+"""
+
+
+def _fingerprint(f, size):
+    """Hash of the bytes just before ``size``, used to check that a grown file was only appended to"""
+    start = max(0, size - FINGERPRINT_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(size - start)).hexdigest()
+
+
+def _parse_rows(chunk):
+    return pd.read_csv(io.BytesIO(chunk), names=DATA_COLUMNS, header=None)
+
+
+def _bars(df):
+    """Aggregate price rows into one OHLC bar per symbol and day"""
+    timestamps = pd.to_datetime(df["timestamp"], format="ISO8601").dt.strftime("%Y-%m-%dT%H:%M:%S.%f")
+    df = df.assign(timestamp=timestamps, symbol=df["symbol"].astype(str))
+    df = df.assign(day=df["timestamp"].str[:10]).sort_values("timestamp", kind="stable")
+    bars = df.groupby(["symbol", "day"], sort=False).agg(
+        open=("price", "first"),
+        high=("price", "max"),
+        low=("price", "min"),
+        close=("price", "last"),
+        count=("price", "size"),
+        first_ts=("timestamp", "first"),
+        last_ts=("timestamp", "last"),
+    )
+    return bars.reset_index().to_dict("records")
+
+
+class RollupCache:
+    """SQLite-backed daily bars and running min/max/count per symbol"""
+
+    def __init__(self, path=ROLLUP_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Older caches cannot tell which file each bar came from, start over
+            for table in ("daily", "symbols", "sources", "source_days"):
+                self.db.execute(f"DROP TABLE IF EXISTS {table}")
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, rows, source=None):
+        """Fold ``(timestamp, symbol, price)`` rows into the daily bars and running statistics
+
+        With a ``source`` file the days it contributed to are remembered, so an edit to
+        that file can rebuild exactly those bars.
+        """
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows), columns=DATA_COLUMNS)
+        if df.empty:
+            return 0
+        bars = _bars(df)
+        with self.db:
+            self.db.executemany(UPSERT_DAILY, bars)
+            self.db.executemany(UPSERT_SYMBOL, bars)
+            if source is not None:
+                self.db.executemany(INSERT_SOURCE_DAY, [{**bar, "path": source} for bar in bars])
+        return len(df)
+
+    def sync(self, data_dir):
+        """Bring the cache up to date with the yearly CSV files in ``data_dir``
+
+        Files whose size and modification time are unchanged are skipped. A file that grew
+        and still ends its ingested part with the same bytes was appended to, and only the
+        new bytes are read. Any other change (a rewrite, truncation or in-place edit) drops
+        the bars the file contributed to and re-ingests it.
+        """
+        ingested = 0
+        for data_file in sorted(Path(data_dir).glob("*.csv")):
+            if not data_file.stem.isdigit():
+                continue
+            key = str(data_file)
+            known = self.db.execute("SELECT size, mtime_ns, fingerprint FROM sources WHERE path = ?", (key,)).fetchone()
+            with open(data_file, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if known is not None and (stat.st_size, stat.st_mtime_ns) == known[:2]:
+                    continue
+                offset = 0
+                if known is not None:
+                    if stat.st_size > known[0] and _fingerprint(f, known[0]) == known[2]:
+                        offset = known[0]
+                    else:
+                        print(f"Rollups: {data_file} was modified, rebuilding its days")
+                        self._invalidate_source(key)
+
+                f.seek(offset)
+                chunk = f.read()
+                # Leave a torn last line for the next sync
+                chunk = chunk[: chunk.rfind(b"\n") + 1]
+                end = offset + len(chunk)
+                if offset == 0:
+                    chunk = chunk[chunk.find(b"\n") + 1 :]
+                if chunk.strip():
+                    ingested += self.record(_parse_rows(chunk), key)
+                with self.db:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO sources (path, size, mtime_ns, fingerprint) VALUES (?, ?, ?, ?)",
+                        (key, end, stat.st_mtime_ns, _fingerprint(f, end)),
+                    )
+        return ingested
+
+    def _invalidate_source(self, path):
+        """Drop the bars ``path`` contributed to and restore them from the other files' rows
+
+        A yearly file may hold rows of another year, so bars are tracked per source file
+        rather than by the year in its name.
+        """
+        affected = self.db.execute("SELECT symbol, day FROM source_days WHERE path = ?", (path,)).fetchall()
+        others = self.db.execute(
+            """
+            SELECT DISTINCT s.path, s.size FROM sources AS s JOIN source_days AS d ON d.path = s.path
+            WHERE s.path != ? AND (d.symbol, d.day) IN (SELECT symbol, day FROM source_days WHERE path = ?)
+            """,
+            (path, path),
+        ).fetchall()
+        with self.db:
+            self.db.execute(
+                "DELETE FROM daily WHERE (symbol, day) IN (SELECT symbol, day FROM source_days WHERE path = ?)",
+                (path,),
+            )
+            self.db.execute("DELETE FROM source_days WHERE path = ?", (path,))
+            self.db.execute("DELETE FROM sources WHERE path = ?", (path,))
+            self.db.execute("DELETE FROM symbols")
+            self.db.execute(REBUILD_SYMBOLS)
+
+        keys = pd.MultiIndex.from_tuples(affected, names=["symbol", "day"])
+        for other, size in others:
+            with open(other, "rb") as f:
+                chunk = f.read(size)
+            df = _parse_rows(chunk[chunk.find(b"\n") + 1 :])
+            days = pd.to_datetime(df["timestamp"], format="ISO8601").dt.strftime("%Y-%m-%d")
+            self.record(df[pd.MultiIndex.from_arrays([df["symbol"].astype(str), days]).isin(keys)], other)
+
+    def rebuild(self, data_dir):
+        """Drop every cached aggregate and re-ingest all yearly files"""
+        with self.db:
+            for table in ("daily", "symbols", "sources", "source_days"):
+                self.db.execute(f"DELETE FROM {table}")
+        return self.sync(data_dir)
+
+    def daily(self, symbols=None, start=None, end=None):
+        """Daily bars for ``symbols`` with ``start <= day < end`` (dates or ISO strings)"""
+        query = "SELECT symbol, day, open, high, low, close, count FROM daily WHERE 1 = 1"
+        params = []
+        if symbols is not None:
+            symbols = list(symbols)
+            query += f" AND symbol IN ({', '.join('?' * len(symbols))})"
+            params += symbols
+        if start is not None:
+            query += " AND day >= ?"
+            params.append(str(pd.Timestamp(start).date()))
+        if end is not None:
+            query += " AND day < ?"
+            params.append(str(pd.Timestamp(end).date()))
+        df = pd.read_sql_query(query + " ORDER BY day, symbol", self.db, params=params)
+        df["day"] = pd.to_datetime(df["day"])
+        return df
+
+    def summary(self, symbols=None):
+        """Running all-time statistics per symbol, indexed by symbol"""
+        df = pd.read_sql_query("SELECT * FROM symbols ORDER BY symbol", self.db, index_col="symbol")
+        return df if symbols is None else df[df.index.isin(list(symbols))]
+
+
+def _rollup_path(config):
+    return (config or {}).get("storage", {}).get("rollups", ROLLUP_FILE)
+
+
+def open_rollups(config=None):
+    """Open the rollup cache configured under "storage" in config.json, synced with the CSV files
+
+    The Parquet backend has no byte offsets to track, so its cache is only fed by
+    ``update_rollups`` and is not invalidated by edits to the dataset.
+    """
+    cache = RollupCache(_rollup_path(config))
+    store = get_store(config)
+    if isinstance(store, CsvStore):
+        cache.sync(store.root)
+    return cache
+
+
+def update_rollups(config, store, rows):
+    """Update the rollup cache after ``rows`` were appended to ``store``"""
+    if isinstance(store, CsvStore):
+        # Syncing ingests exactly the freshly appended bytes and catches manual edits
+        open_rollups(config).close()
+        return
+    with RollupCache(_rollup_path(config)) as cache:
+        cache.record(rows)
+
+
+def _parse_row(line):
+    try:
+        timestamp, symbol, price = line.decode().split(",")
+        return symbol, (datetime.fromisoformat(timestamp), float(price))
+    except ValueError:
+        # The header, a blank line or a torn row
+        return None, None
+
+
+def tail_records(data_dir, symbols):
+    """Last recorded ``(timestamp, price)`` per symbol, read backwards from the newest yearly CSVs
+
+    Reading stops as soon as every symbol has been seen, so a cold rollup cache costs
+    the last few kilobytes of history instead of a full ingest.
+    """
+    missing = set(symbols)
+    records = {}
+    paths = [path for path in Path(data_dir).glob("*.csv") if path.stem.isdigit()]
+    for path in sorted(paths, key=lambda path: int(path.stem), reverse=True):
+        with open(path, "rb") as f:
+            end = f.seek(0, io.SEEK_END)
+            # Text after the last newline is a torn row
+            partial = None
+            while end > 0 and missing:
+                start = max(0, end - TAIL_BYTES)
+                f.seek(start)
+                lines = f.read(end - start).split(b"\n")
+                if partial is not None:
+                    lines[-1] += partial
+                else:
+                    lines.pop()
+                partial = lines.pop(0) if start > 0 else None
+                for line in reversed(lines):
+                    symbol, record = _parse_row(line)
+                    if symbol in missing:
+                        records[symbol] = record
+                        missing.discard(symbol)
+                end = start
+        if not missing:
+            break
+    return records
+
+
+def load_last_records(config, symbols):
+    """Last recorded ``(timestamp, price)`` per symbol, read from the rollup cache
+
+    With the CSV backend and a cold cache the records come from the tail of the yearly
+    files instead, leaving the full ingest to the rollup update after prices are recorded.
+    """
+    symbols = list(symbols)
+    store = get_store(config)
+    # Plain SQL keeps a run where every market is closed from importing pandas
+    with RollupCache(_rollup_path(config)) as cache:
+        if isinstance(store, CsvStore):
+            if cache.db.execute("SELECT 1 FROM sources LIMIT 1").fetchone() is None:
+                return tail_records(store.root, symbols)
+            cache.sync(store.root)
+        rows = cache.db.execute(
+            f"SELECT symbol, last_ts, last_price FROM symbols WHERE symbol IN ({', '.join('?' * len(symbols))})",
+            symbols,
+        ).fetchall()
+    return {symbol: (datetime.fromisoformat(last_ts), last_price) for symbol, last_ts, last_price in rows}
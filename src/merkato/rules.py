@@ -0,0 +1,276 @@
+"""
+Merkato: Alert Rules
+Parses the alert rules of config.json once and compiles them per symbol into sorted
+threshold arrays and interval indexes, so a tick is evaluated by binary search.
+"""
+
+import math
+from dataclasses import dataclass, field, fields
+from datetime import date, timedelta
+
+from merkato.alert_state import AlertSettings
+from merkato.fx import format_money
+from merkato.markets import get_currency
+from merkato.util import lazy_import
+
+np = lazy_import("numpy")
+
+OPERATORS = ("<", "<=", ">", ">=")
+# Alert policy keys a stock or a single rule may override
+ALERT_OPTIONS = tuple(f.name for f in fields(AlertSettings) if f.name != "state_file")
+
+
+@dataclass
+class Rule:
+    """One alert condition on a symbol
+
+    ``kind`` is "price" (``operator`` ``value``), "change" (percent move over ``days``
+    compared with ``operator`` ``value``), "range" (price within or, with ``outside``,
+    beyond ``value``..``high``) or "ma_cross" (price crossing its ``window``-day moving
+    average in ``direction``). Rules of a named portfolio carry its name in ``portfolio``.
+    Thresholds are in the symbol's quote ``currency``.
+    """
+
+    symbol: str
+    kind: str
+    operator: str | None = None
+    value: float | None = None
+    high: float | None = None
+    outside: bool = False
+    days: int | None = None
+    window: int | None = None
+    direction: str | None = None
+    options: dict = field(default_factory=dict)
+    portfolio: str | None = None
+    currency: str = "USD"
+
+    @property
+    def id(self):
+        """Stable key of the rule; a price rule keeps the key of the legacy target_price entry"""
+        if self.kind == "price":
+            key = f"{self.symbol}|{self.operator}|{self.value}"
+        elif self.kind == "change":
+            key = f"{self.symbol}|change|{self.days}d|{self.operator}|{self.value}"
+        elif self.kind == "range":
+            key = f"{self.symbol}|{'outside' if self.outside else 'inside'}|{self.value}|{self.high}"
+        else:
+            key = f"{self.symbol}|ma{self.window}|{self.direction}"
+        return key if self.portfolio is None else f"{key}|@{self.portfolio}"
+
+    def describe(self):
+        if self.kind == "price":
+            return f"{self.operator} {format_money(self.value, self.currency)}"
+        if self.kind == "change":
+            return f"{self.days}-day change {self.operator} {self.value:+.2f}%"
+        if self.kind == "range":
+            low, high = format_money(self.value, self.currency), format_money(self.high, self.currency)
+            return f"{'outside' if self.outside else 'inside'} {low}-{high}"
+        return f"crossed {self.direction} {self.window}-day average"
+
+    @property
+    def lookback(self):
+        """Calendar days of daily closes the rule needs"""
+        if self.kind == "change":
+            return self.days + 7
+        if self.kind == "ma_cross":
+            return math.ceil(self.window * 7 / 5) + 10
+        return 0
+
+
+def _number(rule, key):
+    value = rule.get(key)
+    if not isinstance(value, int | float) or isinstance(value, bool):
+        raise ValueError(f"'{key}' must be a number")
+    return float(value)
+
+
+def _positive_int(rule, key):
+    value = rule.get(key)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"'{key}' must be a positive integer")
+    return value
+
+
+def _operator(rule):
+    operator = rule.get("operator", "<=")
+    if operator not in OPERATORS:
+        raise ValueError(f"invalid operator '{operator}'")
+    return operator
+
+
+def parse_rule(symbol, definition, options=None):
+    """Build a Rule from one entry of a stock's "rules" list"""
+    options = {**(options or {}), **{key: definition[key] for key in ALERT_OPTIONS if key in definition}}
+    kind = definition.get("type", "price")
+    if kind == "price":
+        return Rule(symbol, kind, _operator(definition), _number(definition, "value"), options=options)
+    if kind == "change":
+        days = _positive_int(definition, "days")
+        return Rule(symbol, kind, _operator(definition), _number(definition, "percent"), days=days, options=options)
+    if kind == "range":
+        low, high = _number(definition, "low"), _number(definition, "high")
+        if low > high:
+            raise ValueError("'low' must not exceed 'high'")
+        return Rule(symbol, kind, value=low, high=high, outside=bool(definition.get("outside")), options=options)
+    if kind == "ma_cross":
+        direction = definition.get("direction", "above")
+        if direction not in ("above", "below"):
+            raise ValueError(f"invalid direction '{direction}'")
+        return Rule(symbol, kind, window=_positive_int(definition, "window"), direction=direction, options=options)
+    raise ValueError(f"unknown rule type '{kind}'")
+
+
+def parse_rules(stock):
+    """Rules of a configured stock: its target_price/operator pair plus its "rules" list"""
+    symbol = stock["symbol"]
+    options = {key: stock[key] for key in ALERT_OPTIONS if key in stock}
+    rules = []
+    if "target_price" in stock:
+        rules.append(Rule(symbol, "price", stock.get("operator", "<="), stock["target_price"], options=options))
+    for definition in stock.get("rules", []):
+        try:
+            rules.append(parse_rule(symbol, definition, options))
+        except ValueError as e:
+            print(f"Invalid rule {definition} for {symbol}: {e}, skipping.")
+    currency = get_currency(stock)
+    for rule in rules:
+        rule.portfolio = stock.get("portfolio")
+        rule.currency = currency
+    return rules
+
+
+class Thresholds:
+    """Rules comparing one value against a threshold, sorted per operator
+
+    The rules met by a value are a prefix or suffix of each sorted array, found by binary search.
+    """
+
+    def __init__(self, rules):
+        self.sides = {}
+        for operator in OPERATORS:
+            selected = sorted((rule for rule in rules if rule.operator == operator), key=lambda rule: rule.value)
+            if selected:
+                self.sides[operator] = (np.array([rule.value for rule in selected]), selected)
+
+    def matches(self, x):
+        fired = []
+        for operator, (values, rules) in self.sides.items():
+            if operator == "<":
+                fired += rules[np.searchsorted(values, x, side="right") :]
+            elif operator == "<=":
+                fired += rules[np.searchsorted(values, x, side="left") :]
+            elif operator == ">":
+                fired += rules[: np.searchsorted(values, x, side="left")]
+            else:
+                fired += rules[: np.searchsorted(values, x, side="right")]
+        return fired
+
+
+class Ranges:
+    """Range rules indexed by their sorted lower bounds"""
+
+    def __init__(self, rules):
+        inside = sorted((rule for rule in rules if not rule.outside), key=lambda rule: rule.value)
+        outside = [rule for rule in rules if rule.outside]
+        self.inside = inside
+        self.inside_lows = np.array([rule.value for rule in inside])
+        self.inside_highs = np.array([rule.high for rule in inside])
+        self.outside = outside
+        self.outside_bounds = np.array([(rule.value, rule.high) for rule in outside]).reshape(-1, 2)
+
+    def matches(self, x):
+        # Only ranges starting at or below x can contain it
+        count = np.searchsorted(self.inside_lows, x, side="right")
+        fired = [self.inside[i] for i in np.flatnonzero(self.inside_highs[:count] >= x)]
+        beyond = (x < self.outside_bounds[:, 0]) | (x > self.outside_bounds[:, 1])
+        fired += [self.outside[i] for i in np.flatnonzero(beyond)]
+        return fired
+
+
+class SymbolRules:
+    """Compiled rules of one symbol"""
+
+    def __init__(self, rules):
+        self.prices = Thresholds([rule for rule in rules if rule.kind == "price"])
+        self.ranges = Ranges([rule for rule in rules if rule.kind == "range"])
+        self.changes = {}
+        for rule in rules:
+            if rule.kind == "change":
+                self.changes.setdefault(rule.days, []).append(rule)
+        self.changes = {days: Thresholds(group) for days, group in self.changes.items()}
+        self.crosses = {}
+        for rule in rules:
+            if rule.kind == "ma_cross":
+                self.crosses.setdefault((rule.window, rule.direction), []).append(rule)
+
+    def evaluate(self, price, today, history, previous):
+        """Return ``(rule, condition)`` pairs met by ``price``"""
+        fired = [(rule, rule.describe()) for rule in self.prices.matches(price) + self.ranges.matches(price)]
+        if history is None:
+            return fired
+        days, closes = history
+
+        for lookback, thresholds in self.changes.items():
+            index = np.searchsorted(days, np.datetime64(today - timedelta(days=lookback), "D"), side="right") - 1
+            if index < 0:
+                continue
+            change = (price - closes[index]) / closes[index] * 100
+            fired += [(rule, f"{rule.describe()} ({change:+.2f}%)") for rule in thresholds.matches(change)]
+
+        for (window, direction), rules in self.crosses.items():
+            if previous is None or len(closes) < window:
+                continue
+            average = closes[-window:].mean()
+            if (direction == "above" and previous < average <= price) or (
+                direction == "below" and previous > average >= price
+            ):
+                fired += [(rule, f"{rule.describe()} ({format_money(average, rule.currency)})") for rule in rules]
+        return fired
+
+
+class RuleSet:
+    """All alert rules of the configured stocks, compiled once per config"""
+
+    def __init__(self, stocks):
+        self.rules = {}
+        grouped = {}
+        for stock in stocks:
+            for rule in parse_rules(stock):
+                self.rules[rule.id] = rule
+                grouped.setdefault(rule.symbol, []).append(rule)
+        self.by_symbol = {symbol: SymbolRules(rules) for symbol, rules in grouped.items()}
+        self.lookback = max((rule.lookback for rule in self.rules.values()), default=0)
+
+    @property
+    def needs_history(self):
+        return self.lookback > 0
+
+    def evaluate(self, prices, today=None, history=None, last_records=None):
+        """Rules met by the current ``prices``, as symbol -> ``(rule, condition)`` pairs
+
+        ``history`` maps symbols to ``(days, closes)`` arrays of daily closes before
+        ``today`` (see load_history) and ``last_records`` to the previously recorded
+        ``(timestamp, price)``, used by moving average crossings.
+        """
+        today = today or date.today()
+        history = history or {}
+        last_records = last_records or {}
+        fired = {}
+        for symbol, price in prices.items():
+            compiled = self.by_symbol.get(symbol)
+            if compiled is None:
+                continue
+            last = last_records.get(symbol)
+            matches = compiled.evaluate(price, today, history.get(symbol), last[1] if last else None)
+            if matches:
+                fired[symbol] = matches
+        return fired
+
+
+def load_history(cache, symbols, today, lookback):
+    """Daily closes of the last ``lookback`` days before ``today`` from a RollupCache"""
+    daily = cache.daily(symbols, start=today - timedelta(days=lookback), end=today)
+    return {
+        symbol: (bars["day"].to_numpy(dtype="datetime64[D]"), bars["close"].to_numpy(dtype=float))
+        for symbol, bars in daily.groupby("symbol", sort=False)
+    }
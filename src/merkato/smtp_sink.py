@@ -0,0 +1,106 @@
+"""
+Merkato: SMTP Sink
+Minimal in-process SMTP server that accepts every message, for tests and benchmarks.
+"""
+
+import socket
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+            sink.sockets.append(self.request)
+        self.reply("220 merkato-sink ready")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                self.wfile.write(b"250-merkato-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "HELO":
+                self.reply("250 merkato-sink")
+            elif verb == "AUTH":
+                with sink.lock:
+                    sink.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET"):
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b".\n", b""):
+                    data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                with sink.lock:
+                    sink.messages.append(message_from_bytes(b"".join(data)))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SmtpSink:
+    """SMTP server on localhost that records messages, connections and logins
+
+    Use as a context manager; ``email_config`` is ready to pass to EmailDispatcher.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = _Server((host, port), _Handler)
+        self.server.sink = self
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.sockets = []
+        self.thread = threading.Thread(target=self.server.serve_forever, name="merkato-smtp-sink", daemon=True)
+
+    @property
+    def email_config(self):
+        host, port = self.server.server_address[:2]
+        return {
+            "sender": "merkato@localhost",
+            "password": "secret",
+            "recipient": "team@localhost",
+            "smtp_server": host,
+            "smtp_port": port,
+            "starttls": False,
+        }
+
+    def drop_connections(self):
+        """Close every open client connection, as a server timing out idle sessions would"""
+        with self.lock:
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -4,30 +4,94 @@ Merkato: Stock Monitor Bot
 Checks stock prices hourly and sends email notifications when targets are met.
 """
 
+import argparse
 from datetime import datetime
 
-import pandas as pd
-import yfinance as yf
+from merkato.alert_state import AlertState
+from merkato.fetch import FetchResult, FetchSettings, fetch_prices
+from merkato.fx import format_money, load_converter, symbol_currencies
+from merkato.markets import get_currency, get_exchange, needs_fetch
+from merkato.metrics import incr, metrics, span, write_report
+from merkato.portfolios import all_stocks, get_recipients, unique_symbols
+from merkato.providers import get_provider_chain
+from merkato.quote_cache import disable_cache, open_quote_cache
+from merkato.rollups import load_last_records, open_rollups, update_rollups
+from merkato.rules import RuleSet, load_history
+from merkato.storage import get_store
+from merkato.util import flush_emails, lazy_import, load_config, queue_email
 
-from merkato.util import get_data_file, load_config, load_or_create_data, send_email
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
 
 
-def get_stock_price(symbol):
-    """Fetch current stock price using yfinance"""
+def get_stock_price(symbol, cache=None, config=None):
+    """Fetch current stock price, consulting the quote cache first
+
+    With a ``config`` the price comes from its provider chain (see merkato.providers),
+    otherwise straight from yfinance.
+    """
+    if cache is not None:
+        price = cache.get(symbol)
+        if price is not None:
+            return price
+    if config is not None:
+        prices, failures = get_provider_chain(config).fetch([symbol], REQUEST_TIMEOUT)
+        if symbol not in prices:
+            print(f"Error fetching {symbol}: {failures.get(symbol, 'no data returned')}")
+            return None
+        if cache is not None:
+            cache.put(symbol, prices[symbol])
+        return prices[symbol]
     try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="1d")
+        with span("fetch.symbol"):
+            ticker = yf.Ticker(symbol)
+            data = ticker.history(period="1d")
         if not data.empty:
-            return data["Close"].iloc[-1]
+            price = data["Close"].iloc[-1]
+            if cache is not None:
+                cache.put(symbol, price)
+            return price
         return None
     except Exception as e:
         print(f"Error fetching {symbol}: {e}")
         return None
 
 
-def save_data(df):
-    """Save data to CSV"""
-    df.to_csv(get_data_file(), index=False)
+BATCH_SIZE = 100
+REQUEST_TIMEOUT = 15
+
+
+def get_stock_prices(symbols, timeout=REQUEST_TIMEOUT, batch_size=BATCH_SIZE):
+    """Fetch current prices for many symbols using chunked bulk yfinance downloads
+
+    Returns a ``(prices, failures)`` tuple: a symbol -> price mapping and a
+    symbol -> error message mapping. A failing chunk or symbol never aborts the batch.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    prices = {}
+    failures = {}
+
+    for start in range(0, len(symbols), batch_size):
+        chunk = symbols[start : start + batch_size]
+        try:
+            data = yf.download(chunk, period="1d", group_by="column", progress=False, threads=True, timeout=timeout)
+        except Exception as e:
+            print(f"Error fetching batch {chunk[0]}..{chunk[-1]}: {e}")
+            failures.update({symbol: str(e) for symbol in chunk})
+            continue
+
+        closes = data["Close"] if data is not None and not data.empty else pd.DataFrame()
+        for symbol in chunk:
+            if symbol not in closes:
+                failures[symbol] = "no data returned"
+                continue
+            series = closes[symbol].dropna()
+            if series.empty:
+                failures[symbol] = "no data returned"
+            else:
+                prices[symbol] = float(series.iloc[-1])
+
+    return prices, failures
 
 
 OPERATORS = {
@@ -38,61 +102,273 @@ OPERATORS = {
 }
 
 
-def check_and_record_prices(config):
-    """Check all stocks and record prices"""
-    df = load_or_create_data()
-    timestamp = datetime.now().isoformat()
-    alerts = []
-
-    for stock in config["stocks"]:
-        symbol = stock["symbol"]
-        target_price = stock["target_price"]
+def get_monitored_stocks(config):
+    """Return the stocks of every portfolio with a valid operator"""
+    stocks = []
+    for stock in all_stocks(config):
         operator = stock.get("operator", "<=")
-
         if operator not in OPERATORS:
-            print(f"Invalid operator '{operator}' for {symbol}, skipping.")
+            print(f"Invalid operator '{operator}' for {stock['symbol']}, skipping.")
             continue
+        stocks.append(stock)
+    return stocks
 
-        print(f"Checking {symbol}...")
-        current_price = get_stock_price(symbol)
+
+def select_due_stocks(stocks, config, now, last_records):
+    """Keep stocks whose market is open or whose latest close has not been recorded yet"""
+    due = []
+    for stock in stocks:
+        last = last_records.get(stock["symbol"])
+        if needs_fetch(get_exchange(stock, config), now, last[0] if last else None):
+            due.append(stock)
+    return due
+
+
+def drop_unchanged_closes(stocks, results, config, now, last_records):
+    """Drop results of closed markets whose price equals the last recorded one"""
+    kept = dict(results)
+    for stock in stocks:
+        symbol = stock["symbol"]
+        last = last_records.get(symbol)
+        result = kept.get(symbol)
+        if last is None or result is None or not result.ok:
+            continue
+        if result.price == last[1] and not get_exchange(stock, config).is_open(now):
+            del kept[symbol]
+    return kept
+
+
+def fetch_stock_prices(symbols, config):
+    """Fetch prices through the fetch engine and the provider chain, serving fresh quotes from the cache"""
+    settings = FetchSettings.from_config(config)
+    providers = get_provider_chain(config)
+    cache = open_quote_cache(config)
+    cached = cache.get_many(symbols) if cache is not None else {}
+
+    results = {symbol: FetchResult(symbol, price=price) for symbol, price in cached.items()}
+    with span("fetch"):
+        fetched = fetch_prices([symbol for symbol in symbols if symbol not in cached], providers.fetch, settings)
+    results.update(fetched)
+    for result in fetched.values():
+        if result.attempts:
+            metrics.observe("fetch.symbol", result.latency)
+        incr("fetch.retries", max(0, result.attempts - 1))
+        if not result.ok:
+            incr("fetch.failures")
+            print(f"Error fetching {result.symbol} after {result.attempts} attempt(s): {result.error}")
+
+    if cache is not None:
+        cache.put_many({result.symbol: result.price for result in fetched.values() if result.ok})
+        incr("cache.hits", cache.hits)
+        incr("cache.misses", cache.misses)
+        cache.report()
+        cache.close()
+    return results
+
+
+def evaluate_prices(stocks, results, timestamp, alert_state=None, rules=None, history=None, last_records=None):
+    """Turn fetch results into rows to record and triggered alerts
+
+    ``rules`` is the RuleSet compiled from ``stocks`` (built here when omitted); ``history``
+    and ``last_records`` feed its percent-change and moving average rules. With an
+    ``alert_state``, an alert is only returned when its rule fires for the first time,
+    re-arms past its hysteresis band or reaches its re-notify interval.
+    """
+    when = datetime.fromisoformat(timestamp)
+    rules = rules if rules is not None else RuleSet(stocks)
+    currencies = symbol_currencies(stocks)
+    rows = []
+    prices = {}
+
+    # A symbol watched by several portfolios is recorded once
+    for symbol in unique_symbols(stocks):
+        result = results.get(symbol)
+        current_price = result.price if result is not None else None
 
         if current_price is not None:
             # Record price
-            new_row = pd.DataFrame({"timestamp": [timestamp], "symbol": [symbol], "price": [current_price]})
-            df = pd.concat([df, new_row], ignore_index=True)
+            rows.append((timestamp, symbol, current_price))
+            prices[symbol] = current_price
 
-            # Check if alert should be sent
-            if OPERATORS[operator](current_price, target_price):
-                alerts.append({"symbol": symbol, "current_price": current_price, "target_price": target_price, "operator": operator})
-                print(f"ALERT: {symbol} is at ${current_price:.2f} (target: {operator} ${target_price:.2f})")
+    # Check which rules are met and whether their alerts should be sent
+    with span("rules.evaluate"):
+        fired = rules.evaluate(prices, when.date(), history, last_records)
+    alerts = []
+    for symbol, current_price in prices.items():
+        matches = fired.get(symbol, [])
+        if alert_state is not None:
+            sent = alert_state.notify(symbol, current_price, matches, rules.rules, when)
+            if len(sent) < len(matches):
+                print(f"{symbol} still meets {len(matches) - len(sent)} rule(s), alert already sent")
+            matches = sent
+        for rule, condition in matches:
+            alerts.append(
+                {
+                    "symbol": symbol,
+                    "current_price": current_price,
+                    "target_price": rule.value,
+                    "operator": rule.operator,
+                    "rule": rule.id,
+                    "condition": condition,
+                    "portfolio": rule.portfolio,
+                    "currency": currencies[symbol],
+                }
+            )
+            print(f"ALERT: {symbol} is at {format_money(current_price, currencies[symbol])} (target: {condition})")
 
-    save_data(df)
-    return alerts
+    incr("alerts.fired", len(alerts))
+    return rows, alerts
 
 
-def send_price_alerts(alerts, config):
-    """Send email for price target alerts"""
-    if not alerts:
+def load_rule_history(config, rules, symbols, today):
+    """Daily closes needed by ``rules``, or None when no rule looks back or the cache is unreadable"""
+    if not rules.needs_history:
+        return None
+    try:
+        with span("rollups.read"), open_rollups(config) as cache:
+            return load_history(cache, symbols, today, rules.lookback)
+    except Exception as e:
+        print(f"Cannot read price history, skipping change and moving average rules: {e}")
+        return None
+
+
+def record_prices(rows, config):
+    """Append rows to the configured storage backend, with their quote currencies, and update the rollup cache"""
+    if not rows:
         return
+    store = get_store(config)
+    configured = symbol_currencies(all_stocks(config), config)
+    currencies = {symbol: configured.get(symbol) or get_currency({"symbol": symbol}) for _, symbol, _ in rows}
+    with span("storage.write"):
+        store.append(rows)
+        store.record_currencies(currencies)
+    incr("rows.written", len(rows))
+    try:
+        with span("rollups.update"):
+            update_rollups(config, store, rows)
+    except Exception as e:
+        print(f"Failed to update rollups: {e}")
+
+
+def check_and_record_prices(config):
+    """Check all stocks and record prices"""
+    now = datetime.now()
+    stocks = get_monitored_stocks(config)
+    try:
+        with span("rollups.read"):
+            last_records = load_last_records(config, unique_symbols(stocks))
+    except Exception as e:
+        print(f"Cannot read last recorded prices, checking every symbol: {e}")
+        last_records = {}
+
+    due = select_due_stocks(stocks, config, now, last_records)
+    skipped = len(unique_symbols(stocks)) - len(unique_symbols(due))
+    print(f"Checking {len(unique_symbols(due))} symbols ({skipped} skipped, market closed)...")
+    results = fetch_stock_prices(unique_symbols(due), config)
+    results = drop_unchanged_closes(due, results, config, now, last_records)
+    rules = RuleSet(due)
+    history = load_rule_history(config, rules, unique_symbols(due), now.date())
+    alert_state = AlertState.load(config)
+    rows, alerts = evaluate_prices(due, results, now.isoformat(), alert_state, rules, history, last_records)
+
+    record_prices(rows, config)
+    alert_state.save()
+    return convert_alerts(alerts, config)
+
+
+def convert_alerts(alerts, config):
+    """Add the price in the configured reporting currency to alerts quoted in another currency
+
+    The rates come in one batched fetch; targets and rules stay in the quote currency.
+    """
+    if not alerts:
+        return alerts
+    converter = load_converter({alert["currency"] for alert in alerts}, config)
+    if converter.currency is None:
+        return alerts
+    prices, labels = converter.convert(
+        [alert["current_price"] for alert in alerts], [alert["currency"] for alert in alerts]
+    )
+    for alert, price, label in zip(alerts, prices, labels):
+        if label != alert["currency"]:
+            alert["reporting_price"] = float(price)
+            alert["reporting_currency"] = label
+    return alerts
 
+
+def render_price_alerts(alerts):
+    """HTML body listing the triggered alerts"""
     body = "<h2>Stock Price Alerts</h2>"
     body += "<p>The following stocks have met their target conditions:</p>"
     body += "<ul>"
 
     for alert in alerts:
-        operator = alert.get("operator", "<=")
+        currency = alert.get("currency", "USD")
+        condition = (
+            alert.get("condition") or f"{alert.get('operator', '<=')} {format_money(alert['target_price'], currency)}"
+        )
         body += f"<li><strong>{alert['symbol']}</strong>: "
-        body += f"${alert['current_price']:.2f} "
-        body += f"(Target: {operator} ${alert['target_price']:.2f})</li>"
+        body += f"{format_money(alert['current_price'], currency)} "
+        if "reporting_price" in alert:
+            body += f"({format_money(alert['reporting_price'], alert['reporting_currency'])}) "
+        body += f"(Target: {condition})</li>"
 
     body += "</ul>"
+    return body
+
+
+def send_price_alerts(alerts, config):
+    """Send email for price target alerts, one per portfolio to each of its recipients
+
+    The messages are queued and sent together over one SMTP session.
+    """
+    if not alerts:
+        return
+
+    by_portfolio = {}
+    for alert in alerts:
+        by_portfolio.setdefault(alert.get("portfolio"), []).append(alert)
 
-    send_email("🎯 Stock Price Alert!", body, config)
+    for name, portfolio_alerts in by_portfolio.items():
+        subject = "🎯 Stock Price Alert!" if name is None else f"🎯 Stock Price Alert: {name}"
+        body = render_price_alerts(portfolio_alerts)
+        for recipient in get_recipients(config, name):
+            if recipient is None:
+                queue_email(subject, body, config)
+            else:
+                queue_email(subject, body, config, recipient)
+    flush_emails()
 
 
-def main():
+def main(argv=None):
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Check stock prices and send target alerts")
+    parser.add_argument("--daemon", action="store_true", help="stay resident and check prices on an internal schedule")
+    parser.add_argument("--no-cache", action="store_true", help="always fetch fresh quotes, bypassing the quote cache")
+    parser.add_argument(
+        "--stream", action="store_true", help="evaluate alerts on live streamed quotes instead of polling"
+    )
+    parser.add_argument("--replay", metavar="CSV", help="with --stream, replay a recorded price file as a dry run")
+    args = parser.parse_args(argv)
+
+    if args.stream:
+        # Imported here because the streaming monitor builds on this module
+        from merkato.stream import run_stream
+
+        run_stream(load_config(), args.replay)
+        return
+
+    if args.daemon:
+        # Imported here because the daemon module builds on this one
+        from merkato.daemon import run_daemon
+
+        run_daemon(use_cache=not args.no_cache)
+        return
+
+    metrics.start_run("stock-monitor")
     config = load_config()
+    if args.no_cache:
+        disable_cache(config)
 
     # Check prices and get alerts
     alerts = check_and_record_prices(config)
@@ -101,6 +377,8 @@ def main():
     if alerts:
         send_price_alerts(alerts, config)
 
+    write_report(config)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Merkato: Price Storage
+Pluggable backends for recorded prices: the yearly CSV files, a columnar Parquet store
+partitioned by year and symbol and memory-mapped binary tick files.
+"""
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+from uuid import uuid4
+
+from merkato.util import DATA_COLUMNS, append_rows, lazy_import, merge_rows, read_csv_range, typed_prices
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+DATA_DIR = "data"
+PARQUET_DIR = "data/parquet"
+TICKS_DIR = "data/ticks"
+# Quote currency per symbol, next to the prices; the underscore keeps it out of Parquet datasets
+CURRENCIES_FILE = "_currencies.json"
+# Files a Parquet partition may hold before an append compacts it into one
+COMPACT_FILES = 32
+# Fixed-width little-endian tick record: epoch microseconds, symbol id, price
+TICK_FIELDS = [("timestamp", "<i8"), ("symbol", "<i4"), ("price", "<f8")]
+
+
+def _group_by_year(rows):
+    years = {}
+    for row in rows:
+        years.setdefault(pd.Timestamp(row[0]).year, []).append(row)
+    return years
+
+
+def _overlaps(year, start, end):
+    """Whether ``year`` overlaps the half-open [start, end) window"""
+    if start is not None and year < pd.Timestamp(start).year:
+        return False
+    if end is not None and year > (pd.Timestamp(end) - pd.Timedelta(microseconds=1)).year:
+        return False
+    return True
+
+
+class CurrencySidecar:
+    """Quote currency per symbol in ``<root>/_currencies.json``, so stored prices keep their currency"""
+
+    @property
+    def currencies_path(self):
+        return self.root / CURRENCIES_FILE
+
+    def currencies(self):
+        if not self.currencies_path.exists():
+            return {}
+        return json.loads(self.currencies_path.read_text())
+
+    def record_currencies(self, currencies):
+        """Merge ``symbol -> currency`` into the sidecar, rewriting it only when something changed"""
+        known = self.currencies()
+        merged = {**known, **currencies}
+        if merged == known:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.currencies_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(dict(sorted(merged.items())), indent=2) + "\n")
+        os.replace(tmp, self.currencies_path)
+
+
+class CsvStore(CurrencySidecar):
+    """Yearly ``<root>/<year>.csv`` files, appended to on every tick"""
+
+    def __init__(self, root=DATA_DIR):
+        self.root = Path(root)
+
+    def path(self, year):
+        return self.root / f"{year}.csv"
+
+    def append(self, rows):
+        """Append ``(timestamp, symbol, price)`` rows to the file of their year"""
+        return sum(append_rows(year_rows, self.path(year)) for year, year_rows in _group_by_year(rows).items())
+
+    def merge(self, rows):
+        """Insert rows anywhere in time, skipping ones already stored; returns the number added"""
+        return sum(merge_rows(year_rows, self.path(year)) for year, year_rows in _group_by_year(rows).items())
+
+    def read(self, symbols=None, start=None, end=None):
+        """Read typed prices for ``symbols`` in the half-open [start, end) window"""
+        paths = [
+            path
+            for path in sorted(self.root.glob("*.csv"))
+            if path.stem.isdigit() and _overlaps(int(path.stem), start, end)
+        ]
+
+        frames = [read_csv_range(path, start, end) for path in paths]
+        df = typed_prices(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DATA_COLUMNS))
+        if symbols is not None:
+            df = df[df["symbol"].isin(list(symbols))]
+        df = df.sort_values(["timestamp", "symbol"], kind="stable").reset_index(drop=True)
+        df["symbol"] = df["symbol"].cat.remove_unused_categories()
+        return df
+
+
+class ParquetStore(CurrencySidecar):
+    """Parquet dataset under ``<root>/year=<year>/symbol=<symbol>/``
+
+    Timestamps are stored as ``timestamp[us]`` and prices as float64; the symbol lives in
+    the partition path. Reads prune partitions by year and symbol and push time-range
+    filters down to the Parquet row-group statistics. Every append writes a new file per
+    partition, and a partition holding more than ``max_files`` is compacted on the spot.
+    Requires the ``parquet`` extra.
+    """
+
+    def __init__(self, root=PARQUET_DIR, max_files=COMPACT_FILES):
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+        except ImportError as e:
+            raise ImportError("The parquet storage backend requires pyarrow: uv sync --extra parquet") from e
+
+        self.root = Path(root)
+        self.max_files = max_files
+        self._pa = pa
+        self._ds = ds
+        self.schema = pa.schema([("timestamp", pa.timestamp("us")), ("price", pa.float64())])
+        self.partitioning = ds.partitioning(pa.schema([("year", pa.int16()), ("symbol", pa.string())]), flavor="hive")
+
+    def append(self, rows):
+        """Write ``(timestamp, symbol, price)`` rows as new files in their partitions"""
+        df = pd.DataFrame(list(rows), columns=DATA_COLUMNS)
+        if df.empty:
+            return 0
+        return self.write(typed_prices(df))
+
+    def merge(self, rows):
+        """Write the rows whose timestamp and symbol are not stored yet; returns the number added"""
+        df = typed_prices(pd.DataFrame(list(rows), columns=DATA_COLUMNS))
+        if df.empty:
+            return 0
+        existing = self.read(
+            df["symbol"].unique(), start=df["timestamp"].min(), end=df["timestamp"].max() + pd.Timedelta(microseconds=1)
+        )
+        keys = pd.MultiIndex.from_frame(existing[["timestamp", "symbol"]].astype({"symbol": str}))
+        new = df.drop_duplicates(["timestamp", "symbol"])
+        new = new[~pd.MultiIndex.from_frame(new[["timestamp", "symbol"]].astype({"symbol": str})).isin(keys)]
+        return self.write(new) if len(new) else 0
+
+    def write(self, df):
+        """Write a typed price DataFrame as new files in its partitions, compacting crowded ones"""
+        pa = self._pa
+        table = pa.table(
+            {
+                "timestamp": pa.array(df["timestamp"].to_numpy(), type=pa.timestamp("us")),
+                "price": pa.array(df["price"].to_numpy(), type=pa.float64()),
+                "year": pa.array(df["timestamp"].dt.year.to_numpy(), type=pa.int16()),
+                "symbol": pa.array(df["symbol"].astype(str).to_numpy(), type=pa.string()),
+            }
+        )
+        partitions = set()
+        self._ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=self.partitioning,
+            basename_template=f"part-{uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=lambda written: partitions.add(Path(written.path).parent),
+        )
+        for partition in sorted(partitions):
+            if len(list(partition.glob("*.parquet"))) > self.max_files:
+                self._compact_partition(partition)
+        return len(df)
+
+    def _dataset(self):
+        return self._ds.dataset(self.root, format="parquet", partitioning=self.partitioning)
+
+    def read(self, symbols=None, start=None, end=None):
+        """Read typed prices for ``symbols`` in the half-open [start, end) window"""
+        if not self.root.exists():
+            return typed_prices(pd.DataFrame(columns=DATA_COLUMNS))
+
+        ds = self._ds
+        filters = []
+        if symbols is not None:
+            filters.append(ds.field("symbol").isin(list(symbols)))
+        if start is not None:
+            start = pd.Timestamp(start)
+            filters.append(ds.field("year") >= start.year)
+            filters.append(ds.field("timestamp") >= start.to_datetime64())
+        if end is not None:
+            end = pd.Timestamp(end)
+            filters.append(ds.field("year") <= end.year)
+            filters.append(ds.field("timestamp") < end.to_datetime64())
+
+        expression = None
+        for condition in filters:
+            expression = condition if expression is None else expression & condition
+        table = self._dataset().to_table(columns=DATA_COLUMNS, filter=expression)
+
+        df = table.to_pandas()
+        df["timestamp"] = df["timestamp"].astype("datetime64[us]")
+        df["symbol"] = df["symbol"].astype(str).astype("category")
+        return df.sort_values(["timestamp", "symbol"], kind="stable").reset_index(drop=True)
+
+    def _compact_partition(self, partition):
+        """Merge the files of one partition into a single time-sorted file"""
+        parts = sorted(partition.glob("*.parquet"))
+        if len(parts) < 2:
+            return False
+        table = self._ds.dataset(parts, format="parquet", schema=self.schema).to_table()
+        table = table.sort_by("timestamp")
+        tmp = partition / f".compact-{uuid4().hex}.tmp"
+        self._ds.write_dataset(table, tmp, format="parquet", basename_template="data-{i}.parquet")
+        target = partition / f"part-{uuid4().hex}-0.parquet"
+        os.replace(next(tmp.glob("*.parquet")), target)
+        shutil.rmtree(tmp)
+        for part in parts:
+            part.unlink()
+        return True
+
+    def compact(self):
+        """Merge the small per-tick files of every partition into a single file"""
+        partitions = sorted(path for path in self.root.glob("year=*/symbol=*") if path.is_dir())
+        return sum(self._compact_partition(partition) for partition in partitions)
+
+
+class TickStore(CurrencySidecar):
+    """Yearly ``<root>/<year>.ticks`` files of fixed-width binary records, read via numpy.memmap
+
+    Each record is ``TICK_FIELDS`` (20 bytes); symbols are stored as ids into the
+    ``symbols.txt`` sidecar, one symbol per line, which only ever grows. Files are kept
+    sorted by time, so a read locates its window by binary search over the mapped
+    timestamps without parsing anything.
+    """
+
+    def __init__(self, root=TICKS_DIR):
+        self.root = Path(root)
+        self.dtype = np.dtype(TICK_FIELDS)
+
+    def path(self, year):
+        return self.root / f"{year}.ticks"
+
+    @property
+    def symbols_path(self):
+        return self.root / "symbols.txt"
+
+    def symbols(self):
+        """Symbols of the sidecar dictionary, indexed by id"""
+        if not self.symbols_path.exists():
+            return []
+        return self.symbols_path.read_text().splitlines()
+
+    def _symbol_ids(self, symbols):
+        """Ids of ``symbols``, adding unknown ones to the sidecar before any record refers to them"""
+        known = self.symbols()
+        ids = {symbol: i for i, symbol in enumerate(known)}
+        new = [symbol for symbol in dict.fromkeys(symbols) if symbol not in ids]
+        if new:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.symbols_path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                f.write("".join(f"{symbol}\n" for symbol in known + new))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.symbols_path)
+            ids.update((symbol, len(known) + i) for i, symbol in enumerate(new))
+        return np.array([ids[symbol] for symbol in symbols], dtype=np.int32)
+
+    def _records(self, df):
+        records = np.empty(len(df), dtype=self.dtype)
+        records["timestamp"] = df["timestamp"].to_numpy(dtype="datetime64[us]").view(np.int64)
+        records["symbol"] = self._symbol_ids(df["symbol"].astype(str).tolist())
+        records["price"] = df["price"].to_numpy(dtype=np.float64)
+        return records
+
+    def mmap(self, year):
+        """Read-only memory map of a year's records; a torn trailing record is ignored"""
+        path = self.path(year)
+        count = path.stat().st_size // self.dtype.itemsize if path.exists() else 0
+        if not count:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(path, dtype=self.dtype, mode="r", shape=(count,))
+
+    def append(self, rows):
+        """Append ``(timestamp, symbol, price)`` rows to the file of their year
+
+        Rows older than the last stored record would break the time order, so those
+        years are merged instead.
+        """
+        df = typed_prices(pd.DataFrame(list(rows), columns=DATA_COLUMNS))
+        if df.empty:
+            return 0
+        df = df.sort_values("timestamp", kind="stable")
+        added = 0
+        for year, year_df in df.groupby(df["timestamp"].dt.year):
+            records = self._records(year_df)
+            stored = self.mmap(year)
+            if len(stored) and records["timestamp"][0] < stored["timestamp"][-1]:
+                added += self._merge_year(year, records)
+                continue
+            path = self.path(year)
+            with open(path, "ab") as f:
+                # Drop a torn record left behind by an interrupted append
+                f.truncate(len(stored) * self.dtype.itemsize)
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            added += len(records)
+        return added
+
+    def _merge_year(self, year, records):
+        stored = np.array(self.mmap(year))
+        merged = np.concatenate([stored, records])
+        # Keep the first record per timestamp and symbol, so stored ones win
+        keys = pd.DataFrame({"timestamp": merged["timestamp"], "symbol": merged["symbol"]})
+        merged = merged[~keys.duplicated(keep="first").to_numpy()]
+        if len(merged) == len(stored):
+            return 0
+        merged = merged[np.argsort(merged["timestamp"], kind="stable")]
+        path = self.path(year)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(merged.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return len(merged) - len(stored)
+
+    def merge(self, rows):
+        """Insert rows anywhere in time, skipping ones already stored; returns the number added"""
+        df = typed_prices(pd.DataFrame(list(rows), columns=DATA_COLUMNS))
+        return self.write(df)
+
+    def write(self, df):
+        """Merge a typed price DataFrame into the files of its years"""
+        if df.empty:
+            return 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        return sum(
+            self._merge_year(year, self._records(year_df)) for year, year_df in df.groupby(df["timestamp"].dt.year)
+        )
+
+    def read(self, symbols=None, start=None, end=None):
+        """Read typed prices for ``symbols`` in the half-open [start, end) window"""
+        names = self.symbols()
+        years = sorted(
+            int(path.stem)
+            for path in self.root.glob("*.ticks")
+            if path.stem.isdigit() and _overlaps(int(path.stem), start, end)
+        )
+        chunks = []
+        for year in years:
+            records = self.mmap(year)
+            timestamps = records["timestamp"]
+            lo = 0 if start is None else np.searchsorted(timestamps, pd.Timestamp(start).value // 1000)
+            hi = len(records) if end is None else np.searchsorted(timestamps, pd.Timestamp(end).value // 1000)
+            chunks.append(records[lo:hi])
+        records = np.concatenate(chunks) if chunks else np.empty(0, dtype=self.dtype)
+        if symbols is not None:
+            wanted = [names.index(symbol) for symbol in symbols if symbol in names]
+            records = records[np.isin(records["symbol"], wanted)]
+
+        # Same order as the other backends: by time, then by symbol name
+        name_rank = np.argsort(np.argsort(np.array(names, dtype=object)))
+        ranks, timestamps = name_rank[records["symbol"]], records["timestamp"]
+        same_time = timestamps[1:] == timestamps[:-1]
+        if np.any(same_time & (ranks[1:] < ranks[:-1])):
+            records = records[np.lexsort((ranks, timestamps))]
+        symbol = pd.Categorical.from_codes(records["symbol"], pd.Index(names, dtype=str))
+        df = pd.DataFrame(
+            {
+                "timestamp": records["timestamp"].view("datetime64[us]"),
+                "symbol": symbol.reorder_categories(sorted(names)),
+                "price": records["price"],
+            }
+        )
+        df["symbol"] = df["symbol"].cat.remove_unused_categories()
+        return df
+
+
+BACKENDS = {"csv": CsvStore, "parquet": ParquetStore, "ticks": TickStore}
+
+
+def get_store(config=None):
+    """Return the storage backend configured in the "storage" section of config.json"""
+    section = (config or {}).get("storage", {})
+    backend = section.get("backend", "csv")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](section["root"]) if "root" in section else BACKENDS[backend]()
+
+
+def migrate(source=DATA_DIR, dest=PARQUET_DIR, backend="parquet"):
+    """Convert every ``<source>/*.csv`` yearly file into the ``backend`` store at ``dest``"""
+    store = BACKENDS[backend](dest)
+    store.record_currencies(CsvStore(source).currencies())
+    total = 0
+    for path in sorted(Path(source).glob("*.csv")):
+        df = typed_prices(pd.read_csv(path))
+        if not df.empty:
+            total += store.write(df)
+        print(f"Migrated {path}: {len(df)} rows")
+    if backend == "parquet":
+        store.compact()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert yearly CSV price files into the Parquet or tick store")
+    parser.add_argument("--source", default=DATA_DIR, help="directory containing <year>.csv files")
+    parser.add_argument("--backend", choices=["parquet", "ticks"], default="parquet", help="store to convert into")
+    parser.add_argument("--dest", help=f"store directory (default: {PARQUET_DIR} or {TICKS_DIR})")
+    parser.add_argument("--force", action="store_true", help="replace an existing store")
+    args = parser.parse_args(argv)
+
+    dest = Path(args.dest or (TICKS_DIR if args.backend == "ticks" else PARQUET_DIR))
+    if dest.exists() and any(dest.iterdir()):
+        if not args.force:
+            parser.error(f"{dest} already contains data, use --force to replace it")
+        shutil.rmtree(dest)
+
+    total = migrate(args.source, dest, args.backend)
+    print(f"Migration complete: {total} rows written to {dest}")
+
+
+if __name__ == "__main__":
+    main()
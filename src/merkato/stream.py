@@ -0,0 +1,254 @@
+"""
+Merkato: Streaming Monitor
+Subscribes to a live quote stream instead of polling: ticks are coalesced per symbol,
+alert rules are evaluated on every update and prices are recorded downsampled, in batches.
+"""
+
+import asyncio
+import signal
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+from merkato import stock_monitor
+from merkato.alert_state import AlertState
+from merkato.fetch import FetchResult
+from merkato.metrics import incr, metrics, write_report
+from merkato.portfolios import unique_symbols
+from merkato.rules import RuleSet
+from merkato.util import lazy_import, typed_prices
+
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+
+
+@dataclass
+class StreamSettings:
+    """Coalescing, downsampling and flush cadences in seconds, from the "stream" section of config.json"""
+
+    coalesce: float = 1.0
+    record_interval: float = 60.0
+    flush_interval: float = 300.0
+
+    @classmethod
+    def from_config(cls, config):
+        section = config.get("stream", {})
+        unknown = set(section) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown stream settings: {', '.join(sorted(unknown))}")
+        return cls(**section)
+
+
+@dataclass
+class Quote:
+    """One price update of a symbol"""
+
+    symbol: str
+    price: float
+    when: datetime
+
+
+class YahooStream:
+    """Live quotes from the Yahoo Finance websocket feed"""
+
+    async def quotes(self, symbols):
+        queue = asyncio.Queue()
+        socket = yf.AsyncWebSocket(verbose=False)
+        await socket.subscribe(list(symbols))
+        listener = asyncio.create_task(socket.listen(queue.put_nowait))
+        try:
+            while True:
+                message = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait({message, listener}, return_when=asyncio.FIRST_COMPLETED)
+                if message not in done:
+                    message.cancel()
+                    listener.result()
+                    return
+                quote = self.parse(message.result())
+                if quote is not None:
+                    yield quote
+        finally:
+            listener.cancel()
+            await socket.close()
+
+    @staticmethod
+    def parse(message):
+        """Quote of a decoded pricing message, or None when it carries no price"""
+        if not message.get("id") or message.get("price") is None:
+            return None
+        when = datetime.fromtimestamp(int(message["time"]) / 1000) if message.get("time") else datetime.now()
+        return Quote(message["id"], float(message["price"]), when)
+
+
+class ReplayStream:
+    """Replays recorded ``(timestamp, symbol, price)`` rows as a quote stream
+
+    Stands in for the live feed in tests and local dry runs. With a ``speed`` the gaps
+    between rows are replayed ``speed`` times faster; without one, as fast as possible.
+    """
+
+    def __init__(self, rows, speed=None):
+        self.rows = rows
+        self.speed = speed
+
+    @classmethod
+    def from_csv(cls, path, speed=None):
+        df = typed_prices(pd.read_csv(path)).sort_values("timestamp", kind="stable")
+        return cls(list(zip(df["timestamp"].tolist(), df["symbol"].astype(str), df["price"])), speed)
+
+    async def quotes(self, symbols):
+        symbols = set(symbols)
+        previous = None
+        for timestamp, symbol, price in self.rows:
+            when = datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+            if self.speed and previous is not None:
+                await asyncio.sleep(max(0.0, (when - previous).total_seconds() / self.speed))
+            else:
+                await asyncio.sleep(0)
+            previous = when
+            if symbol in symbols:
+                yield Quote(symbol, float(price), when)
+
+
+class StreamMonitor:
+    """Evaluates alert rules on every coalesced update of a quote provider
+
+    ``provider`` is any object with an async ``quotes(symbols)`` generator of Quote
+    objects. With ``dry_run`` nothing is recorded, emailed or saved.
+    """
+
+    def __init__(self, config, provider, now=datetime.now, dry_run=False):
+        self.config = config
+        self.provider = provider
+        self.now = now
+        self.dry_run = dry_run
+        self.settings = StreamSettings.from_config(config)
+        self.stocks = stock_monitor.get_monitored_stocks(config)
+        self.rules = RuleSet(self.stocks)
+        self.alert_state = AlertState.load(config)
+        # symbol -> latest Quote received since the last evaluation
+        self.latest = {}
+        # symbol -> (timestamp, price) of the last evaluated and last recorded updates
+        self.previous = {}
+        self.recent = {}
+        self.pending_rows = []
+        self.history = (None, None)
+        self.updated = asyncio.Event()
+        self.ended = False
+
+    async def consume(self):
+        """Keep the latest quote per symbol, waking the evaluation loop"""
+        try:
+            async for quote in self.provider.quotes(unique_symbols(self.stocks)):
+                self.latest[quote.symbol] = quote
+                incr("stream.quotes")
+                self.updated.set()
+        finally:
+            self.ended = True
+            self.updated.set()
+
+    def daily_history(self, today):
+        """Daily closes for the rules, read from the rollup cache once per day"""
+        day, history = self.history
+        if day != today:
+            history = stock_monitor.load_rule_history(self.config, self.rules, unique_symbols(self.stocks), today)
+            self.history = (today, history)
+        return history
+
+    def evaluate(self):
+        """Evaluate the coalesced quotes once and queue downsampled rows; returns the alerts"""
+        latest, self.latest = self.latest, {}
+        self.updated.clear()
+        if not latest:
+            return []
+        incr("stream.evaluations")
+
+        stocks = [stock for stock in self.stocks if stock["symbol"] in latest]
+        results = {symbol: FetchResult(symbol, price=quote.price) for symbol, quote in latest.items()}
+        when = self.now()
+        _, alerts = stock_monitor.evaluate_prices(
+            stocks,
+            results,
+            when.isoformat(),
+            self.alert_state,
+            self.rules,
+            self.daily_history(when.date()),
+            self.previous,
+        )
+
+        for symbol, quote in latest.items():
+            self.previous[symbol] = (quote.when, quote.price)
+            last = self.recent.get(symbol)
+            if last is None or (quote.when - last[0]).total_seconds() >= self.settings.record_interval:
+                self.pending_rows.append((quote.when.isoformat(), symbol, quote.price))
+                self.recent[symbol] = (quote.when, quote.price)
+        return alerts
+
+    async def dispatch(self, alerts):
+        if alerts and not self.dry_run:
+            alerts = await asyncio.to_thread(stock_monitor.convert_alerts, alerts, self.config)
+            await asyncio.to_thread(stock_monitor.send_price_alerts, alerts, self.config)
+
+    async def flush(self):
+        """Write queued rows to storage and persist the alert state; returns the number of rows written"""
+        if self.dry_run:
+            self.pending_rows = []
+            return 0
+        try:
+            self.alert_state.save()
+        except Exception as e:
+            print(f"Failed to save alert state: {e}")
+        if not self.pending_rows:
+            return 0
+        rows, self.pending_rows = self.pending_rows, []
+        try:
+            await asyncio.to_thread(stock_monitor.record_prices, rows, self.config)
+        except Exception as e:
+            print(f"Failed to flush {len(rows)} rows, will retry: {e}")
+            self.pending_rows = rows + self.pending_rows
+            return 0
+        print(f"Flushed {len(rows)} rows")
+        return len(rows)
+
+    async def run(self):
+        """Run until the provider ends or the task is cancelled, flushing on the way out"""
+        loop = asyncio.get_running_loop()
+        consumer = asyncio.create_task(self.consume())
+        next_flush = loop.time() + self.settings.flush_interval
+        print(f"Streaming quotes for {len(unique_symbols(self.stocks))} symbols")
+        try:
+            while not self.ended:
+                try:
+                    await asyncio.wait_for(self.updated.wait(), timeout=max(0.0, next_flush - loop.time()))
+                    if not self.ended:
+                        # Let a burst of ticks coalesce into one evaluation per symbol
+                        await asyncio.sleep(self.settings.coalesce)
+                    await self.dispatch(self.evaluate())
+                except TimeoutError:
+                    pass
+                if loop.time() >= next_flush:
+                    await self.flush()
+                    next_flush = loop.time() + self.settings.flush_interval
+            await consumer
+        finally:
+            consumer.cancel()
+            await self.flush()
+            print("Stream stopped")
+
+
+def run_stream(config, replay=None):
+    """Stream live quotes, or replay a recorded price CSV as a dry run, until SIGINT or SIGTERM"""
+    provider = ReplayStream.from_csv(replay) if replay else YahooStream()
+    metrics.start_run("stock-monitor-stream")
+
+    async def main():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await StreamMonitor(config, provider, dry_run=replay is not None).run()
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    write_report(config)
@@ -1,28 +1,76 @@
+import atexit
+import csv
+import importlib.util
+import io
 import json
 import os
 import smtplib
+import sys
+import threading
+import time
+import types
 from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from pathlib import Path
 
-import pandas as pd
 from dotenv import load_dotenv
 
+from merkato.metrics import incr, span
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on its first attribute access
+
+    The import goes through ``importlib.import_module`` under a lock, so the first
+    access from several fetch threads at once waits for one complete import instead
+    of seeing a half-initialized module.
+    """
+
+    def __getattr__(self, attr):
+        module = self.__dict__.get("_module")
+        if module is None:
+            with _lazy_lock:
+                module = self.__dict__.get("_module") or importlib.import_module(self.__name__)
+                self.__dict__["_module"] = module
+        return getattr(module, attr)
+
+
+_lazy_lock = threading.RLock()
+_lazy_modules = {}
+
+
+def lazy_import(name):
+    """Import a heavy module on first attribute access instead of at import time
+
+    Keeps the CLI start-up and paths like --check-config or a closed-market run from
+    paying for pandas, numpy or yfinance unless they actually use them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    with _lazy_lock:
+        return _lazy_modules.setdefault(name, _LazyModule(name))
+
+
+pd = lazy_import("pandas")
+
 # Configuration
 CONFIG_FILE = "config.json"
+DATA_COLUMNS = ["timestamp", "symbol", "price"]
 
 
-def get_data_file():
-    """Get the data file path for the current year."""
-    year = datetime.now().year
+def get_data_file(year=None):
+    """Get the data file path for the given year (defaults to the current year)."""
+    year = year or datetime.now().year
     return f"data/{year}.csv"
 
 
 # Utility functions
 def load_config():
     """Load configuration from config.json and environment variables"""
-    with open(CONFIG_FILE, "r") as f:
+    with span("config.load"), open(CONFIG_FILE, "r") as f:
         config = json.load(f)
 
     # Set email settings from environment variables (for GitHub Actions)
@@ -57,29 +105,335 @@ def load_or_create_data():
     if data_path.exists():
         return pd.read_csv(data_file)
     else:
-        return pd.DataFrame(columns=["timestamp", "symbol", "price"])
+        return pd.DataFrame(columns=DATA_COLUMNS)
 
 
-def send_email(subject, body, config):
-    """Send email notification"""
-    sender_email = config["email"]["sender"]
-    sender_password = config["email"]["password"]
-    recipient_email = config["email"]["recipient"]
-    smtp_server = config["email"]["smtp_server"]
-    smtp_port = config["email"]["smtp_port"]
+def typed_prices(df):
+    """Return price rows with datetime timestamps, categorical symbols and float prices"""
+    df = df.reindex(columns=DATA_COLUMNS)
+    return pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(df["timestamp"], format="ISO8601").astype("datetime64[us]"),
+            "symbol": df["symbol"].astype(str).astype("category"),
+            "price": df["price"].astype("float64"),
+        }
+    )
+
+
+def _line_timestamp(line):
+    """Timestamp of a CSV row, or None for a torn (partially written) row"""
+    if b"," not in line:
+        return None
+    try:
+        return pd.Timestamp(line.split(b",", 1)[0].decode())
+    except ValueError:
+        return None
+
+
+def _row_start(f, offset, data_start):
+    """Seek to the first row starting at or after ``offset`` and return its position"""
+    if offset <= data_start:
+        f.seek(data_start)
+    else:
+        f.seek(offset - 1)
+        f.readline()
+    return f.tell()
+
+
+def _bisect_offset(f, size, data_start, when):
+    """Byte offset of the first row with timestamp >= ``when`` in a time-sorted CSV"""
+    lo, hi = data_start, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row = _row_start(f, mid, data_start)
+        line = f.readline()
+        timestamp = _line_timestamp(line) if row < size else None
+        # Torn rows can only be the last one, still being appended, so they sort after ``when``
+        if timestamp is None or timestamp >= when:
+            hi = mid
+        else:
+            lo = f.tell()
+    return _row_start(f, lo, data_start)
+
+
+def read_csv_range(data_file, start=None, end=None):
+    """Read the rows of a time-sorted price CSV in the half-open [start, end) window
+
+    Row boundaries are located by binary search over byte offsets, so only the
+    requested slice of the file is parsed.
+    """
+    with open(data_file, "rb") as f:
+        header = f.readline()
+        data_start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        begin = _bisect_offset(f, size, data_start, pd.Timestamp(start)) if start else data_start
+        stop = _bisect_offset(f, size, data_start, pd.Timestamp(end)) if end else size
+        f.seek(begin)
+        chunk = f.read(max(0, stop - begin))
+    if chunk and not chunk.endswith(b"\n"):
+        # A last row without its newline is still being written
+        chunk = chunk[: chunk.rfind(b"\n") + 1]
+
+    columns = header.decode().strip().split(",") if header.strip() else DATA_COLUMNS
+    if not chunk.strip():
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(io.BytesIO(chunk), names=columns, header=None)
+
+
+def load_prices(symbols=None, start=None, end=None, config=None):
+    """Load typed prices for ``symbols`` in the half-open [start, end) window
+
+    Only the yearly files (or Parquet partitions) overlapping the window are read,
+    using the storage backend configured in config.json.
+    """
+    # Imported here because the storage backends are built on top of this module
+    from merkato.storage import get_store
+
+    with span("storage.read"):
+        df = get_store(config).read(symbols, start, end)
+    incr("rows.read", len(df))
+    return df
+
+
+def _truncate_torn_tail(fd, size):
+    """Drop a partially written last line left behind by an interrupted append"""
+    if size == 0 or os.pread(fd, 1, size - 1) == b"\n":
+        return size
+    end = size
+    while end > 0:
+        start = max(0, end - 4096)
+        newline = os.pread(fd, end - start, start).rfind(b"\n")
+        if newline != -1:
+            end = start + newline + 1
+            break
+        end = start
+    os.ftruncate(fd, end)
+    return end
+
+
+def append_rows(rows, data_file=None):
+    """Append price rows to the yearly CSV without reading the existing history
+
+    ``rows`` is an iterable of ``(timestamp, symbol, price)`` tuples. All rows are
+    serialized into one buffer and written with a single appending write followed by
+    fsync, so a run either lands completely or leaves a torn tail that the next append
+    truncates before writing.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    if not count:
+        return 0
+
+    data_path = Path(data_file or get_data_file())
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    created = not data_path.exists()
+
+    fd = os.open(data_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        text = buffer.getvalue()
+        if _truncate_torn_tail(fd, os.fstat(fd).st_size) == 0:
+            text = ",".join(DATA_COLUMNS) + "\n" + text
+        payload = memoryview(text.encode())
+        while payload:
+            payload = payload[os.write(fd, payload) :]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    if created:
+        dir_fd = os.open(data_path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    return count
+
+
+def merge_rows(rows, data_file=None):
+    """Merge price rows into a yearly CSV, keeping it sorted by time and free of duplicates
+
+    Unlike append_rows this rewrites the file, so it suits backfilled rows older than the
+    latest recorded ones. Rows already stored for the same timestamp and symbol are kept
+    as they are. The file is replaced atomically. Returns the number of rows added.
+    """
+    data_path = Path(data_file or get_data_file())
+    new = pd.DataFrame([[str(value) for value in row] for row in rows], columns=DATA_COLUMNS)
+    existing = pd.read_csv(data_path, dtype=str) if data_path.exists() else pd.DataFrame(columns=DATA_COLUMNS)
+
+    merged = pd.concat([existing, new], ignore_index=True).drop_duplicates(["timestamp", "symbol"], keep="first")
+    added = len(merged) - len(existing)
+    if not added:
+        return 0
+    order = pd.to_datetime(merged["timestamp"], format="ISO8601").argsort(kind="stable")
+    merged = merged.iloc[order]
+
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = data_path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        merged.to_csv(f, index=False, lineterminator="\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, data_path)
+    return added
+
+
+class EmailDispatcher:
+    """Sends emails over one authenticated SMTP session, reconnecting when it drops
+
+    Messages are sent right away with send(), or queued with queue() and sent together
+    by flush(); queued messages for the same recipient and subject are merged into one.
+    """
+
+    def __init__(self, email_config, smtp_class=smtplib.SMTP, timeout=30, idle_timeout=60):
+        self.email_config = email_config
+        self.smtp_class = smtp_class
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.server = None
+        self.last_used = 0.0
+        self.pending = {}
+        self.connections = 0
+        self.sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self):
+        config = self.email_config
+        server = self.smtp_class(config["smtp_server"], config["smtp_port"], timeout=self.timeout)
+        try:
+            if config.get("starttls", True):
+                server.starttls()
+            server.login(config["sender"], config["password"])
+        except Exception:
+            server.close()
+            raise
+        self.connections += 1
+        return server
 
-    msg = MIMEMultipart()
-    msg["From"] = sender_email
-    msg["To"] = recipient_email
-    msg["Subject"] = subject
+    def _session(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            # Servers drop idle sessions, so probe before reusing one
+            try:
+                if self.server.noop()[0] != 250:
+                    self._drop()
+            except (smtplib.SMTPException, OSError):
+                self._drop()
+        if self.server is None:
+            self.server = self._connect()
+        return self.server
 
-    msg.attach(MIMEText(body, "html"))
+    def _drop(self):
+        if self.server is not None:
+            try:
+                self.server.close()
+            finally:
+                self.server = None
 
+    def build_message(self, subject, body, recipient=None):
+        msg = MIMEMultipart()
+        msg["From"] = self.email_config["sender"]
+        msg["To"] = recipient or self.email_config["recipient"]
+        msg["Subject"] = subject
+        msg.attach(MIMEText(body, "html"))
+        return msg
+
+    def send(self, subject, body, recipient=None):
+        """Send one message, reconnecting once if the session was dropped"""
+        msg = self.build_message(subject, body, recipient)
+        for attempt in range(2):
+            try:
+                self._session().send_message(msg)
+                break
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                self._drop()
+                if attempt:
+                    raise
+        self.last_used = time.monotonic()
+        self.sent += 1
+
+    def queue(self, subject, body, recipient=None):
+        """Queue a message for the next flush()"""
+        key = (recipient or self.email_config["recipient"], subject)
+        self.pending.setdefault(key, []).append(body)
+
+    def flush(self):
+        """Send every queued message over the shared session; returns the number sent"""
+        pending, self.pending = self.pending, {}
+        sent = 0
+        for (recipient, subject), bodies in pending.items():
+            try:
+                self.send(subject, "<hr>".join(bodies), recipient)
+                sent += 1
+            except Exception as e:
+                print(f"Failed to send email: {e}")
+        return sent
+
+    def close(self):
+        if self.pending:
+            self.flush()
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+_dispatchers = {}
+
+
+def get_dispatcher(config):
+    """Process-wide dispatcher for the configured SMTP account, reused across calls and ticks"""
+    email_config = config["email"]
+    key = (email_config["smtp_server"], email_config["smtp_port"], email_config["sender"])
+    if key not in _dispatchers:
+        _dispatchers[key] = EmailDispatcher(email_config)
+    return _dispatchers[key]
+
+
+@atexit.register
+def close_dispatchers():
+    while _dispatchers:
+        _dispatchers.popitem()[1].close()
+
+
+def send_email(subject, body, config, recipient=None):
+    """Send email notification"""
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
+        with span("email.send"):
+            get_dispatcher(config).send(subject, body, recipient)
+        incr("emails.sent")
         print(f"Email sent: {subject}")
     except Exception as e:
+        incr("emails.failed")
         print(f"Failed to send email: {e}")
+
+
+def queue_email(subject, body, config, recipient=None):
+    """Queue an email notification until the next flush_emails"""
+    get_dispatcher(config).queue(subject, body, recipient)
+
+
+def flush_emails():
+    """Send the queued email notifications, one SMTP session per account; returns the number sent"""
+    sent = 0
+    for dispatcher in list(_dispatchers.values()):
+        queued = len(dispatcher.pending)
+        if not queued:
+            continue
+        with span("email.send"):
+            flushed = dispatcher.flush()
+        incr("emails.sent", flushed)
+        incr("emails.failed", queued - flushed)
+        print(f"Emails sent: {flushed} of {queued}")
+        sent += flushed
+    return sent
@@ -4,83 +4,296 @@ Merkato: Weekly Report Bot
 Sends weekly trend reports every Thursday.
 """
 
+import argparse
 from datetime import datetime, timedelta
 
-import pandas as pd
+from merkato.analytics import AnalyticsSettings, analyze, top_pairs
+from merkato.fx import format_money, load_converter, symbol_currencies
+from merkato.metrics import metrics, span, write_report
+from merkato.portfolios import all_stocks, get_portfolios, unique_symbols
+from merkato.rollups import open_rollups
+from merkato.storage import get_store
+from merkato.util import flush_emails, lazy_import, load_config, load_prices, queue_email
 
-from merkato.util import load_config, load_or_create_data, send_email
+pd = lazy_import("pandas")
+
+TREND_COLUMNS = ["start_price", "end_price", "change", "percent_change", "min_price", "max_price"]
+PRICE_COLUMNS = ["start_price", "end_price", "change", "min_price", "max_price"]
+LONG_TERM_WINDOWS = {"30-Day": 30, "YTD": None, "52-Week": 364}
+
+
+def calculate_trends(df, since=None):
+    """Calculate trends for every symbol in a single vectorized pass
+
+    Returns a DataFrame indexed by symbol with TREND_COLUMNS, covering only symbols
+    with at least two prices since ``since`` (defaults to 7 days ago).
+    """
+    since = since or datetime.now() - timedelta(days=7)
+    if df.empty:
+        return pd.DataFrame(columns=TREND_COLUMNS, index=pd.Index([], name="symbol"))
+
+    timestamps = df["timestamp"]
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, format="ISO8601")
+    recent = pd.DataFrame({"timestamp": timestamps, "symbol": df["symbol"], "price": df["price"]})
+    recent = recent[recent["timestamp"] >= since]
+    if not recent["timestamp"].is_monotonic_increasing:
+        recent = recent.sort_values("timestamp", kind="stable")
+
+    trends = recent.groupby("symbol", observed=True, sort=False)["price"].agg(
+        start_price="first", end_price="last", min_price="min", max_price="max", count="size"
+    )
+    trends = trends[trends["count"] >= 2]
+    trends["change"] = trends["end_price"] - trends["start_price"]
+    trends["percent_change"] = trends["change"] / trends["start_price"] * 100
+    return trends[TREND_COLUMNS]
 
 
 def calculate_weekly_trends(df, symbol):
     """Calculate 7-day trend for a symbol"""
-    seven_days_ago = datetime.now() - timedelta(days=7)
+    trends = calculate_trends(df[df["symbol"] == symbol])
+    if symbol not in trends.index:
+        return None
+    return {"symbol": symbol, **trends.loc[symbol].to_dict()}
 
-    symbol_data = df[df["symbol"] == symbol].copy()
-    symbol_data["timestamp"] = pd.to_datetime(symbol_data["timestamp"])
-    recent_data = symbol_data[symbol_data["timestamp"] >= seven_days_ago]
 
-    if len(recent_data) < 2:
-        return None
+def calculate_window_trends(daily):
+    """Calculate trends per symbol from daily OHLC bars"""
+    if daily.empty:
+        return pd.DataFrame(columns=TREND_COLUMNS, index=pd.Index([], name="symbol"))
+    bars = daily.sort_values("day", kind="stable").groupby("symbol", sort=False)
+    trends = bars.agg(
+        start_price=("open", "first"), end_price=("close", "last"), min_price=("low", "min"), max_price=("high", "max")
+    )
+    trends["change"] = trends["end_price"] - trends["start_price"]
+    trends["percent_change"] = trends["change"] / trends["start_price"] * 100
+    return trends[TREND_COLUMNS]
 
-    # Sort by timestamp to ensure correct order
-    recent_data = recent_data.sort_values("timestamp")
 
-    first_price = recent_data.iloc[0]["price"]
-    last_price = recent_data.iloc[-1]["price"]
-    change = last_price - first_price
-    percent_change = (change / first_price) * 100
+def calculate_long_term_trends(cache, symbols, today=None):
+    """Calculate LONG_TERM_WINDOWS trends from the rollup cache, without reading raw prices"""
+    today = pd.Timestamp(today or datetime.now()).normalize()
+    trends = {}
+    for name, days in LONG_TERM_WINDOWS.items():
+        start = today.replace(month=1, day=1) if days is None else today - timedelta(days=days)
+        trends[name] = calculate_window_trends(cache.daily(symbols, start=start))
+    return trends
 
-    return {
-        "symbol": symbol,
-        "start_price": first_price,
-        "end_price": last_price,
-        "change": change,
-        "percent_change": percent_change,
-        "min_price": recent_data["price"].min(),
-        "max_price": recent_data["price"].max(),
-    }
 
+def convert_trends(trends, currencies, converter, columns=PRICE_COLUMNS):
+    """Trends with their price ``columns`` converted from each symbol's currency in ``currencies``"""
+    factors = converter.factors(currencies.get(symbol, "USD") for symbol in trends.index)
+    converted = trends.copy()
+    converted[columns] = trends[columns].to_numpy(dtype=float) * factors[:, None]
+    return converted
 
-def send_weekly_report(config):
-    """Send weekly trend report"""
-    df = load_or_create_data()
 
-    if df.empty:
-        print("No data available for weekly report")
-        return
+def calculate_analytics(cache, symbols, settings, today=None):
+    """Risk metrics and correlations over the last ``settings.days`` of daily closes from the rollup cache"""
+    start = pd.Timestamp(today or datetime.now()).normalize() - timedelta(days=settings.days)
+    daily = cache.daily(symbols, start=start)
+    return analyze(daily.rename(columns={"day": "timestamp", "close": "price"}), settings)
+
+
+def _format_percent(trends, symbol):
+    if symbol not in trends.index:
+        return "<td>–</td>"
+    percent_change = trends.loc[symbol, "percent_change"]
+    color = "green" if percent_change >= 0 else "red"
+    return f"<td style='color: {color};'>{percent_change:+.2f}%</td>"
+
+
+def _format_price(trends, symbol, column, currency="USD"):
+    if symbol not in trends.index:
+        return "<td>–</td>"
+    return f"<td>{format_money(trends.loc[symbol, column], currency)}</td>"
+
+
+def render_long_term_trends(long_term, symbols, currencies=None):
+    """Render the longer-term trends table; ``currencies`` maps symbols to the currency of their prices"""
+    currencies = currencies or {}
+    body = "<h3>Longer-Term Trends</h3>"
+    body += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse;'>"
+    body += "<tr style='background-color: #f0f0f0;'>"
+    body += "<th>Symbol</th><th>30-Day</th><th>YTD</th><th>52-Week Low</th><th>52-Week High</th>"
+    body += "</tr>"
+
+    for symbol in symbols:
+        body += "<tr>"
+        body += f"<td><strong>{symbol}</strong></td>"
+        body += _format_percent(long_term["30-Day"], symbol)
+        body += _format_percent(long_term["YTD"], symbol)
+        body += _format_price(long_term["52-Week"], symbol, "min_price", currencies.get(symbol, "USD"))
+        body += _format_price(long_term["52-Week"], symbol, "max_price", currencies.get(symbol, "USD"))
+        body += "</tr>"
+
+    body += "</table>"
+    return body
+
 
-    body = "<h2>Weekly Stock Trends Report</h2>"
-    body += f"<p>Report for the past 7 days (as of {datetime.now().strftime('%Y-%m-%d %H:%M')})</p>"
+def _format_metric(value, suffix="%", signed=False):
+    if pd.isna(value):
+        return "<td>–</td>"
+    return f"<td>{value:+.2f}{suffix}</td>" if signed else f"<td>{value:.2f}{suffix}</td>"
+
+
+def render_analytics(metrics, correlations, symbols, settings, currencies=None):
+    """Render the risk metrics table and the correlations of ``symbols``
+
+    Up to ``settings.correlations`` symbols get a full correlation matrix, larger
+    watchlists their most correlated pairs.
+    """
+    currencies = currencies or {}
+    symbols = [symbol for symbol in symbols if symbol in metrics.index]
+    if not symbols:
+        return ""
+    averages = [f"ma_{window}" for window in settings.windows]
+
+    body = f"<h3>{settings.days}-Day Analytics</h3>"
     body += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse;'>"
     body += "<tr style='background-color: #f0f0f0;'>"
+    body += "<th>Symbol</th><th>Return</th><th>Volatility (ann.)</th><th>Max Drawdown</th>"
+    body += "".join(f"<th>{window}-Day MA</th>" for window in settings.windows)
+    body += "</tr>"
+    for symbol in symbols:
+        row = metrics.loc[symbol]
+        body += "<tr>"
+        body += f"<td><strong>{symbol}</strong></td>"
+        body += _format_metric(row["return"], signed=True)
+        body += _format_metric(row["volatility"])
+        body += _format_metric(row["max_drawdown"])
+        for column in averages:
+            if pd.isna(row[column]):
+                body += "<td>–</td>"
+            else:
+                arrow = "▲" if row["last_price"] >= row[column] else "▼"
+                body += f"<td>{format_money(row[column], currencies.get(symbol, 'USD'))} {arrow}</td>"
+        body += "</tr>"
+    body += "</table>"
+
+    if len(symbols) < 2:
+        return body
+    correlations = correlations.loc[symbols, symbols]
+    if len(symbols) <= settings.correlations:
+        body += "<h3>Correlation of Daily Returns</h3>"
+        body += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse;'>"
+        body += "<tr style='background-color: #f0f0f0;'><th></th>"
+        body += "".join(f"<th>{symbol}</th>" for symbol in symbols)
+        body += "</tr>"
+        for symbol in symbols:
+            body += f"<tr><td><strong>{symbol}</strong></td>"
+            body += "".join(_format_metric(value, suffix="") for value in correlations.loc[symbol])
+            body += "</tr>"
+        body += "</table>"
+    else:
+        body += "<h3>Most Correlated Pairs</h3><ul>"
+        for first, second, value in top_pairs(correlations, settings.correlations):
+            body += f"<li>{first} / {second}: {value:.2f}</li>"
+        body += "</ul>"
+    return body
+
+
+def render_weekly_trends(trends, symbols, currencies=None):
+    """Render the weekly trends table; ``currencies`` maps symbols to the currency of their prices"""
+    currencies = currencies or {}
+    body = "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse;'>"
+    body += "<tr style='background-color: #f0f0f0;'>"
     body += "<th>Symbol</th><th>Start Price</th><th>End Price</th>"
     body += "<th>Change</th><th>% Change</th><th>Week Low</th><th>Week High</th>"
     body += "</tr>"
 
-    for stock in config["stocks"]:
-        trend = calculate_weekly_trends(df, stock["symbol"])
-        if trend:
-            color = "green" if trend["change"] >= 0 else "red"
-            arrow = "▲" if trend["change"] >= 0 else "▼"
-
-            body += "<tr>"
-            body += f"<td><strong>{trend['symbol']}</strong></td>"
-            body += f"<td>${trend['start_price']:.2f}</td>"
-            body += f"<td>${trend['end_price']:.2f}</td>"
-            body += f"<td style='color: {color};'>{arrow} ${abs(trend['change']):.2f}</td>"
-            body += f"<td style='color: {color};'>{trend['percent_change']:+.2f}%</td>"
-            body += f"<td>${trend['min_price']:.2f}</td>"
-            body += f"<td>${trend['max_price']:.2f}</td>"
-            body += "</tr>"
+    for symbol in symbols:
+        if symbol not in trends.index:
+            continue
+        trend = {"symbol": symbol, **trends.loc[symbol].to_dict()}
+        currency = currencies.get(symbol, "USD")
+
+        color = "green" if trend["change"] >= 0 else "red"
+        arrow = "▲" if trend["change"] >= 0 else "▼"
+
+        body += "<tr>"
+        body += f"<td><strong>{trend['symbol']}</strong></td>"
+        body += f"<td>{format_money(trend['start_price'], currency)}</td>"
+        body += f"<td>{format_money(trend['end_price'], currency)}</td>"
+        body += f"<td style='color: {color};'>{arrow} {format_money(abs(trend['change']), currency)}</td>"
+        body += f"<td style='color: {color};'>{trend['percent_change']:+.2f}%</td>"
+        body += f"<td>{format_money(trend['min_price'], currency)}</td>"
+        body += f"<td>{format_money(trend['max_price'], currency)}</td>"
+        body += "</tr>"
 
     body += "</table>"
+    return body
+
+
+def send_weekly_report(config):
+    """Send weekly trend report, one per portfolio to each of its recipients"""
+    portfolios = [portfolio for portfolio in get_portfolios(config) if portfolio.stocks]
+    symbols = unique_symbols(all_stocks(config))
+    df = load_prices(symbols, start=datetime.now() - timedelta(days=7), config=config)
+
+    if df.empty:
+        print("No data available for weekly report")
+        return
+
+    # Trends are computed once for the symbols of all portfolios
+    with span("report.trends"):
+        trends = calculate_trends(df)
+    try:
+        with span("report.long_term"), open_rollups(config) as cache:
+            long_term = calculate_long_term_trends(cache, symbols)
+    except Exception as e:
+        print(f"Skipping longer-term trends: {e}")
+        long_term = None
+
+    analytics = None
+    try:
+        settings = AnalyticsSettings.from_config(config)
+        with span("report.analytics"), open_rollups(config) as cache:
+            analytics = calculate_analytics(cache, symbols, settings)
+    except Exception as e:
+        print(f"Skipping analytics: {e}")
+
+    # Stored prices are in the currency recorded next to them, converted at today's rates
+    native = {**symbol_currencies(all_stocks(config), config), **get_store(config).currencies()}
+    native = {symbol: native[symbol] for symbol in symbols}
+    converter = load_converter(native.values(), config)
+    trends = convert_trends(trends, native, converter)
+    if long_term is not None:
+        long_term = {name: convert_trends(window, native, converter) for name, window in long_term.items()}
+    if analytics is not None:
+        columns = ["last_price", *(f"ma_{window}" for window in settings.windows)]
+        analytics = (convert_trends(analytics[0], native, converter, columns), analytics[1])
+    currencies = dict(zip(native, converter.labels(native.values())))
+
+    for portfolio in portfolios:
+        portfolio_symbols = unique_symbols(portfolio.stocks)
+        body = "<h2>Weekly Stock Trends Report</h2>"
+        body += f"<p>Report for the past 7 days (as of {datetime.now().strftime('%Y-%m-%d %H:%M')})</p>"
+        body += render_weekly_trends(trends, portfolio_symbols, currencies)
+        if long_term is not None:
+            body += render_long_term_trends(long_term, portfolio_symbols, currencies)
+        if analytics is not None:
+            body += render_analytics(*analytics, portfolio_symbols, settings, currencies)
+
+        subject = "📊 Weekly Stock Trends Report"
+        if portfolio.name is not None:
+            subject += f": {portfolio.name}"
+        for recipient in portfolio.recipients or [None]:
+            if recipient is None:
+                queue_email(subject, body, config)
+            else:
+                queue_email(subject, body, config, recipient)
+    flush_emails()
 
-    send_email("📊 Weekly Stock Trends Report", body, config)
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send the weekly trend report")
+    parser.parse_args(argv)
 
-def main():
+    metrics.start_run("weekly-report")
     config = load_config()
     send_weekly_report(config)
+    write_report(config)
 
 
 if __name__ == "__main__":
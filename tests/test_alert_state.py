@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from merkato.alert_state import AlertSettings, AlertState
+from merkato.fetch import FetchResult
+from merkato.rules import Rule, parse_rules
+from merkato.stock_monitor import evaluate_prices
+
+STOCK = {"symbol": "AAPL", "target_price": 100.0, "operator": "<="}
+RULE = Rule("AAPL", "price", "<=", 100.0)
+START = datetime(2026, 1, 7, 10, 0)
+
+
+def make_state(tmp_path, **settings):
+    return AlertState(AlertSettings(state_file=str(tmp_path / "alert_state.json"), **settings))
+
+
+class TestAlertState:
+    def test_fires_once_while_condition_holds(self, tmp_path):
+        """Test that an alert fires on the transition only"""
+        state = make_state(tmp_path)
+
+        fired = [state.update(RULE, 95.0, True, START + timedelta(hours=i)) for i in range(5)]
+
+        assert fired == [True, False, False, False, False]
+
+    def test_renotify_interval(self, tmp_path):
+        """Test that an active alert is repeated after the re-notify interval"""
+        state = make_state(tmp_path, renotify_interval=3600)
+
+        fired = [state.update(RULE, 95.0, True, START + timedelta(minutes=30 * i)) for i in range(5)]
+
+        assert fired == [True, False, True, False, True]
+
+    def test_hysteresis_rearms_past_band(self, tmp_path):
+        """Test that the price must leave the hysteresis band before the rule re-arms"""
+        state = make_state(tmp_path, hysteresis=2.0)
+
+        assert state.update(RULE, 99.0, True, START)
+        assert not state.update(RULE, 101.0, False, START + timedelta(hours=1))  # inside 100..102
+        assert not state.update(RULE, 99.5, True, START + timedelta(hours=2))
+        assert not state.update(RULE, 103.0, False, START + timedelta(hours=3))  # re-armed
+        assert state.update(RULE, 99.0, True, START + timedelta(hours=4))
+
+    def test_cooldown_after_rearm(self, tmp_path):
+        """Test that a re-armed rule waits for the cooldown before firing again"""
+        state = make_state(tmp_path, cooldown=3600)
+
+        assert state.update(RULE, 99.0, True, START)
+        state.update(RULE, 101.0, False, START + timedelta(minutes=10))
+        assert not state.update(RULE, 99.0, True, START + timedelta(minutes=20))
+        state.update(RULE, 101.0, False, START + timedelta(minutes=30))
+        assert state.update(RULE, 99.0, True, START + timedelta(hours=2))
+
+    def test_per_stock_override(self, tmp_path):
+        """Test that a stock's own keys override the global policy"""
+        state = make_state(tmp_path)
+        (rule,) = parse_rules({**STOCK, "renotify_interval": 60})
+
+        assert state.update(rule, 95.0, True, START)
+        assert state.update(rule, 95.0, True, START + timedelta(minutes=1))
+
+    def test_changed_rule_starts_fresh(self, tmp_path):
+        """Test that editing the target creates a new rule state"""
+        state = make_state(tmp_path)
+        state.update(RULE, 95.0, True, START)
+
+        assert state.update(Rule("AAPL", "price", "<=", 97.0), 95.0, True, START)
+        assert RULE.id == "AAPL|<=|100.0"
+
+    def test_notify_rearms_unmatched_rules(self, tmp_path):
+        """Test that active rules missing from a tick's matches re-arm"""
+        state = make_state(tmp_path)
+        rules = {RULE.id: RULE}
+
+        assert state.notify("AAPL", 95.0, [(RULE, "<= $100.00")], rules, START) == [(RULE, "<= $100.00")]
+        assert state.notify("AAPL", 105.0, [], rules, START + timedelta(hours=1)) == []
+        assert state.active["AAPL"] == set()
+        assert state.notify("AAPL", 95.0, [(RULE, "<= $100.00")], rules, START + timedelta(hours=2))
+
+    def test_save_and_load(self, tmp_path):
+        """Test that state survives a restart"""
+        config = {"alerts": {"state_file": str(tmp_path / "state" / "alert_state.json")}}
+        state = AlertState.load(config)
+        state.update(RULE, 95.0, True, START)
+        state.save()
+
+        reloaded = AlertState.load(config)
+
+        assert reloaded.states == state.states
+        assert not reloaded.update(RULE, 94.0, True, START + timedelta(hours=1))
+
+    def test_unknown_setting(self):
+        """Test that typos in the alerts section are rejected"""
+        with pytest.raises(ValueError, match="Unknown alert settings: renotify"):
+            AlertSettings.from_config({"alerts": {"renotify": 60}})
+
+
+class TestEvaluatePrices:
+    def test_suppresses_repeated_alerts(self, tmp_path, capsys):
+        """Test that evaluate_prices records every price but alerts once"""
+        state = make_state(tmp_path)
+        results = {"AAPL": FetchResult("AAPL", price=95.0, attempts=1)}
+
+        rows, alerts = evaluate_prices([STOCK], results, START.isoformat(), state)
+        rows_again, alerts_again = evaluate_prices([STOCK], results, (START + timedelta(hours=1)).isoformat(), state)
+
+        assert len(alerts) == 1 and alerts_again == []
+        assert len(rows) == len(rows_again) == 1
+        assert "already sent" in capsys.readouterr().out
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from merkato.analytics import (
+    AnalyticsSettings,
+    analyze,
+    correlation,
+    forward_fill,
+    price_matrix,
+    row_metrics,
+    top_pairs,
+)
+
+
+def daily_prices(closes, start="2026-01-01"):
+    """Price frame with one close per day for each ``symbol -> closes`` entry (None skips a day)"""
+    days = pd.date_range(start, periods=max(len(values) for values in closes.values()), freq="D")
+    rows = [
+        (day, symbol, price)
+        for symbol, values in closes.items()
+        for day, price in zip(days, values)
+        if price is not None
+    ]
+    return pd.DataFrame(rows, columns=["timestamp", "symbol", "price"])
+
+
+class TestAnalyticsSettings:
+    def test_from_config_defaults(self):
+        """Test the default window and moving averages"""
+        assert AnalyticsSettings.from_config({}) == AnalyticsSettings()
+        assert AnalyticsSettings().windows == [20, 50]
+
+    def test_from_config_unknown_key(self):
+        """Test that typos in the analytics section are rejected"""
+        with pytest.raises(ValueError, match="Unknown analytics settings: window"):
+            AnalyticsSettings.from_config({"analytics": {"window": 20}})
+
+    def test_invalid_windows(self):
+        """Test that moving average windows must be positive day counts"""
+        with pytest.raises(ValueError, match="windows"):
+            AnalyticsSettings.from_config({"analytics": {"windows": [0]}})
+
+
+class TestPriceMatrix:
+    def test_last_price_per_day(self):
+        """Test that the pivot keeps each day's last price, one column per trading day"""
+        df = pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(
+                    ["2026-01-01 10:00", "2026-01-01 15:00", "2026-01-01 12:00", "2026-01-03 10:00"]
+                ),
+                "symbol": ["VT", "VT", "AAPL", "VT"],
+                "price": [1.0, 2.0, 5.0, 3.0],
+            }
+        )
+
+        symbols, days, closes = price_matrix(df)
+
+        assert symbols == ["AAPL", "VT"]
+        assert days.tolist() == [pd.Timestamp("2026-01-01").date(), pd.Timestamp("2026-01-03").date()]
+        np.testing.assert_array_equal(closes, [[5.0, np.nan], [2.0, 3.0]])
+
+    def test_forward_fill(self):
+        """Test that gaps take the previous close and leading gaps stay empty"""
+        filled = forward_fill(np.array([[np.nan, 1.0, np.nan, 3.0]]))
+
+        np.testing.assert_array_equal(filled, [[np.nan, 1.0, 1.0, 3.0]])
+
+
+class TestMetrics:
+    def test_drawdown_return_and_moving_average(self):
+        """Test max drawdown, period return and moving averages against hand-computed values"""
+        closes = np.array([[100.0, 120.0, 90.0, 110.0]])
+
+        metrics = row_metrics(closes, windows=(2, 5))
+
+        assert metrics["max_drawdown"][0] == pytest.approx(-25.0)
+        assert metrics["return"][0] == pytest.approx(10.0)
+        assert metrics["ma_2"][0] == pytest.approx(100.0)
+        assert np.isnan(metrics["ma_5"][0])
+
+    def test_volatility(self):
+        """Test annualized volatility of daily log returns"""
+        closes = 100 * np.exp(np.cumsum([[0.0, 0.01, -0.01, 0.02, -0.02]], axis=1))
+
+        volatility = row_metrics(closes, windows=())["volatility"][0]
+
+        assert volatility == pytest.approx(np.std([0.01, -0.01, 0.02, -0.02], ddof=1) * np.sqrt(252) * 100)
+
+    def test_correlation_matches_pairwise(self):
+        """Test that the matrix-product correlation equals pandas' pairwise-complete one"""
+        returns = np.random.default_rng(0).normal(size=(5, 30))
+        returns[0, :8] = np.nan
+
+        expected = pd.DataFrame(returns.T).corr().to_numpy()
+
+        np.testing.assert_allclose(correlation(returns), expected)
+
+
+class TestAnalyze:
+    def test_analyze(self):
+        """Test metrics and correlations of a small watchlist"""
+        walk = list(100 * np.exp(np.cumsum(np.random.default_rng(2).normal(0, 0.01, 10))))
+        df = daily_prices(
+            {
+                "A": walk,
+                "B": [2 * price for price in walk],
+                "C": [1e4 / price for price in walk],
+                "D": [None] * 9 + [50.0],
+            }
+        )
+
+        metrics, correlations = analyze(df, AnalyticsSettings(windows=[3]))
+
+        assert list(metrics.index) == ["A", "B", "C", "D"]
+        assert metrics.loc["A", "volatility"] == pytest.approx(metrics.loc["B", "volatility"])
+        assert metrics.loc["B", "ma_3"] == pytest.approx(2 * np.mean(walk[-3:]))
+        assert np.isnan(metrics.loc["D", "volatility"])
+        assert correlations.loc["A", "B"] == pytest.approx(1.0)
+        assert correlations.loc["A", "C"] == pytest.approx(-1.0)
+        assert np.isnan(correlations.loc["A", "D"])
+
+    def test_volatility_skips_non_trading_days(self):
+        """Test that weekends do not dilute volatility, against a pandas daily-return reference"""
+        days = pd.bdate_range("2026-01-05", periods=120)
+        prices = pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(3).normal(0, 0.01, len(days)))), index=days)
+        df = pd.DataFrame({"timestamp": days, "symbol": "VT", "price": prices.to_numpy()})
+
+        metrics, _ = analyze(df, AnalyticsSettings(windows=[20]))
+
+        expected = prices.pct_change().std() * np.sqrt(252) * 100
+        assert metrics.loc["VT", "volatility"] == pytest.approx(expected, rel=0.01)
+        assert metrics.loc["VT", "ma_20"] == pytest.approx(prices.iloc[-20:].mean())
+
+    def test_process_pool_matches(self):
+        """Test that chunking across a process pool gives the same metrics"""
+        rng = np.random.default_rng(1)
+        df = daily_prices({f"S{i}": list(100 * np.exp(np.cumsum(rng.normal(0, 0.01, 30)))) for i in range(6)})
+
+        single, _ = analyze(df)
+        pooled, _ = analyze(df, AnalyticsSettings(workers=2, chunk_size=2))
+
+        pd.testing.assert_frame_equal(single, pooled)
+
+    def test_empty(self):
+        """Test that no history gives empty results"""
+        metrics, correlations = analyze(pd.DataFrame(columns=["timestamp", "symbol", "price"]))
+
+        assert metrics.empty and correlations.empty
+        assert "ma_20" in metrics.columns
+
+    def test_top_pairs(self):
+        """Test that the most correlated distinct pairs come first"""
+        correlations = pd.DataFrame(
+            [[1.0, 0.9, 0.1], [0.9, 1.0, 0.5], [0.1, 0.5, 1.0]], index=list("ABC"), columns=list("ABC")
+        )
+
+        assert top_pairs(correlations, 2) == [("A", "B", 0.9), ("B", "C", 0.5)]
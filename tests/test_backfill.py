@@ -0,0 +1,86 @@
+from datetime import date
+from unittest.mock import patch
+
+import pandas as pd
+
+from merkato.backfill import backfill, find_gaps, gap_ranges, plan_downloads
+from merkato.storage import CsvStore
+
+# Monday 2026-01-19 is Martin Luther King Jr. Day
+TODAY = date(2026, 1, 23)
+STOCKS = [{"symbol": "VT", "target_price": 100.0}, {"symbol": "NEW", "target_price": 10.0}]
+
+
+def fake_download(symbols, start, end, **kwargs):
+    days = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1))
+    columns = pd.MultiIndex.from_product([["Close"], symbols], names=["Price", "Ticker"])
+    values = [[100.0 + day.day] * len(symbols) for day in days]
+    return pd.DataFrame(values, index=days, columns=columns)
+
+
+def make_config(tmp_path):
+    return {
+        "storage": {"root": str(tmp_path), "rollups": str(tmp_path / "rollups.sqlite")},
+        "stocks": STOCKS,
+    }
+
+
+class TestGaps:
+    def test_find_gaps_uses_exchange_calendar(self, tmp_path):
+        """Test that only trading days without any price count as gaps"""
+        store = CsvStore(tmp_path)
+        store.append([("2026-01-15T21:00:00", "VT", 1.0), ("2026-01-21T21:00:00", "VT", 1.0)])
+        df = store.read()
+
+        gaps = find_gaps(STOCKS, df, date(2026, 1, 15), TODAY)
+
+        assert gaps["VT"] == [date(2026, 1, 16), date(2026, 1, 20), date(2026, 1, 22)]
+        assert len(gaps["NEW"]) == 5
+
+    def test_gap_ranges_bridge_weekends(self):
+        """Test that consecutive trading days form one range across a weekend"""
+        days = [date(2026, 1, 16), date(2026, 1, 20), date(2026, 1, 27)]
+
+        assert gap_ranges(days) == [(date(2026, 1, 16), date(2026, 1, 20)), (date(2026, 1, 27), date(2026, 1, 27))]
+
+    def test_plan_downloads_chunks_windows_and_symbols(self):
+        """Test that jobs cover each window once per batch of symbols"""
+        gaps = {"A": [date(2026, 1, 6), date(2026, 3, 2)], "B": [date(2026, 1, 7)], "C": [date(2026, 1, 8)]}
+
+        jobs = plan_downloads(gaps, window_days=30, batch_size=2)
+
+        assert [symbols for _, _, symbols in jobs] == [["A", "B"], ["C"], ["A"]]
+        assert all((end - start).days == 30 for start, end, _ in jobs)
+        assert all(start <= date(2026, 1, 6) < end for start, end, _ in jobs[:2])
+
+
+@patch("merkato.backfill.yf.download", side_effect=fake_download)
+class TestBackfill:
+    def test_fills_gaps_and_is_idempotent(self, mock_download, tmp_path):
+        """Test that missing days are merged once and a rerun adds nothing"""
+        config = make_config(tmp_path)
+        CsvStore(tmp_path).append([("2026-01-21T21:00:00", "VT", 1.0)])
+
+        added = backfill(config, days=10, today=TODAY)
+
+        df = CsvStore(tmp_path).read()
+        assert added == len(df) - 1
+        assert df["timestamp"].is_monotonic_increasing
+        assert df[df["symbol"] == "VT"]["timestamp"].dt.date.nunique() == 7
+        assert df[df["symbol"] == "NEW"]["timestamp"].dt.date.nunique() == 7
+        assert backfill(config, days=10, today=TODAY) == 0
+
+    def test_dry_run(self, mock_download, tmp_path, capsys):
+        """Test that a dry run only reports the gaps"""
+        added = backfill(make_config(tmp_path), days=3, today=TODAY, dry_run=True)
+
+        assert added == 0
+        mock_download.assert_not_called()
+        assert "VT: 3 missing days (2026-01-20..2026-01-22)" in capsys.readouterr().out
+
+    def test_failed_download_is_reported(self, mock_download, tmp_path, capsys):
+        """Test that a failing range download does not abort the backfill"""
+        mock_download.side_effect = ValueError("rate limited")
+
+        assert backfill(make_config(tmp_path), days=3, today=TODAY) == 0
+        assert "rate limited" in capsys.readouterr().out
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from merkato.backtest import backtest, daily_closes, main, moving_averages, parse_candidate, parse_sweep
+from merkato.rules import Rule, parse_rules
+from merkato.util import typed_prices
+
+
+def prices_frame(prices, symbol="AAPL", start="2026-01-05T10:00:00", freq="h"):
+    timestamps = pd.date_range(start, periods=len(prices), freq=freq).strftime("%Y-%m-%dT%H:%M:%S")
+    return typed_prices(pd.DataFrame({"timestamp": timestamps, "symbol": symbol, "price": prices}))
+
+
+class TestBacktest:
+    def test_price_rule_fires_once_per_episode(self):
+        """Test that a price rule fires when its condition becomes true, not on every row"""
+        df = prices_frame([105.0, 99.0, 98.0, 101.0, 97.0])
+
+        results, emails = backtest(df, [Rule("AAPL", "price", "<=", 100.0)])
+
+        assert results.loc[0, "fires"] == 2
+        assert results.loc[0, "first_fire"] == pd.Timestamp("2026-01-05T11:00:00")
+        assert emails == {None: 2}
+
+    def test_sweep_matches_single_rules(self):
+        """Test that sweeping thresholds gives the same counts as evaluating rules one by one"""
+        df = prices_frame([105.0, 99.0, 98.0, 101.0, 97.0, 103.0, 95.0])
+        sweep = parse_sweep("AAPL:<=:95:105:1")
+
+        results, _ = backtest(df, sweep)
+
+        for rule, fires in zip(sweep, results["fires"]):
+            assert fires == backtest(df, [rule])[0].loc[0, "fires"]
+        assert results["fires"].tolist()[:3] == [1, 1, 2]
+
+    def test_emails_batched_per_run(self):
+        """Test that rules firing in the same run count as one email"""
+        df = pd.concat([prices_frame([105.0, 99.0]), prices_frame([50.0, 40.0], symbol="VT")], ignore_index=True)
+        rules = [Rule("AAPL", "price", "<=", 100.0), Rule("VT", "price", "<", 45.0)]
+
+        _, emails = backtest(df.sort_values("timestamp", kind="stable"), rules)
+
+        assert emails == {None: 1}
+
+    def test_range_and_change_rules(self):
+        """Test range and percent change rules over daily closes"""
+        df = prices_frame([100.0, 100.0, 94.0, 93.0, 99.0], freq="D")
+        stock = {
+            "symbol": "AAPL",
+            "rules": [
+                {"type": "range", "low": 90, "high": 95},
+                {"type": "change", "days": 1, "operator": "<=", "percent": -5},
+            ],
+        }
+
+        results, _ = backtest(df, parse_rules(stock))
+
+        assert results["fires"].tolist() == [1, 1]
+        assert results.loc[1, "first_fire"] == pd.Timestamp("2026-01-07T10:00:00")
+
+    def test_moving_average(self):
+        """Test that averages only use the closes of earlier days"""
+        df = prices_frame([1.0, 2.0, 3.0, 4.0], freq="D")
+        timestamps = df["timestamp"].to_numpy()
+
+        averages = moving_averages(timestamps, 2, daily_closes(timestamps, df["price"].to_numpy()))
+
+        assert averages[2:].tolist() == [1.5, 2.5]
+
+    def test_unknown_symbol(self):
+        """Test that rules without history never fire"""
+        results, emails = backtest(prices_frame([1.0]), [Rule("VT", "price", "<=", 100.0)])
+
+        assert results.loc[0, "fires"] == 0
+        assert emails == {}
+
+
+class TestCommand:
+    def test_parse_candidate(self):
+        """Test candidate rule specs"""
+        assert parse_candidate("CHSPI.SW:>=:150").id == "CHSPI.SW|>=|150.0"
+        with pytest.raises(ValueError):
+            parse_candidate("AAPL:==:1")
+
+    @patch("merkato.backtest.load_prices")
+    @patch("merkato.backtest.load_config", return_value={"stocks": [{"symbol": "AAPL", "target_price": 100.0}]})
+    def test_configured_rules(self, mock_config, mock_load, capsys):
+        """Test backtesting the configured rules"""
+        mock_load.return_value = prices_frame([105.0, 99.0])
+
+        main([])
+
+        out = capsys.readouterr().out
+        assert "1 fires" in out
+        assert "default: 1 alert emails to 1 recipient(s)" in out
+        assert mock_load.call_args[0][0] == ["AAPL"]
@@ -0,0 +1,115 @@
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from merkato.cli import check_config, main
+
+# Cumulative import time allowed for the CLI and the --check-config path, in microseconds
+IMPORT_BUDGET_US = 300_000
+# Submodules only present once the heavy packages really executed
+HEAVY_MODULES = ("pandas.core.frame", "numpy.linalg", "yfinance.ticker", "pyarrow.lib")
+
+VALID = {
+    "fetch": {"max_workers": 2},
+    "stocks": [
+        {"symbol": "VT", "target_price": 100.0},
+        {"symbol": "CHSPI.SW", "rules": [{"type": "change", "days": 5, "percent": -5}]},
+    ],
+}
+
+
+class TestCheckConfig:
+    def test_valid(self):
+        """Test that a valid config has no problems"""
+        assert check_config(VALID) == []
+
+    def test_reports_every_problem(self):
+        """Test that problems in settings, stocks and rules are all reported"""
+        config = {
+            "fetch": {"workers": 2},
+            "storage": {"backend": "sqlite"},
+            "stocks": [
+                {"target_price": 1.0},
+                {"symbol": "VT", "target_price": 1.0, "operator": "=="},
+                {"symbol": "AAPL", "exchange": "XXXX", "rules": [{"type": "range", "low": 2, "high": 1}]},
+                {"symbol": "CHSPI.SW", "currency": "swiss francs"},
+            ],
+        }
+
+        problems = check_config(config)
+
+        assert problems == [
+            "Unknown fetch settings: workers",
+            "Unknown storage backend 'sqlite'",
+            "Stock #1 has no symbol",
+            "Invalid operator '==' for VT",
+            "Unknown exchange 'XXXX' for AAPL",
+            "Invalid rule {'type': 'range', 'low': 2, 'high': 1} for AAPL: 'low' must not exceed 'high'",
+            "Invalid currency 'swiss francs' for CHSPI.SW",
+        ]
+
+    def test_check_config_portfolios(self):
+        """Test that the stocks of every portfolio are validated"""
+        config = {"portfolios": [{"name": "tech", "stocks": [{"symbol": "AAPL", "operator": "=="}, {}]}]}
+
+        assert check_config(config) == ["Invalid operator '==' for AAPL", "Stock #2 of portfolio 'tech' has no symbol"]
+        assert check_config({"portfolios": [{"stocks": []}]}) == ["Portfolio #1 has no name"]
+
+    @patch("merkato.cli.load_config", return_value=VALID)
+    def test_check_config_flag(self, mock_load_config, capsys):
+        """Test the --check-config fast path"""
+        main(["--check-config"])
+
+        assert "is valid: 2 stocks" in capsys.readouterr().out
+
+    @patch("merkato.cli.load_config", return_value={"stocks": "VT"})
+    def test_check_config_flag_fails(self, mock_load_config):
+        """Test that an invalid config exits non-zero"""
+        with pytest.raises(SystemExit) as exc:
+            main(["--check-config"])
+
+        assert exc.value.code == 1
+
+
+class TestDispatch:
+    @patch("merkato.stock_monitor.main")
+    def test_forwards_arguments(self, mock_main):
+        """Test that command arguments reach the command's own parser"""
+        main(["monitor", "--daemon", "--no-cache"])
+
+        mock_main.assert_called_once_with(["--daemon", "--no-cache"])
+
+    def test_no_command(self):
+        """Test that running without a command prints help and fails"""
+        with pytest.raises(SystemExit):
+            main([])
+
+
+class TestImportTime:
+    def run_python(self, code):
+        return subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+        )
+
+    def test_check_config_imports_nothing_heavy(self):
+        """Test that the CLI and config validation leave pandas, numpy and yfinance unloaded"""
+        result = self.run_python(
+            "import sys; from merkato.cli import check_config; check_config({'stocks': [{'symbol': 'VT'}]}); "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+        )
+
+        assert result.stdout.strip() == "[]"
+
+    def test_import_budget(self):
+        """Test the measured cumulative import time of the CLI against its budget"""
+        result = self.run_python("import merkato.cli, merkato.daemon")
+
+        total = 0
+        for line in result.stderr.splitlines():
+            # "import time: self | cumulative | name", top-level imports are not indented
+            _, cumulative, name = line.split("|")
+            if name.startswith(" merkato") and not name.startswith("  "):
+                total += int(cumulative)
+        assert 0 < total < IMPORT_BUDGET_US, f"merkato imports took {total / 1000:.0f}ms"
@@ -0,0 +1,219 @@
+import os
+from datetime import datetime
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from merkato.daemon import DaemonSettings, MonitorDaemon
+from merkato.fetch import FetchResult
+
+NEW_YORK = ZoneInfo("America/New_York")
+WEDNESDAY = datetime(2026, 1, 7, 11, 0, tzinfo=NEW_YORK)
+SATURDAY = datetime(2026, 1, 10, 11, 0, tzinfo=NEW_YORK)
+
+
+@pytest.fixture(autouse=True)
+def alert_state_dir(tmp_path, monkeypatch):
+    """Keep the daemon's alert state file out of the repository"""
+    monkeypatch.chdir(tmp_path)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_daemon(tmp_path, config, when=WEDNESDAY):
+    config_file = tmp_path / "config.json"
+    config_file.write_text("{}")
+    clock = FakeClock()
+    holder = {"config": config}
+    daemon = MonitorDaemon(
+        config_loader=lambda: holder["config"], config_file=config_file, clock=clock, now=lambda: when
+    )
+    return daemon, clock, holder, config_file
+
+
+def fake_fetch(symbols, config):
+    return {symbol: FetchResult(symbol, price=100.0, attempts=1) for symbol in symbols}
+
+
+CONFIG = {
+    "daemon": {"interval": 60, "flush_interval": 300},
+    "stocks": [
+        {"symbol": "AAPL", "target_price": 90.0},
+        {"symbol": "VT", "target_price": 150.0, "interval": 600},
+    ],
+}
+
+
+@patch("merkato.daemon.stock_monitor.load_last_records", return_value={})
+@patch("merkato.daemon.stock_monitor.send_price_alerts")
+@patch("merkato.daemon.stock_monitor.record_prices")
+@patch("merkato.daemon.stock_monitor.fetch_stock_prices", side_effect=fake_fetch)
+class TestMonitorDaemon:
+    def test_per_symbol_intervals(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that each symbol is checked on its own interval"""
+        daemon, clock, _, _ = make_daemon(tmp_path, CONFIG)
+
+        daemon.tick()
+        clock.now += 60
+        daemon.tick()
+
+        assert [call.args[0] for call in mock_fetch.call_args_list] == [["AAPL", "VT"], ["AAPL"]]
+        assert daemon.recent["VT"][1] == 100.0
+
+    def test_alerts_sent_per_tick(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that alerts fire from the in-memory config"""
+        daemon, _, _, _ = make_daemon(tmp_path, CONFIG)
+
+        alerts = daemon.tick()
+
+        assert [alert["symbol"] for alert in alerts] == ["VT"]
+        mock_alerts.assert_called_once()
+
+    def test_alert_not_repeated(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that an alert whose condition still holds is not resent, even after a restart"""
+        daemon, clock, _, _ = make_daemon(tmp_path, CONFIG)
+        daemon.tick()
+        daemon.flush()
+        clock.now += 600
+
+        assert daemon.tick() == []
+        restarted, _, _, _ = make_daemon(tmp_path, CONFIG)
+        assert restarted.tick() == []
+        mock_alerts.assert_called_once()
+
+    def test_flush_batches_rows(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that rows are buffered and flushed in one batch"""
+        daemon, clock, _, _ = make_daemon(tmp_path, CONFIG)
+
+        daemon.tick()
+        clock.now += 60
+        daemon.tick()
+        mock_record.assert_not_called()
+
+        assert daemon.flush() == 3
+        mock_record.assert_called_once()
+        assert len(mock_record.call_args[0][0]) == 3
+        assert daemon.pending_rows == []
+
+    def test_flush_failure_keeps_rows(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that rows survive a failed flush"""
+        daemon, _, _, _ = make_daemon(tmp_path, CONFIG)
+        daemon.tick()
+        mock_record.side_effect = OSError("disk full")
+
+        assert daemon.flush() == 0
+        assert len(daemon.pending_rows) == 2
+
+    def test_market_closed(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that nothing is fetched on weekends once Friday's close is recorded"""
+        daemon, _, _, _ = make_daemon(tmp_path, CONFIG, when=SATURDAY)
+        friday_close = datetime(2026, 1, 9, 16, 30, tzinfo=NEW_YORK)
+        daemon.recent = {"AAPL": (friday_close, 95.0)}
+
+        daemon.tick()
+
+        assert mock_fetch.call_args[0][0] == ["VT"]
+        assert daemon.next_due["AAPL"] == daemon.clock() + daemon.settings.closed_interval
+
+    def test_unchanged_close_not_recorded(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that a repeated closing price is not buffered again"""
+        daemon, _, _, _ = make_daemon(tmp_path, CONFIG, when=SATURDAY)
+        daemon.recent = {"VT": (datetime(2026, 1, 9, 15, 0, tzinfo=NEW_YORK), 100.0)}
+
+        daemon.tick()
+
+        assert [symbol for _, symbol, _ in daemon.pending_rows] == ["AAPL"]
+
+    def test_hot_reload(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that config changes are picked up and invalid configs are ignored"""
+        daemon, _, holder, config_file = make_daemon(tmp_path, CONFIG)
+        assert not daemon.reload_config()
+
+        holder["config"] = {"stocks": [{"symbol": "NVDA", "target_price": 100.0}]}
+        config_file.write_text('{"changed": true}')
+        os.utime(config_file, ns=(0, 1))
+        assert daemon.reload_config()
+        assert list(daemon.next_due) == ["NVDA"]
+
+        holder["config"] = {"stocks": [], "daemon": {"bogus": 1}}
+        os.utime(config_file, ns=(0, 2))
+        assert not daemon.reload_config()
+        assert daemon.stocks[0]["symbol"] == "NVDA"
+
+    def test_reload_keeps_price_history(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that changing the history window on reload keeps the buffered prices"""
+        daemon, _, holder, config_file = make_daemon(tmp_path, CONFIG)
+        daemon.tick()
+
+        holder["config"] = {**CONFIG, "history": {"retention_days": 60, "capacity": 128}}
+        os.utime(config_file, ns=(0, 1))
+        assert daemon.reload_config()
+
+        assert daemon.prices.capacity == 128
+        assert daemon.prices.series("AAPL")[1].tolist() == [100.0]
+
+    def test_prices_kept_in_memory(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that checked prices are appended to the in-memory history"""
+        daemon, _, _, _ = make_daemon(tmp_path, CONFIG)
+
+        daemon.tick()
+
+        assert daemon.prices.series("AAPL")[1].tolist() == [100.0]
+        assert daemon.prices.series("VT")[1].tolist() == [100.0]
+
+    @patch("merkato.daemon.stock_monitor.load_rule_history")
+    def test_rule_history_from_memory(self, mock_history, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that lookbacks within the retention window read daily closes from memory"""
+        rule = {"type": "change", "days": 1, "operator": ">=", "percent": 5}
+        config = {**CONFIG, "stocks": [{"symbol": "AAPL", "rules": [rule]}]}
+        daemon, _, _, _ = make_daemon(tmp_path, config)
+        daemon.prices.append("AAPL", datetime(2026, 1, 6, 15), 90.0)
+
+        alerts = daemon.tick()
+
+        mock_history.assert_not_called()
+        assert [alert["symbol"] for alert in alerts] == ["AAPL"]
+
+    def test_run_survives_failed_tick(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that an exception in one tick is logged and the loop keeps scheduling"""
+        daemon, clock, _, _ = make_daemon(tmp_path, CONFIG)
+        mock_fetch.side_effect = [RuntimeError("boom"), fake_fetch(["AAPL"], CONFIG)]
+        sleeps = []
+
+        def wait(timeout):
+            sleeps.append(timeout)
+            clock.now += timeout
+            if mock_fetch.call_count == 2:
+                daemon.stop()
+
+        daemon.stop_event.wait = wait
+
+        daemon.run()
+
+        assert mock_fetch.call_count == 2
+        assert all(timeout > 0 for timeout in sleeps)
+        mock_record.assert_called_once()
+        assert [row[1] for row in mock_record.call_args[0][0]] == ["AAPL"]
+
+    def test_run_flushes_on_stop(self, mock_fetch, mock_record, mock_alerts, mock_last, tmp_path):
+        """Test that stopping the daemon flushes buffered rows"""
+        daemon, _, _, _ = make_daemon(tmp_path, CONFIG)
+        daemon.stop_event.wait = lambda timeout: daemon.stop()
+
+        daemon.run()
+
+        mock_record.assert_called_once()
+
+
+class TestDaemonSettings:
+    def test_unknown_key(self):
+        """Test that typos in the daemon section are rejected"""
+        with pytest.raises(ValueError, match="Unknown daemon settings: intervl"):
+            DaemonSettings.from_config({"daemon": {"intervl": 5}})
@@ -0,0 +1,117 @@
+from unittest.mock import patch
+
+import pytest
+
+from merkato.smtp_sink import SmtpSink
+from merkato.stock_monitor import send_price_alerts
+from merkato.util import EmailDispatcher, flush_emails, get_dispatcher, send_email
+
+
+@pytest.fixture
+def sink():
+    with SmtpSink() as sink:
+        yield sink
+
+
+class TestEmailDispatcher:
+    def test_reuses_one_session(self, sink):
+        """Test that many messages share one connection and login"""
+        with EmailDispatcher(sink.email_config) as dispatcher:
+            for i in range(20):
+                dispatcher.send(f"Alert {i}", f"<p>{i}</p>")
+
+        assert len(sink.messages) == 20
+        assert sink.connections == 1
+        assert sink.logins == 1
+        assert sink.messages[0]["Subject"] == "Alert 0"
+        assert sink.messages[0]["To"] == "team@localhost"
+
+    def test_reconnects_after_disconnect(self, sink):
+        """Test that a dropped session is re-established transparently"""
+        with EmailDispatcher(sink.email_config) as dispatcher:
+            dispatcher.send("First", "<p>1</p>")
+            sink.drop_connections()
+            dispatcher.send("Second", "<p>2</p>")
+
+        assert [message["Subject"] for message in sink.messages] == ["First", "Second"]
+        assert sink.connections == 2
+
+    def test_idle_session_is_probed(self, sink):
+        """Test that an idle session is checked with NOOP before reuse"""
+        with EmailDispatcher(sink.email_config, idle_timeout=0) as dispatcher:
+            dispatcher.send("First", "<p>1</p>")
+            dispatcher.send("Second", "<p>2</p>")
+
+        assert sink.connections == 1
+
+    def test_queue_batches_by_recipient_and_subject(self, sink):
+        """Test that queued alerts are merged and sent on flush"""
+        with EmailDispatcher(sink.email_config) as dispatcher:
+            dispatcher.queue("Alert", "<p>AAPL</p>")
+            dispatcher.queue("Alert", "<p>NVDA</p>")
+            dispatcher.queue("Alert", "<p>VT</p>", recipient="other@localhost")
+            assert sink.messages == []
+
+            assert dispatcher.flush() == 2
+
+        bodies = [message.get_payload()[0].get_payload() for message in sink.messages]
+        assert "AAPL" in bodies[0] and "NVDA" in bodies[0]
+        assert sink.messages[1]["To"] == "other@localhost"
+
+    def test_close_flushes_queue(self, sink):
+        """Test that closing the dispatcher sends queued messages"""
+        dispatcher = EmailDispatcher(sink.email_config)
+        dispatcher.queue("Alert", "<p>AAPL</p>")
+
+        dispatcher.close()
+
+        assert len(sink.messages) == 1
+
+
+class TestSendEmail:
+    def test_shared_dispatcher(self, sink):
+        """Test that send_email reuses the process-wide session"""
+        config = {"email": sink.email_config}
+        with patch.dict("merkato.util._dispatchers", clear=True):
+            send_email("One", "<p>1</p>", config)
+            send_email("Two", "<p>2</p>", config)
+            get_dispatcher(config).close()
+
+        assert len(sink.messages) == 2
+        assert sink.connections == 1
+
+    def test_price_alerts_sent_in_one_flush(self, sink):
+        """Test that the alerts of every portfolio are queued and delivered over one session"""
+        config = {
+            "email": sink.email_config,
+            "portfolios": [{"name": "tech", "recipients": ["tech@localhost"], "stocks": [{"symbol": "AAPL"}]}],
+        }
+        alerts = [
+            {"symbol": "VT", "current_price": 95.0, "target_price": 100.0, "portfolio": None},
+            {"symbol": "AAPL", "current_price": 95.0, "target_price": 100.0, "portfolio": "tech"},
+        ]
+        with patch.dict("merkato.util._dispatchers", clear=True):
+            send_price_alerts(alerts, config)
+
+            assert get_dispatcher(config).pending == {}
+            assert flush_emails() == 0
+
+        assert sorted(message["To"] for message in sink.messages) == ["team@localhost", "tech@localhost"]
+        assert sink.connections == 1
+
+    def test_failure_is_reported(self, capsys):
+        """Test that a send failure is printed, not raised"""
+        config = {
+            "email": {
+                "sender": "a@localhost",
+                "password": "x",
+                "recipient": "b@localhost",
+                "smtp_server": "127.0.0.1",
+                "smtp_port": 1,
+                "starttls": False,
+            }
+        }
+        with patch.dict("merkato.util._dispatchers", clear=True):
+            send_email("Subject", "<p>body</p>", config)
+
+        assert "Failed to send email" in capsys.readouterr().out
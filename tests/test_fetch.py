@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+from merkato.fetch import FetchSettings, fetch_prices
+
+
+def fast_settings(**overrides):
+    values = {"backoff_base": 0.0, "request_timeout": 5.0, "run_timeout": 10.0}
+    values.update(overrides)
+    return FetchSettings(**values)
+
+
+class TestFetchSettings:
+    def test_from_config_defaults(self):
+        """Test that missing fetch section falls back to defaults"""
+        settings = FetchSettings.from_config({"stocks": []})
+
+        assert settings == FetchSettings()
+
+    def test_from_config_overrides(self):
+        """Test reading pool size and retry policy from config"""
+        settings = FetchSettings.from_config({"fetch": {"max_workers": 2, "max_attempts": 5}})
+
+        assert settings.max_workers == 2
+        assert settings.max_attempts == 5
+
+    def test_from_config_unknown_key(self):
+        """Test that typos in the fetch section are rejected"""
+        with pytest.raises(ValueError, match="Unknown fetch settings: workers"):
+            FetchSettings.from_config({"fetch": {"workers": 2}})
+
+    def test_backoff_is_bounded(self):
+        """Test that jittered backoff never exceeds the cap"""
+        settings = FetchSettings(backoff_base=1.0, backoff_max=3.0)
+
+        assert all(0 <= settings.backoff(attempt) <= 3.0 for attempt in range(1, 10))
+
+
+class TestFetchPrices:
+    def test_success(self):
+        """Test that all symbols are fetched in batches"""
+        calls = []
+
+        def fetch_batch(chunk, timeout):
+            calls.append(list(chunk))
+            return {symbol: 100.0 for symbol in chunk}, {}
+
+        results = fetch_prices(["A", "B", "C"], fetch_batch, fast_settings(batch_size=2))
+
+        assert sorted(calls) == [["A", "B"], ["C"]]
+        assert all(result.ok and result.attempts == 1 for result in results.values())
+        assert results["C"].price == 100.0
+        assert results["C"].error is None
+
+    def test_retries_transient_errors(self):
+        """Test that a flapping symbol is retried until it succeeds"""
+        attempts = {"count": 0}
+
+        def fetch_batch(chunk, timeout):
+            attempts["count"] += 1
+            if attempts["count"] < 3:
+                raise ConnectionError("connection reset")
+            return {"A": 42.0}, {}
+
+        results = fetch_prices(["A"], fetch_batch, fast_settings(max_attempts=3))
+
+        assert results["A"].price == 42.0
+        assert results["A"].attempts == 3
+        assert results["A"].error is None
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that per-symbol failures are reported without aborting the batch"""
+
+        def fetch_batch(chunk, timeout):
+            return {symbol: 1.0 for symbol in chunk if symbol != "BAD"}, {"BAD": "no data returned"}
+
+        results = fetch_prices(["GOOD", "BAD"], fetch_batch, fast_settings(max_attempts=2))
+
+        assert results["GOOD"].ok
+        assert results["GOOD"].attempts == 1
+        assert not results["BAD"].ok
+        assert results["BAD"].attempts == 2
+        assert results["BAD"].error == "no data returned"
+
+    def test_request_timeout(self):
+        """Test that a hanging request is abandoned after the per-request timeout"""
+        release = threading.Event()
+
+        def fetch_batch(chunk, timeout):
+            if "SLOW" in chunk:
+                release.wait(5)
+                return {}, {}
+            return {symbol: 1.0 for symbol in chunk}, {}
+
+        try:
+            results = fetch_prices(
+                ["FAST", "SLOW"], fetch_batch, fast_settings(batch_size=1, request_timeout=0.1, max_attempts=1)
+            )
+        finally:
+            release.set()
+
+        assert results["FAST"].ok
+        assert not results["SLOW"].ok
+        assert "timed out" in results["SLOW"].error
+        assert results["SLOW"].latency >= 0.1
+
+    def test_run_deadline(self):
+        """Test that the whole-run deadline bounds the total fetch time"""
+        release = threading.Event()
+
+        def fetch_batch(chunk, timeout):
+            release.wait(5)
+            return {}, {}
+
+        try:
+            results = fetch_prices(["A"], fetch_batch, fast_settings(run_timeout=0.1))
+        finally:
+            release.set()
+
+        assert results["A"].error == "run deadline exceeded"
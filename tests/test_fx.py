@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+import pytest
+
+from merkato.fx import Converter, FxSettings, format_money, load_converter, symbol_currencies
+
+
+def fx_config(tmp_path, **fx):
+    return {"fx": {"currency": "USD", **fx}, "cache": {"path": str(tmp_path / "quotes.sqlite")}}
+
+
+class TestFxSettings:
+    def test_from_config_defaults(self):
+        """Test that prices stay in their quote currency by default"""
+        assert FxSettings.from_config({}) == FxSettings()
+        assert FxSettings().currency is None
+
+    def test_from_config_unknown_key(self):
+        """Test that typos in the fx section are rejected"""
+        with pytest.raises(ValueError, match="Unknown fx settings: base"):
+            FxSettings.from_config({"fx": {"base": "USD"}})
+
+    def test_invalid_currency(self):
+        """Test that the reporting currency must be an ISO code"""
+        with pytest.raises(ValueError, match="Invalid fx currency 'dollar'"):
+            FxSettings.from_config({"fx": {"currency": "dollar"}})
+
+
+class TestConverter:
+    def test_convert(self):
+        """Test converting aligned prices and currencies in one pass"""
+        converter = Converter("USD", {"CHF": 1.25, "GBp": 0.0127})
+
+        prices, labels = converter.convert([100.0, 10.0, 500.0, 7.0], ["USD", "CHF", "GBp", "JPY"])
+
+        assert prices.tolist() == pytest.approx([100.0, 12.5, 6.35, 7.0])
+        assert labels == ["USD", "USD", "USD", "JPY"]
+
+    def test_no_reporting_currency(self):
+        """Test that a converter without a currency leaves prices unchanged"""
+        prices, labels = Converter().convert([10.0], ["CHF"])
+
+        assert prices.tolist() == [10.0]
+        assert labels == ["CHF"]
+
+    def test_format_money(self):
+        """Test signs for common currencies and codes for the others"""
+        assert format_money(12.5) == "$12.50"
+        assert format_money(12.5, "EUR") == "€12.50"
+        assert format_money(12.5, "CHF") == "CHF 12.50"
+
+    def test_symbol_currencies(self):
+        """Test quote currencies from the exchange suffix or an explicit key"""
+        stocks = [{"symbol": "CHSPI.SW"}, {"symbol": "VT"}, {"symbol": "VOD.L"}, {"symbol": "X", "currency": "EUR"}]
+
+        assert symbol_currencies(stocks) == {"CHSPI.SW": "CHF", "VT": "USD", "VOD.L": "GBp", "X": "EUR"}
+
+
+class TestLoadConverter:
+    @patch("merkato.stock_monitor.get_stock_prices")
+    def test_one_batched_fetch(self, mock_prices, tmp_path):
+        """Test that all rates are fetched in one request, with pence converted through pounds"""
+        mock_prices.return_value = ({"CHFUSD=X": 1.25, "GBPUSD=X": 1.27}, {})
+
+        converter = load_converter(["CHF", "GBp", "USD", "CHF"], fx_config(tmp_path))
+
+        mock_prices.assert_called_once()
+        assert sorted(mock_prices.call_args[0][0]) == ["CHFUSD=X", "GBPUSD=X"]
+        assert converter.rates == pytest.approx({"CHF": 1.25, "GBp": 0.0127, "USD": 1.0})
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    def test_rates_cached_for_ttl(self, mock_prices, tmp_path):
+        """Test that rates come from the quote cache until the fx TTL expires"""
+        mock_prices.return_value = ({"CHFUSD=X": 1.25}, {})
+        config = fx_config(tmp_path)
+
+        load_converter(["CHF"], config)
+        assert load_converter(["CHF"], config).rates["CHF"] == 1.25
+        assert mock_prices.call_count == 1
+
+        load_converter(["CHF"], fx_config(tmp_path, ttl=0))
+        assert mock_prices.call_count == 2
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    def test_missing_rate_stays_native(self, mock_prices, tmp_path):
+        """Test that a currency without a rate is reported unconverted"""
+        mock_prices.return_value = ({}, {"CHFUSD=X": "no data returned"})
+
+        converter = load_converter(["CHF"], fx_config(tmp_path, ttl=0))
+
+        assert converter.labels(["CHF"]) == ["CHF"]
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    def test_no_fetch_without_foreign_currency(self, mock_prices, tmp_path):
+        """Test that nothing is fetched when every price is already in the reporting currency"""
+        assert load_converter(["USD"], fx_config(tmp_path)).rates == {"USD": 1.0}
+        assert load_converter(["CHF"], {}).currency is None
+        mock_prices.assert_not_called()
@@ -0,0 +1,170 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from merkato.history import HistorySettings, PriceHistory, RingBuffer, load_price_history, to_epoch_us
+from merkato.util import typed_prices
+
+
+def prices_frame(rows):
+    return typed_prices(pd.DataFrame(rows, columns=["timestamp", "symbol", "price"]))
+
+
+class TestRingBuffer:
+    def test_wraps_around(self):
+        """Test that the oldest points are overwritten once the buffer is full"""
+        buffer = RingBuffer(3)
+        for i in range(5):
+            buffer.append(i, float(i))
+
+        timestamps, prices = buffer.view()
+        assert timestamps.tolist() == [2, 3, 4]
+        assert prices.tolist() == [2.0, 3.0, 4.0]
+
+    def test_view_is_zero_copy(self):
+        """Test that views share memory with the buffer, also after wrapping"""
+        buffer = RingBuffer(4)
+        buffer.extend(np.arange(6), np.arange(6, dtype=float))
+
+        timestamps, prices = buffer.view()
+        assert np.shares_memory(timestamps, buffer.timestamps)
+        assert np.shares_memory(prices, buffer.prices)
+        assert timestamps.tolist() == [2, 3, 4, 5]
+
+    def test_extend_matches_append(self):
+        """Test that a bulk extend leaves the same window as single appends"""
+        appended, extended = RingBuffer(5), RingBuffer(5)
+        appended.append(0, 1.0)
+        extended.append(0, 1.0)
+        for i in range(1, 8):
+            appended.append(i, i * 1.5)
+        extended.extend(np.arange(1, 8), np.arange(1, 8) * 1.5)
+
+        assert [a.tolist() for a in appended.view()] == [e.tolist() for e in extended.view()]
+
+    def test_out_of_order(self):
+        """Test that points older than the latest one are rejected"""
+        buffer = RingBuffer(3)
+        buffer.append(10, 1.0)
+        with pytest.raises(ValueError, match="time order"):
+            buffer.append(5, 1.0)
+
+    def test_trim(self):
+        """Test that trimming drops the points before a timestamp"""
+        buffer = RingBuffer(4)
+        buffer.extend([1, 2, 3, 4], [1.0, 2.0, 3.0, 4.0])
+
+        assert buffer.trim(3) == 2
+        assert buffer.view()[0].tolist() == [3, 4]
+
+
+class TestPriceHistory:
+    def test_retention(self):
+        """Test that points older than the retention window are dropped"""
+        history = PriceHistory(capacity=16, retention=3600)
+        history.append("AAPL", datetime(2026, 1, 7, 10), 100.0)
+        history.append("AAPL", datetime(2026, 1, 7, 11), 101.0)
+        history.append("AAPL", datetime(2026, 1, 7, 12), 102.0)
+
+        assert history.series("AAPL")[1].tolist() == [101.0, 102.0]
+
+    def test_append_clamps_repeated_hour(self):
+        """Test that a live point older than the last one (DST fall-back) is clamped instead of raising"""
+        history = PriceHistory()
+        history.append("AAPL", datetime(2026, 11, 1, 1, 45), 100.0)
+        history.append("AAPL", datetime(2026, 11, 1, 1, 5), 101.0)
+
+        timestamps, prices = history.series("AAPL")
+        assert timestamps.tolist() == [to_epoch_us(datetime(2026, 11, 1, 1, 45))] * 2
+        assert prices.tolist() == [100.0, 101.0]
+
+    def test_load_frame(self):
+        """Test bulk-loading a typed price frame per symbol"""
+        df = prices_frame(
+            [
+                ("2026-01-07T10:00:00", "AAPL", 100.0),
+                ("2026-01-07T10:00:00", "VT", 50.0),
+                ("2026-01-07T11:00:00", "AAPL", 101.0),
+            ]
+        )
+        history = PriceHistory(capacity=8, dtype="float32").load_frame(df)
+
+        timestamps, prices = history.series("AAPL")
+        assert timestamps.tolist() == [to_epoch_us("2026-01-07T10:00:00"), to_epoch_us("2026-01-07T11:00:00")]
+        assert prices.dtype == np.float32
+        assert len(history) == 3
+
+    def test_series_since(self):
+        """Test that a series can start at a timestamp"""
+        history = PriceHistory()
+        history.extend([("2026-01-07T10:00:00", "AAPL", 100.0), ("2026-01-08T10:00:00", "AAPL", 110.0)])
+
+        assert history.series("AAPL", datetime(2026, 1, 8))[1].tolist() == [110.0]
+        assert len(history.series("MSFT")[0]) == 0
+
+    def test_daily_closes(self):
+        """Test that the last price of each day before today is used as its close"""
+        history = PriceHistory()
+        history.extend(
+            [
+                ("2026-01-05T10:00:00", "AAPL", 100.0),
+                ("2026-01-05T15:00:00", "AAPL", 101.0),
+                ("2026-01-06T15:00:00", "AAPL", 102.0),
+                ("2026-01-07T10:00:00", "AAPL", 103.0),
+            ]
+        )
+
+        days, closes = history.daily_closes(["AAPL", "VT"], date(2026, 1, 7), 5)["AAPL"]
+        assert days.astype(str).tolist() == ["2026-01-05", "2026-01-06"]
+        assert closes.tolist() == [101.0, 102.0]
+
+    def test_daily_closes_window_ends_today(self):
+        """Test that the lookback counts back from today, not from the last recorded day"""
+        history = PriceHistory()
+        history.extend([("2026-01-02T15:00:00", "AAPL", 100.0), ("2026-01-05T15:00:00", "AAPL", 101.0)])
+
+        days, closes = history.daily_closes(["AAPL"], date(2026, 1, 14), 10)["AAPL"]
+
+        assert days.astype(str).tolist() == ["2026-01-05"]
+        assert closes.tolist() == [101.0]
+        assert "AAPL" not in history.daily_closes(["AAPL"], date(2026, 1, 20), 10)
+
+    def test_resize_keeps_points(self):
+        """Test that a smaller or larger window keeps the points that still fit"""
+        history = PriceHistory(capacity=8)
+        history.extend([(f"2026-01-0{day}T15:00:00", "AAPL", float(day)) for day in range(1, 7)])
+
+        history.resize(4, dtype="float32")
+        assert history.series("AAPL")[1].tolist() == [3.0, 4.0, 5.0, 6.0]
+        assert history.series("AAPL")[1].dtype == np.float32
+
+        history.resize(16, retention=86400 * 2, dtype="float32")
+        history.append("AAPL", "2026-01-07T15:00:00", 7.0)
+        assert history.series("AAPL")[1].tolist() == [5.0, 6.0, 7.0]
+
+    def test_load_price_history(self, tmp_path, monkeypatch):
+        """Test loading the retention window from storage"""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "data").mkdir()
+        pd.DataFrame(
+            [("2026-01-01T10:00:00", "AAPL", 90.0), ("2026-01-07T10:00:00", "AAPL", 100.0)],
+            columns=["timestamp", "symbol", "price"],
+        ).to_csv(tmp_path / "data" / "2026.csv", index=False)
+
+        history = load_price_history({"history": {"retention_days": 3}}, ["AAPL"], datetime(2026, 1, 8))
+
+        assert history.series("AAPL")[1].tolist() == [100.0]
+
+
+class TestHistorySettings:
+    def test_unknown_key(self):
+        """Test that typos in the history section are rejected"""
+        with pytest.raises(ValueError, match="Unknown history settings: retention"):
+            HistorySettings.from_config({"history": {"retention": 5}})
+
+    def test_dtype(self):
+        """Test that only float price dtypes are accepted"""
+        with pytest.raises(ValueError, match="Invalid history dtype"):
+            HistorySettings.from_config({"history": {"dtype": "int32"}})
@@ -0,0 +1,81 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from merkato.markets import easter, get_exchange, needs_fetch, nyse_holidays, six_holidays
+
+NEW_YORK = ZoneInfo("America/New_York")
+ZURICH = ZoneInfo("Europe/Zurich")
+
+
+class TestCalendars:
+    def test_easter(self):
+        """Test Easter dates against known values"""
+        assert easter(2025) == date(2025, 4, 20)
+        assert easter(2026) == date(2026, 4, 5)
+
+    def test_nyse_holidays(self):
+        """Test weekend observance of NYSE holidays"""
+        holidays = nyse_holidays(2026)
+
+        assert date(2026, 7, 3) in holidays  # Independence Day falls on a Saturday
+        assert date(2026, 11, 26) in holidays  # Thanksgiving
+        assert date(2021, 12, 31) not in nyse_holidays(2022)
+
+    def test_six_holidays(self):
+        """Test Swiss exchange holidays"""
+        holidays = six_holidays(2026)
+
+        assert date(2026, 1, 2) in holidays
+        assert date(2026, 5, 14) in holidays  # Ascension Day
+        assert date(2026, 8, 1) in holidays
+
+
+class TestExchange:
+    def test_suffix_mapping(self):
+        """Test that the ticker suffix selects the exchange"""
+        assert get_exchange({"symbol": "CHSPI.SW"}).code == "XSWX"
+        assert get_exchange({"symbol": "NVDA"}).code == "XNYS"
+        assert get_exchange({"symbol": "BRK.B"}).code == "XNYS"
+        assert get_exchange({"symbol": "CHSPI.SW", "exchange": "XNYS"}).code == "XNYS"
+
+    def test_unknown_exchange(self):
+        """Test that an unknown exchange code is rejected"""
+        with pytest.raises(ValueError, match="Unknown exchange"):
+            get_exchange({"symbol": "X", "exchange": "MOON"})
+
+    def test_is_open(self):
+        """Test trading hours, weekends and holidays"""
+        nyse = get_exchange({"symbol": "VT"})
+
+        assert nyse.is_open(datetime(2026, 1, 7, 10, 0, tzinfo=NEW_YORK))
+        assert not nyse.is_open(datetime(2026, 1, 7, 16, 0, tzinfo=NEW_YORK))
+        assert not nyse.is_open(datetime(2026, 1, 10, 12, 0, tzinfo=NEW_YORK))
+        assert not nyse.is_open(datetime(2026, 1, 19, 12, 0, tzinfo=NEW_YORK))
+        # 15:00 in Zurich is 09:00 in New York
+        assert not nyse.is_open(datetime(2026, 1, 7, 15, 0, tzinfo=ZURICH))
+
+    def test_config_holidays(self):
+        """Test extra holidays from config.json"""
+        config = {"markets": {"XSWX": {"holidays": ["2026-01-07"]}}}
+        six = get_exchange({"symbol": "CTEC.SW"}, config)
+
+        assert not six.is_open(datetime(2026, 1, 7, 10, 0, tzinfo=ZURICH))
+
+    def test_last_close(self):
+        """Test that the last close skips weekends and holidays"""
+        nyse = get_exchange({"symbol": "VT"})
+
+        tuesday = nyse.last_close(datetime(2026, 1, 20, 9, 0, tzinfo=NEW_YORK))
+
+        assert tuesday == datetime(2026, 1, 16, 16, 0, tzinfo=NEW_YORK)
+
+    def test_needs_fetch(self):
+        """Test fetching once more after the close, then pausing"""
+        nyse = get_exchange({"symbol": "VT"})
+        evening = datetime(2026, 1, 7, 20, 0, tzinfo=NEW_YORK)
+
+        assert needs_fetch(nyse, evening, datetime(2026, 1, 7, 15, 0, tzinfo=NEW_YORK))
+        assert not needs_fetch(nyse, evening, datetime(2026, 1, 7, 16, 30, tzinfo=NEW_YORK))
+        assert needs_fetch(nyse, evening, None)
@@ -0,0 +1,111 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from merkato.fetch import FetchResult
+from merkato.metrics import Metrics, MetricsSettings, metrics, to_prometheus, write_report
+from merkato.stock_monitor import fetch_stock_prices, record_prices
+
+
+@pytest.fixture
+def registry():
+    """Process-wide registry, reset so tests do not see each other's metrics"""
+    metrics.start_run()
+    return metrics
+
+
+class TestMetrics:
+    def test_span_and_counters(self):
+        """Test that spans aggregate count/total/max and counters add up"""
+        metrics = Metrics()
+        with metrics.span("fetch"):
+            pass
+        metrics.observe("fetch", 2.0)
+        metrics.incr("rows.written", 3)
+        metrics.incr("rows.written")
+
+        report = metrics.report()
+
+        assert report["spans"]["fetch"]["count"] == 2
+        assert report["spans"]["fetch"]["max"] == 2.0
+        assert report["counters"] == {"rows.written": 4}
+
+    def test_span_records_failures(self):
+        """Test that a block that raises is still timed"""
+        metrics = Metrics()
+        with pytest.raises(OSError), metrics.span("storage.write"):
+            raise OSError("disk full")
+
+        assert metrics.report()["spans"]["storage.write"]["count"] == 1
+
+    def test_prometheus_format(self):
+        """Test the textfile exposition format"""
+        metrics = Metrics()
+        metrics.start_run("stock-monitor")
+        metrics.observe("fetch.symbol", 0.5)
+        metrics.incr("fetch.failures", 2)
+
+        text = to_prometheus(metrics.report())
+
+        assert 'merkato_span_seconds_max{run="stock-monitor",span="fetch.symbol"} 0.5' in text
+        assert "# TYPE merkato_fetch_failures_total counter" in text
+        assert 'merkato_fetch_failures_total{run="stock-monitor"} 2' in text
+
+    def test_prometheus_histograms(self):
+        """Test that latency histograms are exposed with cumulative buckets"""
+        metrics = Metrics()
+        metrics.start_run("stock-monitor")
+        metrics.histogram("provider.yahoo", 0.2)
+        metrics.histogram("provider.yahoo", 90.0)
+
+        text = to_prometheus(metrics.report())
+
+        assert "# TYPE merkato_latency_seconds histogram" in text
+        labels = 'run="stock-monitor",name="provider.yahoo"'
+        assert f'merkato_latency_seconds_bucket{{{labels},le="0.25"}} 1' in text
+        assert f'merkato_latency_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+        assert f"merkato_latency_seconds_count{{{labels}}} 2" in text
+
+    def test_write_report(self, tmp_path):
+        """Test writing the JSON report and Prometheus textfile from config"""
+        metrics = Metrics()
+        metrics.incr("emails.sent")
+        config = {"metrics": {"report": str(tmp_path / "run.json"), "prometheus": str(tmp_path / "merkato.prom")}}
+
+        write_report(config, metrics)
+
+        assert json.loads((tmp_path / "run.json").read_text())["counters"] == {"emails.sent": 1}
+        assert "merkato_emails_sent_total" in (tmp_path / "merkato.prom").read_text()
+
+    def test_unknown_setting(self):
+        """Test that typos in the metrics section are rejected"""
+        with pytest.raises(ValueError, match="Unknown metrics settings: prom"):
+            MetricsSettings.from_config({"metrics": {"prom": "x"}})
+
+
+class TestInstrumentation:
+    @patch("merkato.stock_monitor.fetch_prices")
+    def test_fetch_counters(self, mock_fetch, registry):
+        """Test that fetch latency, retries and failures are recorded"""
+        mock_fetch.return_value = {
+            "AAPL": FetchResult("AAPL", price=1.0, latency=0.2, attempts=2),
+            "VT": FetchResult("VT", latency=0.4, attempts=3, error="timeout"),
+        }
+
+        fetch_stock_prices(["AAPL", "VT"], {"cache": {"enabled": False}})
+
+        report = registry.report()
+        assert report["spans"]["fetch.symbol"]["max"] == 0.4
+        assert report["counters"]["fetch.retries"] == 3
+        assert report["counters"]["fetch.failures"] == 1
+
+    @patch("merkato.stock_monitor.update_rollups")
+    @patch("merkato.stock_monitor.get_store")
+    def test_storage_write(self, mock_get_store, mock_update_rollups, registry):
+        """Test that recorded rows are timed and counted"""
+        record_prices([("2026-01-07T10:00:00", "AAPL", 1.0)], {})
+
+        report = registry.report()
+        assert report["counters"]["rows.written"] == 1
+        assert {"storage.write", "rollups.update"} <= set(report["spans"])
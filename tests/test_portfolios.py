@@ -0,0 +1,50 @@
+import pytest
+
+from merkato.portfolios import all_stocks, get_portfolios, get_recipients, unique_symbols
+
+CONFIG = {
+    "stocks": [{"symbol": "VT", "target_price": 140.0}],
+    "portfolios": [
+        {"name": "tech", "recipients": ["tech@example.com"], "stocks": [{"symbol": "AAPL"}, {"symbol": "VT"}]},
+        {"name": "etf", "recipients": "etf@example.com", "stocks": [{"symbol": "VT"}]},
+    ],
+}
+
+
+class TestPortfolios:
+    def test_default_and_named(self):
+        """Test that the top-level stocks form the default portfolio"""
+        portfolios = get_portfolios(CONFIG)
+
+        assert [portfolio.name for portfolio in portfolios] == [None, "tech", "etf"]
+        assert portfolios[0].stocks == CONFIG["stocks"]
+        assert portfolios[1].stocks[0] == {"symbol": "AAPL", "portfolio": "tech"}
+        assert portfolios[2].recipients == ["etf@example.com"]
+
+    def test_union_of_symbols(self):
+        """Test that every symbol is listed once across portfolios"""
+        assert len(all_stocks(CONFIG)) == 4
+        assert unique_symbols(all_stocks(CONFIG)) == ["VT", "AAPL"]
+
+    def test_recipients(self):
+        """Test recipient lookup, with the default portfolio using EMAIL_RECIPIENT"""
+        assert get_recipients(CONFIG, "tech") == ["tech@example.com"]
+        assert get_recipients(CONFIG, None) == [None]
+
+    @pytest.mark.parametrize(
+        "portfolio, message",
+        [
+            ({"stocks": []}, "Portfolio #1 has no name"),
+            ({"name": "tech", "recipient": "x@example.com"}, "Unknown portfolio settings for 'tech': recipient"),
+            ({"name": "tech", "recipients": [""]}, "must be a list of email addresses"),
+        ],
+    )
+    def test_invalid(self, portfolio, message):
+        """Test that malformed portfolios are rejected"""
+        with pytest.raises(ValueError, match=message):
+            get_portfolios({"portfolios": [portfolio]})
+
+    def test_duplicate_name(self):
+        """Test that portfolio names must be unique"""
+        with pytest.raises(ValueError, match="Duplicate portfolio 'tech'"):
+            get_portfolios({"portfolios": [{"name": "tech"}, {"name": "tech"}]})
@@ -0,0 +1,255 @@
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from merkato.metrics import Histogram, metrics
+from merkato.providers import CircuitBreaker, FileProvider, ProviderChain, ProviderSettings, get_provider_chain
+from merkato.stock_monitor import get_stock_price
+
+
+class FakeProvider:
+    """Provider answering ``prices`` after ``delay`` seconds, or raising ``error``"""
+
+    def __init__(self, name, prices=None, delay=0.0, error=None):
+        self.name = name
+        self.prices = prices or {}
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.release = threading.Event()
+
+    def fetch(self, symbols, timeout):
+        self.calls.append(list(symbols))
+        if self.delay:
+            self.release.wait(self.delay)
+        if self.error:
+            raise self.error
+        prices = {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+        return prices, {symbol: "not found" for symbol in symbols if symbol not in prices}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def chain():
+    """Factory for provider chains that are shut down after the test"""
+    chains = []
+
+    def make(providers, concurrency=1, **settings):
+        chains.append(ProviderChain(providers, ProviderSettings(**settings), concurrency=concurrency))
+        return chains[-1]
+
+    yield make
+    for made in chains:
+        for provider in made.providers:
+            provider.release.set()
+        made.close()
+
+
+class TestProviderSettings:
+    def test_from_config_defaults(self):
+        """Test that Yahoo alone is the default provider"""
+        assert ProviderSettings.from_config({}) == ProviderSettings()
+        assert ProviderSettings().order == ["yahoo"]
+
+    def test_from_config_unknown_key(self):
+        """Test that typos in the providers section are rejected"""
+        with pytest.raises(ValueError, match="Unknown providers settings: hedge"):
+            ProviderSettings.from_config({"providers": {"hedge": 1}})
+
+    def test_from_config_unknown_provider(self):
+        """Test that only known providers can be ranked"""
+        with pytest.raises(ValueError, match="providers order"):
+            ProviderSettings.from_config({"providers": {"order": ["bloomberg"]}})
+
+    def test_file_provider_needs_path(self):
+        """Test that the file provider requires a file"""
+        with pytest.raises(ValueError, match="'file' path"):
+            ProviderSettings.from_config({"providers": {"order": ["file"]}})
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        """Test that the breaker opens at the threshold and a success resets the count"""
+        breaker = CircuitBreaker(2, 60, Clock())
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        assert breaker.allow()
+
+        breaker.failure()
+
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+    def test_half_open_trial(self):
+        """Test that one trial request goes out after the reset timeout"""
+        clock = Clock()
+        breaker = CircuitBreaker(1, 60, clock)
+        breaker.failure()
+
+        clock.now = 60.0
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.success()
+        assert breaker.state == "closed"
+
+
+class TestProviderChain:
+    def test_primary_answers(self, chain):
+        """Test that a healthy primary is the only provider queried"""
+        primary = FakeProvider("primary", {"AAPL": 150.0})
+        secondary = FakeProvider("secondary", {"AAPL": 151.0})
+
+        prices, failures = chain([primary, secondary]).fetch(["AAPL"], 5)
+
+        assert prices == {"AAPL": 150.0}
+        assert failures == {}
+        assert secondary.calls == []
+
+    def test_failover_for_missing_symbols(self, chain):
+        """Test that symbols the primary misses are asked from the next provider"""
+        primary = FakeProvider("primary", {"AAPL": 150.0})
+        secondary = FakeProvider("secondary", {"MSFT": 300.0})
+        third = FakeProvider("third")
+
+        prices, failures = chain([primary, secondary, third]).fetch(["AAPL", "MSFT", "BAD"], 5)
+
+        assert prices == {"AAPL": 150.0, "MSFT": 300.0}
+        assert secondary.calls == [["MSFT", "BAD"]]
+        assert third.calls == [["BAD"]]
+        assert failures == {"BAD": "third: not found"}
+
+    def test_failover_on_error(self, chain):
+        """Test that a raising provider fails over to the next one"""
+        primary = FakeProvider("primary", error=ConnectionError("outage"))
+        secondary = FakeProvider("secondary", {"AAPL": 151.0})
+
+        prices, failures = chain([primary, secondary]).fetch(["AAPL"], 5)
+
+        assert prices == {"AAPL": 151.0}
+        assert failures == {}
+
+    def test_hedges_slow_primary(self, chain):
+        """Test that a primary slower than the hedge delay is raced by the next provider"""
+        metrics.start_run()
+        primary = FakeProvider("primary", {"AAPL": 150.0}, delay=5.0)
+        secondary = FakeProvider("secondary", {"AAPL": 151.0})
+
+        prices, _ = chain([primary, secondary], hedge_delay=0.05).fetch(["AAPL"], 5)
+
+        assert prices == {"AAPL": 151.0}
+        assert metrics.report()["counters"]["provider.hedges"] == 1
+        assert metrics.report()["histograms"]["provider.secondary"]["count"] == 1
+
+    def test_queued_requests_are_not_hedged(self, chain):
+        """Test that time spent waiting for a pool worker does not count towards the hedge delay"""
+        primary = FakeProvider("primary", {"AAPL": 150.0}, delay=0.05)
+        secondary = FakeProvider("secondary", {"AAPL": 151.0})
+        providers = chain([primary, secondary], hedge_delay=0.2)
+
+        threads = [threading.Thread(target=providers.fetch, args=(["AAPL"], 5)) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(primary.calls) == 32
+        assert secondary.calls == []
+
+    def test_hedge_delay_follows_latency_percentile(self, chain):
+        """Test that the hedge delay switches to the observed percentile once there are enough samples"""
+        primary = FakeProvider("primary")
+        providers = chain([primary], hedge_delay=2.0, hedge_min_samples=3, hedge_percentile=50)
+        assert providers.hedge_delay(primary) == 2.0
+
+        for latency in (0.04, 0.2, 7.0):
+            providers.latency["primary"].observe(latency)
+
+        assert providers.hedge_delay(primary) == 0.25
+
+    def test_skips_open_breaker(self, chain):
+        """Test that a provider failing repeatedly is skipped until its breaker resets"""
+        primary = FakeProvider("primary", error=ConnectionError("outage"))
+        secondary = FakeProvider("secondary", {"AAPL": 151.0})
+        providers = chain([primary, secondary], failure_threshold=2)
+
+        for _ in range(3):
+            prices, _ = providers.fetch(["AAPL"], 5)
+
+        assert prices == {"AAPL": 151.0}
+        assert len(primary.calls) == 2
+        assert providers.breakers["primary"].state == "open"
+
+    def test_all_breakers_open_still_tries_primary(self, chain):
+        """Test that the top-ranked provider is probed when every breaker is open"""
+        primary = FakeProvider("primary", error=ConnectionError("outage"))
+        providers = chain([primary], failure_threshold=1)
+        providers.fetch(["AAPL"], 5)
+
+        _, failures = providers.fetch(["AAPL"], 5)
+
+        assert len(primary.calls) == 2
+        assert failures == {"AAPL": "primary: outage"}
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    def test_yahoo_provider_uses_bulk_download(self, mock_prices):
+        """Test that the default chain goes through get_stock_prices"""
+        mock_prices.return_value = ({"AAPL": 150.0}, {})
+
+        prices, _ = get_provider_chain({}).fetch(["AAPL"], 5)
+
+        assert prices == {"AAPL": 150.0}
+        mock_prices.assert_called_once_with(["AAPL"], 5)
+
+
+class TestFileProvider:
+    def test_json_prices(self, tmp_path):
+        """Test reading a symbol -> price JSON file"""
+        path = tmp_path / "prices.json"
+        path.write_text(json.dumps({"AAPL": 150}))
+
+        prices, failures = FileProvider(path).fetch(["AAPL", "MSFT"], 5)
+
+        assert prices == {"AAPL": 150.0}
+        assert failures == {"MSFT": "not in price file"}
+
+    def test_csv_latest_price(self, tmp_path):
+        """Test that a recorded price CSV yields the latest price per symbol"""
+        path = tmp_path / "2025.csv"
+        path.write_text("timestamp,symbol,price\n2025-01-02T10:00:00,AAPL,150.0\n2025-01-02T11:00:00,AAPL,152.0\n")
+
+        prices, _ = FileProvider(path).fetch(["AAPL"], 5)
+
+        assert prices == {"AAPL": 152.0}
+
+    def test_get_stock_price_through_chain(self, tmp_path):
+        """Test that get_stock_price with a config uses the configured providers"""
+        path = tmp_path / "prices.json"
+        path.write_text(json.dumps({"AAPL": 150}))
+        config = {"providers": {"order": ["file"], "file": str(path)}}
+
+        assert get_provider_chain(config) is get_provider_chain(config)
+        assert get_stock_price("AAPL", config=config) == 150.0
+
+
+class TestHistogram:
+    def test_percentile(self):
+        """Test that percentiles resolve to bucket upper bounds"""
+        histogram = Histogram()
+        assert histogram.percentile(95) is None
+        for latency in (0.01, 0.2, 0.3, 0.4):
+            histogram.observe(latency)
+
+        assert histogram.percentile(25) == 0.05
+        assert histogram.percentile(95) == 0.5
+        assert histogram.to_dict()["buckets"]["+Inf"] == 4
@@ -0,0 +1,126 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from merkato.quote_cache import CacheSettings, QuoteCache, open_quote_cache
+from merkato.stock_monitor import fetch_stock_prices, get_stock_price, main
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_cache(tmp_path, clock, **settings):
+    return QuoteCache(CacheSettings(path=str(tmp_path / "quotes.sqlite"), **settings), clock=clock)
+
+
+class TestQuoteCache:
+    def test_hit_and_expiry(self, tmp_path, clock):
+        """Test that quotes are served until their TTL expires"""
+        with make_cache(tmp_path, clock, ttl=60) as cache:
+            cache.put("AAPL", 150.0)
+            clock.now += 30
+            assert cache.get("AAPL") == 150.0
+            clock.now += 31
+            assert cache.get("AAPL") is None
+            assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_symbol_ttl(self, tmp_path, clock):
+        """Test per-symbol TTL overrides"""
+        with make_cache(tmp_path, clock, ttl=60, symbol_ttl={"VT": 600}) as cache:
+            cache.put_many({"AAPL": 150.0, "VT": 100.0})
+            clock.now += 120
+
+            assert cache.get_many(["AAPL", "VT"]) == {"VT": 100.0}
+
+    def test_keyed_by_interval(self, tmp_path, clock):
+        """Test that the same symbol is cached separately per interval"""
+        with make_cache(tmp_path, clock) as cache:
+            cache.put("AAPL", 150.0, interval="1d")
+
+            assert cache.get("AAPL", interval="5d") is None
+
+    def test_lru_bound(self, tmp_path, clock):
+        """Test that the least recently used quotes are evicted first"""
+        with make_cache(tmp_path, clock, max_entries=2) as cache:
+            cache.put("AAPL", 1.0)
+            clock.now += 1
+            cache.put("VT", 2.0)
+            clock.now += 1
+            cache.get("AAPL")
+            clock.now += 1
+            cache.put("NVDA", 3.0)
+
+            assert len(cache) == 2
+            assert cache.get_many(["AAPL", "VT", "NVDA"]) == {"AAPL": 1.0, "NVDA": 3.0}
+
+    def test_persists_across_processes(self, tmp_path, clock):
+        """Test that a new cache instance reads quotes stored by a previous run"""
+        with make_cache(tmp_path, clock) as cache:
+            cache.put("AAPL", 150.0)
+
+        with make_cache(tmp_path, clock) as cache:
+            assert cache.get("AAPL") == 150.0
+
+    def test_report(self, tmp_path, clock, capsys):
+        """Test that hit and miss counters are reported"""
+        with make_cache(tmp_path, clock) as cache:
+            cache.get("AAPL")
+            cache.report()
+
+        assert "Quote cache: 0 hits, 1 misses" in capsys.readouterr().out
+
+    def test_disabled(self):
+        """Test that a disabled cache is not opened"""
+        assert open_quote_cache({"cache": {"enabled": False}}) is None
+
+    def test_unknown_setting(self):
+        """Test that typos in the cache section are rejected"""
+        with pytest.raises(ValueError, match="Unknown cache settings: tll"):
+            CacheSettings.from_config({"cache": {"tll": 5}})
+
+
+class TestCachedFetch:
+    @patch("merkato.stock_monitor.yf.Ticker")
+    def test_get_stock_price_uses_cache(self, mock_ticker, tmp_path, clock):
+        """Test that get_stock_price only calls yfinance on a cache miss"""
+        mock_ticker.return_value.history.return_value = pd.DataFrame({"Close": [150.0]})
+
+        with make_cache(tmp_path, clock) as cache:
+            assert get_stock_price("AAPL", cache) == 150.0
+            assert get_stock_price("AAPL", cache) == 150.0
+
+        mock_ticker.assert_called_once_with("AAPL")
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    def test_fetch_stock_prices_fetches_misses_only(self, mock_get_prices, tmp_path):
+        """Test that only uncached symbols go to the fetch engine"""
+        mock_get_prices.side_effect = lambda chunk, timeout: ({symbol: 10.0 for symbol in chunk}, {})
+        config = {"cache": {"path": str(tmp_path / "quotes.sqlite")}}
+
+        fetch_stock_prices(["AAPL"], config)
+        results = fetch_stock_prices(["AAPL", "VT"], config)
+
+        assert {symbol: result.price for symbol, result in results.items()} == {"AAPL": 10.0, "VT": 10.0}
+        assert [call.args[0] for call in mock_get_prices.call_args_list] == [["AAPL"], ["VT"]]
+
+    @patch("merkato.stock_monitor.send_price_alerts")
+    @patch("merkato.stock_monitor.check_and_record_prices", return_value=[])
+    @patch("merkato.stock_monitor.load_config")
+    def test_no_cache_flag(self, mock_load_config, mock_check, mock_alerts):
+        """Test that --no-cache disables the cache for the run"""
+        mock_load_config.return_value = {"stocks": []}
+
+        main(["--no-cache"])
+
+        assert mock_check.call_args[0][0]["cache"] == {"enabled": False}
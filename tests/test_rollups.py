@@ -0,0 +1,166 @@
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from merkato.rollups import RollupCache, _parse_rows, load_last_records, tail_records
+from merkato.util import append_rows
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with RollupCache(tmp_path / "rollups.sqlite") as cache:
+        yield cache
+
+
+class TestRollupCache:
+    def test_record_builds_daily_bars(self, cache):
+        """Test OHLC bars and running statistics from recorded prices"""
+        cache.record(
+            [
+                ("2026-01-05T15:00:00", "VT", 100.0),
+                ("2026-01-05T16:00:00", "VT", 104.0),
+                ("2026-01-05T17:00:00", "VT", 98.0),
+                ("2026-01-05T21:00:00", "VT", 101.0),
+            ]
+        )
+        cache.record([("2026-01-06T15:00:00", "VT", 103.0)])
+
+        daily = cache.daily(["VT"])
+        assert daily[["open", "high", "low", "close", "count"]].values.tolist() == [
+            [100.0, 104.0, 98.0, 101.0, 4],
+            [103.0, 103.0, 103.0, 103.0, 1],
+        ]
+        summary = cache.summary()
+        assert summary.loc["VT", "count"] == 5
+        assert summary.loc["VT", "low"] == 98.0
+        assert summary.loc["VT", "last_price"] == 103.0
+
+    def test_record_out_of_order(self, cache):
+        """Test that late rows do not overwrite a day's open or close"""
+        cache.record([("2026-01-05T15:00:00", "VT", 100.0), ("2026-01-05T21:00:00", "VT", 101.0)])
+        cache.record([("2026-01-05T12:00:00", "VT", 99.0)])
+        cache.record([("2026-01-05T18:00:00", "VT", 105.0)])
+
+        bar = cache.daily(["VT"]).iloc[0]
+        assert (bar["open"], bar["close"], bar["high"]) == (99.0, 101.0, 105.0)
+
+    def test_sync_ingests_only_appended_rows(self, cache, tmp_path):
+        """Test incremental sync after new rows are appended"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([("2026-01-05T15:00:00", "VT", 100.0), ("2026-01-05T16:00:00", "VT", 102.0)], data_file)
+
+        assert cache.sync(tmp_path) == 2
+        assert cache.sync(tmp_path) == 0
+
+        append_rows([("2026-01-06T15:00:00", "VT", 103.0)], data_file)
+        assert cache.sync(tmp_path) == 1
+        assert cache.summary().loc["VT", "count"] == 3
+
+    def test_sync_rebuilds_edited_file(self, cache, tmp_path):
+        """Test that editing already ingested rows invalidates the year"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([("2026-01-05T15:00:00", "VT", 100.0), ("2026-01-05T16:00:00", "VT", 102.0)], data_file)
+        append_rows([("2025-12-31T15:00:00", "VT", 90.0)], tmp_path / "2025.csv")
+        cache.sync(tmp_path)
+
+        data_file.write_text(data_file.read_text().replace("102.0", "120.0"))
+
+        assert cache.sync(tmp_path) == 2
+        summary = cache.summary()
+        assert summary.loc["VT", "count"] == 3
+        assert summary.loc["VT", "high"] == 120.0
+        assert summary.loc["VT", "low"] == 90.0
+        assert cache.daily(["VT"], start="2026-01-01")["close"].tolist() == [120.0]
+
+    def test_sync_detects_same_size_edit(self, cache, tmp_path):
+        """Test that an edit in the middle of the file that keeps its size still invalidates the year"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([(f"2026-01-{day:02d}T21:00:00", "VT", 100.0 + day) for day in range(1, 29)], data_file)
+        cache.sync(tmp_path)
+        stat = data_file.stat()
+
+        data_file.write_text(
+            data_file.read_text().replace("2026-01-02T21:00:00,VT,102.0", "2026-01-02T21:00:00,VT,944.9")
+        )
+        os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert data_file.stat().st_size == stat.st_size
+        assert cache.sync(tmp_path) == 28
+        assert cache.summary().loc["VT", "high"] == 944.9
+
+    def test_sync_rebuilds_days_shared_across_files(self, cache, tmp_path):
+        """Test that editing either file of a day split across yearly files keeps that day's bar exact"""
+        old_file, new_file = tmp_path / "2025.csv", tmp_path / "2026.csv"
+        append_rows([("2025-12-31T21:00:00", "VT", 90.0), ("2026-01-02T15:00:00", "VT", 100.0)], old_file)
+        append_rows([("2026-01-02T21:00:00", "VT", 101.0), ("2026-01-05T21:00:00", "VT", 102.0)], new_file)
+        cache.sync(tmp_path)
+
+        for data_file, old, new in ((old_file, "100.0", "110.0"), (new_file, "102.0", "103.0")):
+            stat = data_file.stat()
+            data_file.write_text(data_file.read_text().replace(old, new))
+            os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            cache.sync(tmp_path)
+
+            bars = cache.daily(["VT"])
+            assert bars["count"].tolist() == [1, 2, 1]
+            assert cache.summary().loc["VT", "count"] == 4
+
+        assert bars[["open", "high", "close"]].values.tolist() == [
+            [90.0, 90.0, 90.0],
+            [110.0, 110.0, 101.0],
+            [103.0] * 3,
+        ]
+        assert cache.summary().loc["VT", "last_price"] == 103.0
+
+    def test_sync_reads_only_appended_bytes(self, cache, tmp_path):
+        """Test that an append parses just the new rows"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([(f"2026-01-05T{hour:02d}:00:00", "VT", float(hour)) for hour in range(10, 20)], data_file)
+        cache.sync(tmp_path)
+        append_rows([("2026-01-06T10:00:00", "VT", 1.0)], data_file)
+
+        with patch("merkato.rollups._parse_rows", wraps=_parse_rows) as mock_parse:
+            assert cache.sync(tmp_path) == 1
+
+        assert mock_parse.call_args[0][0] == b"2026-01-06T10:00:00,VT,1.0\n"
+
+    def test_sync_skips_unchanged_files(self, cache, tmp_path):
+        """Test that a file with the same size and modification time is not read again"""
+        append_rows([("2026-01-05T15:00:00", "VT", 100.0)], tmp_path / "2026.csv")
+        cache.sync(tmp_path)
+
+        with patch("merkato.rollups._fingerprint") as mock_fingerprint:
+            assert cache.sync(tmp_path) == 0
+
+        mock_fingerprint.assert_not_called()
+
+
+class TestLastRecords:
+    def test_tail_records(self, tmp_path):
+        """Test that the last row per symbol is found across block and year boundaries, ignoring a torn row"""
+        append_rows([("2025-12-31T21:00:00", "GOOG", 300.0)], tmp_path / "2025.csv")
+        data_file = tmp_path / "2026.csv"
+        append_rows([(f"2026-01-05T{hour:02d}:00:00", "VT", float(hour)) for hour in range(10, 20)], data_file)
+        with open(data_file, "a") as f:
+            f.write("2026-01-05T20:00:00,VT,99")
+
+        with patch("merkato.rollups.TAIL_BYTES", 50):
+            records = tail_records(tmp_path, ["VT", "GOOG", "MSFT"])
+
+        assert records == {
+            "VT": (datetime(2026, 1, 5, 19), 19.0),
+            "GOOG": (datetime(2025, 12, 31, 21), 300.0),
+        }
+
+    def test_cold_cache_reads_tail_only(self, tmp_path):
+        """Test that a cold rollup cache answers from the file tail without ingesting the history"""
+        append_rows([(f"2026-01-{day:02d}T21:00:00", "VT", float(day)) for day in range(1, 29)], tmp_path / "2026.csv")
+        config = {"storage": {"backend": "csv", "root": str(tmp_path), "rollups": str(tmp_path / "rollups.sqlite")}}
+
+        with patch.object(RollupCache, "sync") as mock_sync:
+            records = load_last_records(config, ["VT"])
+
+        assert records == {"VT": (datetime(2026, 1, 28, 21), 28.0)}
+        mock_sync.assert_not_called()
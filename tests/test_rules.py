@@ -0,0 +1,184 @@
+from datetime import date
+
+import numpy as np
+
+from merkato.rollups import RollupCache
+from merkato.rules import Rule, RuleSet, Thresholds, load_history, parse_rules
+
+TODAY = date(2026, 1, 14)
+
+
+def fired_ids(fired, symbol):
+    return sorted(rule.id for rule, _ in fired.get(symbol, []))
+
+
+def history(closes, first="2026-01-01"):
+    days = np.arange(np.datetime64(first), np.datetime64(first) + len(closes))
+    return days, np.array(closes, dtype=float)
+
+
+class TestParseRules:
+    def test_legacy_target(self):
+        """Test that target_price/operator becomes a price rule with the legacy state key"""
+        (rule,) = parse_rules({"symbol": "AAPL", "target_price": 100.0, "operator": ">"})
+
+        assert (rule.kind, rule.operator, rule.value) == ("price", ">", 100.0)
+        assert rule.id == "AAPL|>|100.0"
+
+    def test_rules_list_and_options(self):
+        """Test parsing every rule type, with stock and rule level alert options"""
+        stock = {
+            "symbol": "AAPL",
+            "cooldown": 60,
+            "rules": [
+                {"type": "price", "operator": ">=", "value": 200},
+                {"type": "change", "days": 5, "operator": "<=", "percent": -5, "cooldown": 0},
+                {"type": "range", "low": 90, "high": 110},
+                {"type": "ma_cross", "window": 50, "direction": "below"},
+            ],
+        }
+
+        rules = parse_rules(stock)
+
+        assert [rule.kind for rule in rules] == ["price", "change", "range", "ma_cross"]
+        assert rules[0].options == {"cooldown": 60}
+        assert rules[1].options == {"cooldown": 0}
+        assert rules[1].id == "AAPL|change|5d|<=|-5.0"
+
+    def test_invalid_rule_skipped(self, capsys):
+        """Test that an invalid rule is reported and skipped"""
+        rules = parse_rules({"symbol": "AAPL", "rules": [{"type": "change", "percent": -5}, {"type": "nope"}]})
+
+        assert rules == []
+        assert "'days' must be a positive integer" in capsys.readouterr().out
+
+
+class TestThresholds:
+    def test_matches_all_operators(self):
+        """Test that binary search returns exactly the thresholds met by a value"""
+        rules = [Rule("X", "price", operator, value) for operator in ("<", "<=", ">", ">=") for value in (90, 100, 110)]
+
+        matched = {(rule.operator, rule.value) for rule in Thresholds(rules).matches(100.0)}
+
+        assert matched == {("<", 110), ("<=", 100), ("<=", 110), (">", 90), (">=", 90), (">=", 100)}
+
+    def test_matches_brute_force(self):
+        """Test the compiled thresholds against evaluating every rule"""
+        rng = np.random.default_rng(0)
+        compare = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
+        rules = [
+            Rule("X", "price", operator, float(value))
+            for operator, value in zip(rng.choice(list(compare), 500), rng.integers(0, 100, 500))
+        ]
+        thresholds = Thresholds(rules)
+
+        for x in rng.integers(-5, 105, 50).astype(float):
+            expected = sorted(id(rule) for rule in rules if compare[rule.operator](x, rule.value))
+            assert sorted(id(rule) for rule in thresholds.matches(x)) == expected
+
+
+class TestRuleSet:
+    def test_price_and_range_rules(self):
+        """Test price thresholds and inside/outside ranges"""
+        rules = RuleSet(
+            [
+                {"symbol": "AAPL", "target_price": 100.0},
+                {
+                    "symbol": "AAPL",
+                    "rules": [
+                        {"type": "range", "low": 90, "high": 96},
+                        {"type": "range", "low": 96, "high": 99},
+                        {"type": "range", "low": 80, "high": 120, "outside": True},
+                    ],
+                },
+            ]
+        )
+
+        fired = rules.evaluate({"AAPL": 95.0, "VT": 10.0}, TODAY)
+
+        assert fired_ids(fired, "AAPL") == ["AAPL|<=|100.0", "AAPL|inside|90.0|96.0"]
+        assert "VT" not in fired
+        assert fired_ids(rules.evaluate({"AAPL": 130.0}, TODAY), "AAPL") == ["AAPL|outside|80.0|120.0"]
+
+    def test_change_rule_uses_close_days_ago(self):
+        """Test that percent moves compare with the last close on or before N days ago"""
+        rules = RuleSet(
+            [
+                {
+                    "symbol": "AAPL",
+                    "rules": [
+                        {"type": "change", "days": 7, "operator": "<=", "percent": -5},
+                        {"type": "change", "days": 7, "operator": "<=", "percent": -15},
+                    ],
+                }
+            ]
+        )
+        # Close on 2026-01-07 (7 days before TODAY) is 100
+        closes = history([110, 110, 110, 110, 110, 110, 100, 105, 104, 103, 102, 101, 100])
+
+        fired = rules.evaluate({"AAPL": 94.0}, TODAY, {"AAPL": closes})
+
+        assert fired_ids(fired, "AAPL") == ["AAPL|change|7d|<=|-5.0"]
+        assert "-6.00%" in fired["AAPL"][0][1]
+        assert rules.evaluate({"AAPL": 94.0}, TODAY) == {}
+
+    def test_moving_average_cross(self):
+        """Test that a cross fires only when the previous price was on the other side"""
+        rules = RuleSet([{"symbol": "AAPL", "rules": [{"type": "ma_cross", "window": 3, "direction": "above"}]}])
+        closes = {"AAPL": history([100, 100, 100, 100])}
+
+        crossed = rules.evaluate({"AAPL": 101.0}, TODAY, closes, {"AAPL": (None, 99.0)})
+        stayed = rules.evaluate({"AAPL": 102.0}, TODAY, closes, {"AAPL": (None, 101.0)})
+
+        assert fired_ids(crossed, "AAPL") == ["AAPL|ma3|above"]
+        assert stayed == {}
+
+    def test_conditions_in_quote_currency(self):
+        """Test that thresholds and averages of a non-USD symbol are described in its own currency"""
+        rules = RuleSet(
+            [
+                {
+                    "symbol": "NESN.SW",
+                    "target_price": 150.0,
+                    "rules": [
+                        {"type": "range", "low": 90, "high": 120},
+                        {"type": "ma_cross", "window": 3, "direction": "above"},
+                    ],
+                }
+            ]
+        )
+
+        fired = rules.evaluate(
+            {"NESN.SW": 101.0}, TODAY, {"NESN.SW": history([100, 100, 100])}, {"NESN.SW": (None, 99.0)}
+        )
+
+        assert sorted(condition for _, condition in fired["NESN.SW"]) == [
+            "<= CHF 150.00",
+            "crossed above 3-day average (CHF 100.00)",
+            "inside CHF 90.00-CHF 120.00",
+        ]
+
+    def test_lookback(self):
+        """Test that only change and moving average rules need history"""
+        assert not RuleSet([{"symbol": "AAPL", "target_price": 1.0}]).needs_history
+        rules = RuleSet([{"symbol": "AAPL", "rules": [{"type": "change", "days": 30, "percent": 5}]}])
+        assert rules.lookback == 37
+
+
+class TestLoadHistory:
+    def test_reads_daily_closes(self, tmp_path):
+        """Test reading closes before today from the rollup cache"""
+        with RollupCache(tmp_path / "rollups.sqlite") as cache:
+            cache.record(
+                [
+                    ("2026-01-12T15:00:00", "AAPL", 100.0),
+                    ("2026-01-12T20:00:00", "AAPL", 101.0),
+                    ("2026-01-13T20:00:00", "AAPL", 102.0),
+                    ("2026-01-14T15:00:00", "AAPL", 103.0),
+                ]
+            )
+
+            days, closes = load_history(cache, ["AAPL"], TODAY, 7)["AAPL"]
+
+        assert list(days.astype(str)) == ["2026-01-12", "2026-01-13"]
+        assert list(closes) == [101.0, 102.0]
@@ -1,14 +1,22 @@
+from datetime import datetime
 from unittest.mock import patch
+from zoneinfo import ZoneInfo
 
+import numpy as np
 import pandas as pd
 
+from merkato.fetch import FetchResult
 from merkato.stock_monitor import (
     check_and_record_prices,
+    drop_unchanged_closes,
     get_stock_price,
-    save_data,
+    get_stock_prices,
+    select_due_stocks,
     send_price_alerts,
 )
 
+NEW_YORK = ZoneInfo("America/New_York")
+
 
 class TestStockMonitor:
     @patch("merkato.stock_monitor.yf.Ticker")
@@ -41,31 +49,50 @@ class TestStockMonitor:
 
         assert price is None
 
-    def test_save_data(self, tmp_path):
-        """Test saving data to CSV"""
-        data_file = tmp_path / "test_data.csv"
+    @patch("merkato.stock_monitor.yf.download")
+    def test_get_stock_prices_batch(self, mock_download):
+        """Test bulk price fetching returns prices and per-symbol failures"""
+        columns = pd.MultiIndex.from_product([["Close", "Open"], ["AAPL", "MSFT", "BAD"]], names=["Price", "Ticker"])
+        mock_download.return_value = pd.DataFrame(
+            [[150.0, 300.0, None, 149.0, 299.0, None], [151.0, 301.0, None, 150.0, 300.0, None]],
+            columns=columns,
+        )
+
+        prices, failures = get_stock_prices(["AAPL", "MSFT", "BAD", "AAPL"])
+
+        assert prices == {"AAPL": 151.0, "MSFT": 301.0}
+        assert list(failures) == ["BAD"]
+        mock_download.assert_called_once()
+        assert mock_download.call_args[0][0] == ["AAPL", "MSFT", "BAD"]
 
-        df = pd.DataFrame({"timestamp": ["2024-01-01 12:00:00"], "symbol": ["AAPL"], "price": [150.0]})
+    @patch("merkato.stock_monitor.yf.download")
+    def test_get_stock_prices_chunked(self, mock_download):
+        """Test that a failing chunk does not abort the remaining chunks"""
+        columns = pd.MultiIndex.from_product([["Close"], ["MSFT"]], names=["Price", "Ticker"])
+        mock_download.side_effect = [Exception("API Error"), pd.DataFrame([[300.0]], columns=columns)]
 
-        with patch("merkato.stock_monitor.get_data_file", return_value=str(data_file)):
-            save_data(df)
+        prices, failures = get_stock_prices(["AAPL", "MSFT"], batch_size=1)
 
-            # Verify file was created and contains correct data
-            assert data_file.exists()
-            loaded_df = pd.read_csv(data_file)
-            assert len(loaded_df) == 1
-            assert loaded_df.iloc[0]["symbol"] == "AAPL"
+        assert prices == {"MSFT": 300.0}
+        assert failures == {"AAPL": "API Error"}
+        assert mock_download.call_count == 2
 
-    @patch("merkato.stock_monitor.get_stock_price")
-    @patch("merkato.stock_monitor.load_or_create_data")
-    @patch("merkato.stock_monitor.save_data")
-    def test_check_and_record_prices_with_alert(self, mock_save, mock_load, mock_get_price):
+    @patch("merkato.stock_monitor.get_stock_prices")
+    @patch("merkato.stock_monitor.get_store")
+    @patch("merkato.stock_monitor.update_rollups")
+    @patch("merkato.stock_monitor.load_last_records", return_value={})
+    def test_check_and_record_prices_with_alert(
+        self, mock_last, mock_update_rollups, mock_get_store, mock_get_price, tmp_path
+    ):
         """Test checking prices and triggering alerts"""
         # Setup
-        mock_load.return_value = pd.DataFrame(columns=["timestamp", "symbol", "price"])
-        mock_get_price.return_value = 95.0  # Below target
+        mock_get_price.return_value = ({"AAPL": 95.0}, {})  # Below target
 
-        config = {"stocks": [{"symbol": "AAPL", "target_price": 100.0}]}
+        config = {
+            "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+            "cache": {"enabled": False},
+            "stocks": [{"symbol": "AAPL", "target_price": 100.0}],
+        }
 
         # Execute
         alerts = check_and_record_prices(config)
@@ -75,28 +102,94 @@ class TestStockMonitor:
         assert alerts[0]["symbol"] == "AAPL"
         assert alerts[0]["current_price"] == 95.0
         assert alerts[0]["target_price"] == 100.0
-        mock_save.assert_called_once()
+        mock_get_store.return_value.append.assert_called_once()
+        rows = mock_get_store.return_value.append.call_args[0][0]
+        assert [(symbol, price) for _, symbol, price in rows] == [("AAPL", 95.0)]
+        mock_update_rollups.assert_called_once_with(config, mock_get_store.return_value, rows)
 
-    @patch("merkato.stock_monitor.get_stock_price")
-    @patch("merkato.stock_monitor.load_or_create_data")
-    @patch("merkato.stock_monitor.save_data")
-    def test_check_and_record_prices_no_alert(self, mock_save, mock_load, mock_get_price):
+    @patch("merkato.stock_monitor.get_stock_prices")
+    @patch("merkato.stock_monitor.get_store")
+    @patch("merkato.stock_monitor.update_rollups")
+    @patch("merkato.stock_monitor.load_last_records", return_value={})
+    def test_check_and_record_prices_no_alert(
+        self, mock_last, mock_update_rollups, mock_get_store, mock_get_price, tmp_path
+    ):
         """Test checking prices without triggering alerts"""
         # Setup
-        mock_load.return_value = pd.DataFrame(columns=["timestamp", "symbol", "price"])
-        mock_get_price.return_value = 105.0  # Above target
+        mock_get_price.return_value = ({"AAPL": 105.0}, {})  # Above target
 
-        config = {"stocks": [{"symbol": "AAPL", "target_price": 100.0}]}
+        config = {
+            "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+            "cache": {"enabled": False},
+            "stocks": [{"symbol": "AAPL", "target_price": 100.0}],
+        }
 
         # Execute
         alerts = check_and_record_prices(config)
 
         # Verify
         assert len(alerts) == 0
-        mock_save.assert_called_once()
+        mock_get_store.return_value.append.assert_called_once()
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    @patch("merkato.stock_monitor.get_store")
+    @patch("merkato.stock_monitor.update_rollups")
+    def test_check_and_record_prices_all_skipped(self, mock_update_rollups, mock_get_store, mock_get_price, tmp_path):
+        """Test that a run whose every close is unchanged records nothing but still saves the alert state"""
+        mock_get_price.return_value = ({"AAPL": 250.0}, {})
+        last = datetime(2026, 12, 31, 15, 0, tzinfo=NEW_YORK)
+        config = {
+            "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+            "cache": {"enabled": False},
+            "stocks": [{"symbol": "AAPL", "target_price": 100.0}],
+        }
+
+        with (
+            patch("merkato.stock_monitor.load_last_records", return_value={"AAPL": (last, 250.0)}),
+            patch("merkato.stock_monitor.datetime") as mock_datetime,
+        ):
+            # New Year's Day 2027 is a Friday and a NYSE holiday
+            mock_datetime.now.return_value = datetime(2027, 1, 1, 16, 0, tzinfo=NEW_YORK)
+            alerts = check_and_record_prices(config)
+
+        assert alerts == []
+        mock_get_store.return_value.append.assert_not_called()
+        mock_update_rollups.assert_not_called()
+        assert (tmp_path / "alert_state.json").exists()
+
+    @patch("merkato.stock_monitor.get_stock_prices")
+    @patch("merkato.stock_monitor.get_store")
+    @patch("merkato.stock_monitor.update_rollups")
+    @patch("merkato.stock_monitor.load_last_records", return_value={})
+    @patch("merkato.stock_monitor.load_rule_history")
+    def test_check_and_record_prices_rules(
+        self, mock_history, mock_last, mock_update_rollups, mock_get_store, mock_get_price, tmp_path
+    ):
+        """Test that every rule of a stock is evaluated, with history for change rules"""
+        mock_get_price.return_value = ({"AAPL": 95.0}, {})
+        mock_history.return_value = {"AAPL": (np.array(["2026-01-01"], dtype="datetime64[D]"), np.array([100.0]))}
+        config = {
+            "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+            "cache": {"enabled": False},
+            "stocks": [
+                {
+                    "symbol": "AAPL",
+                    "rules": [
+                        {"type": "range", "low": 90, "high": 96},
+                        {"type": "price", "operator": ">=", "value": 120},
+                        {"type": "change", "days": 1, "operator": "<=", "percent": -5},
+                    ],
+                }
+            ],
+        }
+
+        alerts = check_and_record_prices(config)
 
-    @patch("merkato.stock_monitor.send_email")
-    def test_send_price_alerts(self, mock_send_email):
+        assert [alert["condition"] for alert in alerts] == ["inside $90.00-$96.00", "1-day change <= -5.00% (-5.00%)"]
+        assert mock_history.call_args[0][2] == ["AAPL"]
+
+    @patch("merkato.stock_monitor.queue_email")
+    def test_send_price_alerts(self, mock_queue_email):
         """Test sending price alert emails"""
         alerts = [
             {"symbol": "AAPL", "current_price": 95.0, "target_price": 100.0},
@@ -107,19 +200,120 @@ class TestStockMonitor:
 
         send_price_alerts(alerts, config)
 
-        mock_send_email.assert_called_once()
-        call_args = mock_send_email.call_args
+        mock_queue_email.assert_called_once()
+        call_args = mock_queue_email.call_args
         assert call_args[0][0] == "🎯 Stock Price Alert!"
         assert "AAPL" in call_args[0][1]
         assert "GOOGL" in call_args[0][1]
         assert "$95.00" in call_args[0][1]
 
-    @patch("merkato.stock_monitor.send_email")
-    def test_send_price_alerts_no_alerts(self, mock_send_email):
+    @patch("merkato.stock_monitor.get_stock_prices")
+    @patch("merkato.stock_monitor.get_store")
+    @patch("merkato.stock_monitor.update_rollups")
+    @patch("merkato.stock_monitor.load_last_records", return_value={})
+    def test_check_and_record_prices_portfolios(
+        self, mock_last, mock_update_rollups, mock_get_store, mock_get_price, tmp_path
+    ):
+        """Test that portfolios share one fetch and one recorded row per symbol"""
+        mock_get_price.return_value = ({"AAPL": 95.0}, {})
+        config = {
+            "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+            "cache": {"enabled": False},
+            "stocks": [{"symbol": "AAPL", "target_price": 100.0}],
+            "portfolios": [
+                {
+                    "name": "tech",
+                    "recipients": ["tech@example.com"],
+                    "stocks": [{"symbol": "AAPL", "target_price": 100.0}],
+                }
+            ],
+        }
+
+        alerts = check_and_record_prices(config)
+
+        assert mock_get_price.call_args[0][0] == ["AAPL"]
+        assert len(mock_get_store.return_value.append.call_args[0][0]) == 1
+        assert [(alert["portfolio"], alert["rule"]) for alert in alerts] == [
+            (None, "AAPL|<=|100.0"),
+            ("tech", "AAPL|<=|100.0|@tech"),
+        ]
+
+    @patch("merkato.stock_monitor.queue_email")
+    @patch("merkato.stock_monitor.get_stock_prices")
+    @patch("merkato.stock_monitor.get_store")
+    @patch("merkato.stock_monitor.update_rollups")
+    @patch("merkato.stock_monitor.load_last_records", return_value={})
+    def test_check_and_record_prices_reporting_currency(
+        self, mock_last, mock_update_rollups, mock_get_store, mock_get_price, mock_queue_email, tmp_path
+    ):
+        """Test that alerts of CHF listings carry their USD price and the native currency is stored"""
+        quotes = {"CHSPI.SW": 95.0, "CHFUSD=X": 1.25}
+        mock_get_price.side_effect = lambda symbols, timeout: ({s: quotes[s] for s in symbols}, {})
+        config = {
+            "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+            "cache": {"enabled": False},
+            "fx": {"currency": "USD"},
+            "stocks": [{"symbol": "CHSPI.SW", "target_price": 100.0}],
+        }
+
+        alerts = check_and_record_prices(config)
+        send_price_alerts(alerts, config)
+
+        assert alerts[0]["currency"] == "CHF"
+        assert (alerts[0]["reporting_price"], alerts[0]["reporting_currency"]) == (118.75, "USD")
+        mock_get_store.return_value.record_currencies.assert_called_once_with({"CHSPI.SW": "CHF"})
+        assert "CHF 95.00 ($118.75)" in mock_queue_email.call_args[0][1]
+        assert "(Target: <= CHF 100.00)" in mock_queue_email.call_args[0][1]
+
+    @patch("merkato.stock_monitor.queue_email")
+    def test_send_price_alerts_per_portfolio(self, mock_queue_email):
+        """Test that each portfolio's alerts go to its own recipients"""
+        alerts = [
+            {"symbol": "AAPL", "current_price": 95.0, "target_price": 100.0, "portfolio": None},
+            {"symbol": "VT", "current_price": 140.0, "target_price": 150.0, "portfolio": "etf"},
+        ]
+        config = {"portfolios": [{"name": "etf", "recipients": ["a@example.com", "b@example.com"], "stocks": []}]}
+
+        send_price_alerts(alerts, config)
+
+        calls = [(c[0][0], c[0][3] if len(c[0]) > 3 else None) for c in mock_queue_email.call_args_list]
+        assert calls == [
+            ("🎯 Stock Price Alert!", None),
+            ("🎯 Stock Price Alert: etf", "a@example.com"),
+            ("🎯 Stock Price Alert: etf", "b@example.com"),
+        ]
+        assert "VT" not in mock_queue_email.call_args_list[0][0][1]
+
+    @patch("merkato.stock_monitor.queue_email")
+    def test_send_price_alerts_no_alerts(self, mock_queue_email):
         """Test that no email is sent when there are no alerts"""
         alerts = []
         config = {"email": {"sender": "test@example.com"}}
 
         send_price_alerts(alerts, config)
 
-        mock_send_email.assert_not_called()
+        mock_queue_email.assert_not_called()
+
+    def test_select_due_stocks_skips_closed_markets(self):
+        """Test that closed markets are skipped once their close was recorded"""
+        stocks = [{"symbol": "AAPL"}, {"symbol": "CHSPI.SW"}, {"symbol": "NEW"}]
+        now = datetime(2026, 1, 7, 14, 0, tzinfo=NEW_YORK)  # NYSE open, SIX closed
+        last_records = {
+            "AAPL": (datetime(2026, 1, 7, 13, 0, tzinfo=NEW_YORK), 250.0),
+            "CHSPI.SW": (datetime(2026, 1, 7, 12, 0, tzinfo=NEW_YORK), 160.0),
+        }
+
+        due = select_due_stocks(stocks, {}, now, last_records)
+
+        assert [stock["symbol"] for stock in due] == ["AAPL", "NEW"]
+
+    def test_drop_unchanged_closes(self):
+        """Test that unchanged prices of closed markets are not recorded again"""
+        stocks = [{"symbol": "AAPL"}, {"symbol": "VT"}]
+        now = datetime(2026, 1, 10, 12, 0, tzinfo=NEW_YORK)  # Saturday
+        results = {"AAPL": FetchResult("AAPL", price=250.0), "VT": FetchResult("VT", price=141.0)}
+        last_records = {"AAPL": (now, 250.0), "VT": (now, 140.0)}
+
+        kept = drop_unchanged_closes(stocks, results, {}, now, last_records)
+
+        assert list(kept) == ["VT"]
@@ -0,0 +1,212 @@
+import pandas as pd
+import pytest
+
+from merkato.storage import CsvStore, TickStore, get_store, main
+
+ROWS = [
+    ("2025-12-31T21:00:00", "VT", 140.0),
+    ("2025-12-31T21:00:00", "AAPL", 250.0),
+    ("2026-01-02T21:00:00", "VT", 141.0),
+    ("2026-01-02T21:00:00", "AAPL", 251.0),
+    ("2026-01-05T21:00:00", "VT", 142.0),
+]
+
+
+class TestCsvStore:
+    def test_append_splits_by_year(self, tmp_path):
+        """Test that rows land in the file of their own year"""
+        store = CsvStore(tmp_path)
+
+        assert store.append(ROWS) == 5
+
+        assert len(pd.read_csv(tmp_path / "2025.csv")) == 2
+        assert len(pd.read_csv(tmp_path / "2026.csv")) == 3
+
+    def test_read_filters_and_types(self, tmp_path):
+        """Test reading a time range and symbol subset across years"""
+        store = CsvStore(tmp_path)
+        store.append(ROWS)
+
+        df = store.read(["VT"], start="2025-12-31", end="2026-01-05")
+
+        assert df["price"].tolist() == [140.0, 141.0]
+        assert str(df["timestamp"].dtype) == "datetime64[us]"
+        assert isinstance(df["symbol"].dtype, pd.CategoricalDtype)
+
+    def test_merge_keeps_files_sorted(self, tmp_path):
+        """Test that merged rows are inserted in time order and duplicates are skipped"""
+        store = CsvStore(tmp_path)
+        store.append([ROWS[0], ROWS[4]])
+
+        assert store.merge(ROWS) == 3
+
+        df = store.read()
+        assert df["timestamp"].is_monotonic_increasing
+        assert len(df) == 5
+
+    def test_read_empty(self, tmp_path):
+        """Test reading from an empty store"""
+        df = CsvStore(tmp_path).read()
+
+        assert df.empty
+        assert list(df.columns) == ["timestamp", "symbol", "price"]
+
+
+class TestParquetStore:
+    @pytest.fixture
+    def store(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        from merkato.storage import ParquetStore
+
+        return ParquetStore(tmp_path / "parquet")
+
+    def test_append_partitions_by_year_and_symbol(self, store):
+        """Test the hive partition layout"""
+        store.append(ROWS)
+
+        partitions = sorted(str(path.relative_to(store.root)) for path in store.root.glob("year=*/symbol=*"))
+        assert partitions == [
+            "year=2025/symbol=AAPL",
+            "year=2025/symbol=VT",
+            "year=2026/symbol=AAPL",
+            "year=2026/symbol=VT",
+        ]
+
+    def test_read_matches_csv(self, store, tmp_path):
+        """Test that both backends return identical typed frames"""
+        csv_store = CsvStore(tmp_path / "csv")
+        csv_store.append(ROWS)
+        store.append(ROWS)
+
+        expected = csv_store.read(["VT", "AAPL"], start="2026-01-01", end="2026-01-06")
+        actual = store.read(["VT", "AAPL"], start="2026-01-01", end="2026-01-06")
+
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_compact(self, store):
+        """Test that per-tick files are merged without losing rows"""
+        for row in ROWS:
+            store.append([row])
+
+        assert store.compact() == 1
+
+        assert all(len(list(path.glob("*.parquet"))) == 1 for path in store.root.glob("year=*/symbol=*"))
+        assert store.read()["price"].tolist() == [250.0, 140.0, 251.0, 141.0, 142.0]
+
+    def test_append_keeps_file_count_bounded(self, store):
+        """Test that repeated appends compact a partition once it holds too many files"""
+        store.max_files = 4
+        for minute in range(30):
+            store.append([(f"2026-01-05T10:{minute:02d}:00", "VT", 100.0 + minute)])
+
+            assert len(list(store.root.glob("year=2026/symbol=VT/*.parquet"))) <= 4
+
+        assert store.read()["price"].tolist() == [100.0 + minute for minute in range(30)]
+
+    def test_merge_skips_stored_rows(self, store):
+        """Test that only rows not stored yet are written"""
+        store.append(ROWS[:2])
+
+        assert store.merge(ROWS) == 3
+        assert store.merge(ROWS) == 0
+        assert len(store.read()) == 5
+
+    def test_migrate_command(self, store, tmp_path):
+        """Test the one-shot CSV to Parquet migration"""
+        CsvStore(tmp_path / "csv").append(ROWS)
+
+        main(["--source", str(tmp_path / "csv"), "--dest", str(store.root)])
+
+        assert len(store.read()) == 5
+        with pytest.raises(SystemExit):
+            main(["--source", str(tmp_path / "csv"), "--dest", str(store.root)])
+
+
+class TestTickStore:
+    def test_read_matches_csv(self, tmp_path):
+        """Test that the tick store returns the same typed frames as the CSV files"""
+        csv_store, store = CsvStore(tmp_path / "csv"), TickStore(tmp_path / "ticks")
+        csv_store.append(ROWS)
+        store.append(ROWS)
+
+        for symbols, start, end in [
+            (None, None, None),
+            (["VT"], "2025-12-31", "2026-01-05"),
+            (["AAPL"], "2026-01-01", None),
+        ]:
+            pd.testing.assert_frame_equal(store.read(symbols, start, end), csv_store.read(symbols, start, end))
+
+    def test_fixed_width_records(self, tmp_path):
+        """Test the binary layout and the symbol sidecar"""
+        store = TickStore(tmp_path)
+        store.append(ROWS)
+
+        assert (tmp_path / "symbols.txt").read_text() == "VT\nAAPL\n"
+        assert (tmp_path / "2026.ticks").stat().st_size == 3 * 20
+        assert store.mmap(2026)["symbol"].tolist() == [0, 1, 0]
+
+    def test_out_of_order_append_merges(self, tmp_path):
+        """Test that appending older rows keeps the file sorted and skips duplicates"""
+        store = TickStore(tmp_path)
+        store.append(ROWS[2:])
+
+        assert store.append(ROWS) == 2
+
+        df = store.read()
+        assert df["timestamp"].is_monotonic_increasing
+        assert len(df) == 5
+
+    def test_torn_record_ignored(self, tmp_path):
+        """Test that a partially written record is ignored and overwritten by the next append"""
+        store = TickStore(tmp_path)
+        store.append(ROWS[2:4])
+        with open(tmp_path / "2026.ticks", "ab") as f:
+            f.write(b"\x00" * 7)
+
+        assert len(store.read()) == 2
+        store.append(ROWS[4:])
+        assert store.read()["price"].tolist() == [251.0, 141.0, 142.0]
+
+    def test_migrate_command(self, tmp_path):
+        """Test converting the CSV files into the tick store"""
+        CsvStore(tmp_path / "csv").append(ROWS)
+
+        main(["--source", str(tmp_path / "csv"), "--backend", "ticks", "--dest", str(tmp_path / "ticks")])
+
+        assert len(TickStore(tmp_path / "ticks").read()) == 5
+
+
+class TestCurrencies:
+    def test_record_currencies(self, tmp_path):
+        """Test that the currency sidecar merges new symbols and is only rewritten on changes"""
+        store = TickStore(tmp_path)
+        store.record_currencies({"VT": "USD", "CHSPI.SW": "CHF"})
+        written = store.currencies_path.stat().st_mtime_ns
+
+        store.record_currencies({"VT": "USD"})
+        assert store.currencies_path.stat().st_mtime_ns == written
+
+        store.record_currencies({"VOD.L": "GBp"})
+        assert store.currencies() == {"CHSPI.SW": "CHF", "VOD.L": "GBp", "VT": "USD"}
+
+    def test_migrate_keeps_currencies(self, tmp_path):
+        """Test that migrating the CSV files carries their currencies over"""
+        source = CsvStore(tmp_path / "csv")
+        source.append(ROWS)
+        source.record_currencies({"VT": "USD", "AAPL": "USD"})
+
+        main(["--source", str(tmp_path / "csv"), "--backend", "ticks", "--dest", str(tmp_path / "ticks")])
+
+        assert TickStore(tmp_path / "ticks").currencies() == {"AAPL": "USD", "VT": "USD"}
+        assert len(TickStore(tmp_path / "ticks").read()) == 5
+
+
+class TestGetStore:
+    def test_default_backend(self):
+        """Test that CSV is the default backend"""
+        assert isinstance(get_store({}), CsvStore)
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend name is rejected"""
+        with pytest.raises(ValueError, match="Unknown storage backend"):
+            get_store({"storage": {"backend": "sqlite"}})
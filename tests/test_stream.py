@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from merkato.stream import Quote, ReplayStream, StreamMonitor, StreamSettings, YahooStream
+
+ROWS = [
+    ("2026-01-07T10:00:00", "AAPL", 105.0),
+    ("2026-01-07T10:00:20", "VT", 140.0),
+    ("2026-01-07T10:00:30", "AAPL", 99.0),
+    ("2026-01-07T10:00:40", "MSFT", 400.0),
+    ("2026-01-07T10:02:00", "AAPL", 98.0),
+]
+
+
+def make_config(tmp_path, **stream):
+    return {
+        "alerts": {"state_file": str(tmp_path / "alert_state.json")},
+        "stream": {"coalesce": 0, **stream},
+        "stocks": [{"symbol": "AAPL", "target_price": 100.0}, {"symbol": "VT", "target_price": 130.0}],
+    }
+
+
+def run_monitor(config, rows, **kwargs):
+    monitor = StreamMonitor(config, ReplayStream(rows), now=lambda: datetime(2026, 1, 7, 10), **kwargs)
+    asyncio.run(monitor.run())
+    return monitor
+
+
+@patch("merkato.stream.stock_monitor.record_prices")
+@patch("merkato.stream.stock_monitor.send_price_alerts")
+class TestStreamMonitor:
+    def test_alerts_on_update(self, mock_alerts, mock_record, tmp_path):
+        """Test that an alert is sent once when a streamed price crosses its target"""
+        run_monitor(make_config(tmp_path), ROWS)
+
+        alerts = [alert for call in mock_alerts.call_args_list for alert in call[0][0]]
+        assert [alert["symbol"] for alert in alerts] == ["AAPL"]
+        assert alerts[0]["current_price"] < 100.0
+
+    def test_downsampled_batch(self, mock_alerts, mock_record, tmp_path):
+        """Test that prices are recorded at most once per record_interval, in one batch"""
+        monitor = StreamMonitor(make_config(tmp_path, record_interval=60), ReplayStream([]))
+        for timestamp, symbol, price in ROWS:
+            monitor.latest[symbol] = Quote(symbol, price, datetime.fromisoformat(timestamp))
+            monitor.evaluate()
+
+        assert asyncio.run(monitor.flush()) == 4
+        assert mock_record.call_args[0][0] == [
+            ("2026-01-07T10:00:00", "AAPL", 105.0),
+            ("2026-01-07T10:00:20", "VT", 140.0),
+            ("2026-01-07T10:00:40", "MSFT", 400.0),
+            ("2026-01-07T10:02:00", "AAPL", 98.0),
+        ]
+        assert (tmp_path / "alert_state.json").exists()
+
+    def test_flush_on_end(self, mock_alerts, mock_record, tmp_path):
+        """Test that rows still queued when the stream ends are flushed"""
+        run_monitor(make_config(tmp_path), ROWS)
+
+        mock_record.assert_called_once()
+        assert {row[1] for row in mock_record.call_args[0][0]} == {"AAPL", "VT"}
+
+    def test_coalesces_ticks(self, mock_alerts, mock_record, tmp_path):
+        """Test that a burst of ticks is evaluated once, with the latest price per symbol"""
+        monitor = StreamMonitor(make_config(tmp_path), ReplayStream(ROWS), now=lambda: datetime(2026, 1, 7, 10))
+        for row in ROWS:
+            monitor.latest[row[1]] = Quote(row[1], row[2], datetime.fromisoformat(row[0]))
+
+        with patch("merkato.stream.stock_monitor.evaluate_prices", return_value=([], [])) as mock_evaluate:
+            monitor.evaluate()
+
+        results = mock_evaluate.call_args[0][1]
+        assert {symbol: result.price for symbol, result in results.items()} == {
+            "AAPL": 98.0,
+            "VT": 140.0,
+            "MSFT": 400.0,
+        }
+
+    def test_dry_run(self, mock_alerts, mock_record, tmp_path):
+        """Test that a dry run neither records, emails nor saves alert state"""
+        run_monitor(make_config(tmp_path), ROWS, dry_run=True)
+
+        mock_alerts.assert_not_called()
+        mock_record.assert_not_called()
+        assert not (tmp_path / "alert_state.json").exists()
+
+
+class TestReplayStream:
+    def test_filters_symbols(self):
+        """Test that only subscribed symbols are replayed"""
+
+        async def collect():
+            return [quote async for quote in ReplayStream(ROWS).quotes(["VT"])]
+
+        assert asyncio.run(collect()) == [Quote("VT", 140.0, datetime(2026, 1, 7, 10, 0, 20))]
+
+    def test_from_csv(self, tmp_path):
+        """Test loading a recorded price file"""
+        path = tmp_path / "2026.csv"
+        path.write_text("timestamp,symbol,price\n" + "".join(f"{t},{s},{p}\n" for t, s, p in ROWS))
+
+        stream = ReplayStream.from_csv(path)
+
+        assert len(stream.rows) == 5
+        assert stream.rows[0][1:] == ("AAPL", 105.0)
+
+
+class TestYahooStream:
+    def test_parse(self):
+        """Test decoding a pricing message"""
+        quote = YahooStream.parse({"id": "AAPL", "price": 150.5, "time": "1767798000000"})
+
+        assert quote.symbol == "AAPL"
+        assert quote.price == 150.5
+        assert quote.when == datetime.fromtimestamp(1767798000)
+        assert YahooStream.parse({"id": "AAPL"}) is None
+
+
+class TestStreamSettings:
+    def test_unknown_key(self):
+        """Test that typos in the stream section are rejected"""
+        with pytest.raises(ValueError, match="Unknown stream settings: coalesec"):
+            StreamSettings.from_config({"stream": {"coalesec": 1}})
@@ -1,9 +1,12 @@
 import os
+import sys
+import threading
 from unittest.mock import patch
 
+import pandas as pd
 import pytest
 
-from merkato.util import load_config
+from merkato.util import append_rows, lazy_import, load_config, load_prices, merge_rows, read_csv_range
 
 
 class TestUtil:
@@ -41,3 +44,126 @@ class TestUtil:
 
         with pytest.raises(ValueError, match="Email configuration environment variables are not fully set"):
             load_config()
+
+    def test_append_rows_creates_file_with_header(self, tmp_path):
+        """Test appending to a new file writes the header once"""
+        data_file = tmp_path / "data" / "2026.csv"
+
+        written = append_rows([("2026-01-01T12:00:00", "AAPL", 150.0)], data_file)
+        written += append_rows([("2026-01-01T13:00:00", "AAPL", 151.5)], data_file)
+
+        assert written == 2
+        df = pd.read_csv(data_file)
+        assert list(df.columns) == ["timestamp", "symbol", "price"]
+        assert df["price"].tolist() == [150.0, 151.5]
+
+    def test_append_rows_keeps_existing_history(self, tmp_path):
+        """Test that appending never rewrites existing rows"""
+        data_file = tmp_path / "2026.csv"
+        data_file.write_text("timestamp,symbol,price\n2026-01-01T12:00:00,VT,141.9949951171875\n")
+
+        append_rows([("2026-01-01T13:00:00", "VT", 142.0)], data_file)
+
+        assert data_file.read_text().splitlines() == [
+            "timestamp,symbol,price",
+            "2026-01-01T12:00:00,VT,141.9949951171875",
+            "2026-01-01T13:00:00,VT,142.0",
+        ]
+
+    def test_append_rows_repairs_torn_tail(self, tmp_path):
+        """Test that a partial row from an interrupted write is dropped"""
+        data_file = tmp_path / "2026.csv"
+        data_file.write_text("timestamp,symbol,price\n2026-01-01T12:00:00,VT,141.5\n2026-01-01T13:00")
+
+        append_rows([("2026-01-01T14:00:00", "VT", 142.0)], data_file)
+
+        df = pd.read_csv(data_file)
+        assert df["timestamp"].tolist() == ["2026-01-01T12:00:00", "2026-01-01T14:00:00"]
+
+    def test_append_rows_empty(self, tmp_path):
+        """Test that no file is touched when there is nothing to write"""
+        data_file = tmp_path / "2026.csv"
+
+        assert append_rows([], data_file) == 0
+        assert not data_file.exists()
+
+    def test_merge_rows_preserves_existing_rows(self, tmp_path):
+        """Test that merging rewrites the file sorted while keeping stored rows verbatim"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([("2026-01-05T10:00:00.123456", "VT", 144.92999267578125)], data_file)
+
+        added = merge_rows(
+            [("2026-01-02T22:00:00", "VT", 140.0), ("2026-01-05T10:00:00.123456", "VT", 999.0)], data_file
+        )
+
+        assert added == 1
+        assert data_file.read_text().splitlines() == [
+            "timestamp,symbol,price",
+            "2026-01-02T22:00:00,VT,140.0",
+            "2026-01-05T10:00:00.123456,VT,144.92999267578125",
+        ]
+        assert not (tmp_path / "2026.tmp").exists()
+
+    def test_read_csv_range_bisects_sorted_file(self, tmp_path):
+        """Test that only rows inside the half-open window are returned"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([(f"2026-01-{day:02d}T21:00:00", "VT", float(day)) for day in range(1, 31)], data_file)
+
+        df = read_csv_range(data_file, start="2026-01-10T21:00:00", end="2026-01-13")
+
+        assert df["price"].tolist() == [10.0, 11.0, 12.0]
+        assert read_csv_range(data_file, end="2026-01-03")["price"].tolist() == [1.0, 2.0]
+        assert read_csv_range(data_file, start="2026-01-30T21:00:01").empty
+        assert len(read_csv_range(data_file)) == 30
+
+    def test_read_csv_range_torn_last_line(self, tmp_path):
+        """Test that a partially written last row is skipped instead of breaking the bisection"""
+        data_file = tmp_path / "2026.csv"
+        append_rows([(f"2026-01-{day:02d}T21:00:00", "VT", float(day)) for day in range(1, 31)], data_file)
+        with open(data_file, "ab") as f:
+            f.write(b"2026-01-")
+
+        assert read_csv_range(data_file, start="2026-01-29")["price"].tolist() == [29.0, 30.0]
+        assert read_csv_range(data_file, end="2026-01-03")["price"].tolist() == [1.0, 2.0]
+        assert read_csv_range(data_file, start="2026-02-01").empty
+        assert len(read_csv_range(data_file)) == 30
+
+    def test_load_prices_spans_year_boundary(self, tmp_path):
+        """Test that a window crossing New Year reads both yearly files"""
+        append_rows([("2025-12-30T21:00:00", "VT", 140.0), ("2025-12-31T21:00:00", "VT", 141.0)], tmp_path / "2025.csv")
+        append_rows(
+            [("2026-01-02T21:00:00", "VT", 142.0), ("2026-01-02T21:00:00", "GOOG", 300.0)], tmp_path / "2026.csv"
+        )
+        config = {"storage": {"backend": "csv", "root": str(tmp_path)}}
+
+        df = load_prices(["VT"], start="2025-12-31", end="2026-01-07", config=config)
+
+        assert df["price"].tolist() == [141.0, 142.0]
+        assert str(df["timestamp"].dtype) == "datetime64[us]"
+
+    def test_lazy_import_first_access_from_threads(self, tmp_path, monkeypatch):
+        """Test that threads racing on the first attribute access all see the fully imported module"""
+        (tmp_path / "slow_module.py").write_text("import time\ntime.sleep(0.2)\nVALUE = 42\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+        monkeypatch.delitem(sys.modules, "slow_module", raising=False)
+        module = lazy_import("slow_module")
+        assert "slow_module" not in sys.modules
+
+        start = threading.Barrier(4)
+        results = []
+
+        def access():
+            start.wait()
+            try:
+                results.append(module.VALUE)
+            except AttributeError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=access) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [42] * 4
+        monkeypatch.delitem(sys.modules, "slow_module")
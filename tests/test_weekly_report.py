@@ -1,9 +1,22 @@
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
+import pytest
 
-from merkato.weekly_report import calculate_weekly_trends, send_weekly_report
+from merkato.analytics import AnalyticsSettings
+from merkato.fx import Converter
+from merkato.rollups import RollupCache
+from merkato.weekly_report import (
+    calculate_analytics,
+    calculate_long_term_trends,
+    calculate_trends,
+    calculate_weekly_trends,
+    render_analytics,
+    render_long_term_trends,
+    send_weekly_report,
+)
 
 
 class TestWeeklyReport:
@@ -99,9 +112,37 @@ class TestWeeklyReport:
 
         assert trend is None
 
-    @patch("merkato.weekly_report.send_email")
-    @patch("merkato.weekly_report.load_or_create_data")
-    def test_send_weekly_report_with_data(self, mock_load_data, mock_send_email):
+    def test_calculate_trends_all_symbols(self):
+        """Test computing trends for every symbol in one pass"""
+        now = datetime.now()
+        df = pd.DataFrame(
+            {
+                "timestamp": [
+                    (now - timedelta(days=3)).isoformat(),
+                    (now - timedelta(days=10)).isoformat(),
+                    (now - timedelta(days=6)).isoformat(),
+                    (now - timedelta(days=1)).isoformat(),
+                    (now - timedelta(days=5)).isoformat(),
+                    (now - timedelta(days=2)).isoformat(),
+                ],
+                "symbol": ["AAPL", "AAPL", "AAPL", "GOOGL", "GOOGL", "MSFT"],
+                "price": [90.0, 50.0, 100.0, 160.0, 150.0, 300.0],
+            }
+        )
+
+        trends = calculate_trends(df)
+
+        assert sorted(trends.index) == ["AAPL", "GOOGL"]
+        assert trends.loc["AAPL", "start_price"] == 100.0
+        assert trends.loc["AAPL", "end_price"] == 90.0
+        assert trends.loc["AAPL", "percent_change"] == -10.0
+        assert trends.loc["AAPL", "min_price"] == 90.0
+        assert trends.loc["GOOGL", "change"] == 10.0
+
+    @patch("merkato.weekly_report.open_rollups")
+    @patch("merkato.weekly_report.queue_email")
+    @patch("merkato.weekly_report.load_prices")
+    def test_send_weekly_report_with_data(self, mock_load_data, mock_queue_email, mock_open_rollups):
         """Test sending weekly report with data"""
         now = datetime.now() + timedelta(hours=1)  # Ensure current time is ahead of data timestamps
         mock_load_data.return_value = pd.DataFrame(
@@ -119,16 +160,18 @@ class TestWeeklyReport:
 
         send_weekly_report(config)
 
-        mock_send_email.assert_called_once()
-        call_args = mock_send_email.call_args
+        mock_queue_email.assert_called_once()
+        call_args = mock_queue_email.call_args
         assert call_args[0][0] == "📊 Weekly Stock Trends Report"
         assert "AAPL" in call_args[0][1]
         assert "$100.00" in call_args[0][1]
         assert "$110.00" in call_args[0][1]
+        assert mock_load_data.call_args[0][0] == ["AAPL"]
+        assert mock_load_data.call_args[1]["start"] <= datetime.now() - timedelta(days=7)
 
-    @patch("merkato.weekly_report.send_email")
-    @patch("merkato.weekly_report.load_or_create_data")
-    def test_send_weekly_report_empty_data(self, mock_load_data, mock_send_email):
+    @patch("merkato.weekly_report.queue_email")
+    @patch("merkato.weekly_report.load_prices")
+    def test_send_weekly_report_empty_data(self, mock_load_data, mock_queue_email):
         """Test weekly report with no data"""
         mock_load_data.return_value = pd.DataFrame()
 
@@ -137,11 +180,12 @@ class TestWeeklyReport:
         send_weekly_report(config)
 
         # Should not send email when no data
-        mock_send_email.assert_not_called()
+        mock_queue_email.assert_not_called()
 
-    @patch("merkato.weekly_report.send_email")
-    @patch("merkato.weekly_report.load_or_create_data")
-    def test_send_weekly_report_multiple_stocks(self, mock_load_data, mock_send_email):
+    @patch("merkato.weekly_report.open_rollups")
+    @patch("merkato.weekly_report.queue_email")
+    @patch("merkato.weekly_report.load_prices")
+    def test_send_weekly_report_multiple_stocks(self, mock_load_data, mock_queue_email, mock_open_rollups):
         """Test weekly report with multiple stocks"""
         now = datetime.now() + timedelta(hours=1)  # Ensure current time is ahead of data timestamps
         mock_load_data.return_value = pd.DataFrame(
@@ -161,8 +205,8 @@ class TestWeeklyReport:
 
         send_weekly_report(config)
 
-        mock_send_email.assert_called_once()
-        call_args = mock_send_email.call_args
+        mock_queue_email.assert_called_once()
+        call_args = mock_queue_email.call_args
         body = call_args[0][1]
 
         # Check both stocks are in the email
@@ -170,3 +214,111 @@ class TestWeeklyReport:
         assert "GOOGL" in body
         assert "$110.00" in body  # AAPL end price
         assert "$145.00" in body  # GOOGL end price
+
+    @patch("merkato.weekly_report.open_rollups")
+    @patch("merkato.weekly_report.queue_email")
+    @patch("merkato.weekly_report.load_prices")
+    def test_send_weekly_report_portfolios(self, mock_load_data, mock_queue_email, mock_open_rollups):
+        """Test that prices are loaded once and each portfolio gets a report of its own stocks"""
+        now = datetime.now() + timedelta(hours=1)
+        mock_load_data.return_value = pd.DataFrame(
+            {
+                "timestamp": [(now - timedelta(days=7)).isoformat(), now.isoformat()] * 2,
+                "symbol": ["AAPL", "AAPL", "GOOGL", "GOOGL"],
+                "price": [100.0, 110.0, 150.0, 145.0],
+            }
+        )
+        config = {
+            "stocks": [{"symbol": "AAPL"}],
+            "portfolios": [{"name": "search", "recipients": ["s@example.com"], "stocks": [{"symbol": "GOOGL"}]}],
+        }
+
+        send_weekly_report(config)
+
+        mock_load_data.assert_called_once()
+        assert mock_load_data.call_args[0][0] == ["AAPL", "GOOGL"]
+        default, search = mock_queue_email.call_args_list
+        assert "AAPL" in default[0][1] and "GOOGL" not in default[0][1]
+        assert search[0][0] == "📊 Weekly Stock Trends Report: search"
+        assert "GOOGL" in search[0][1] and "AAPL" not in search[0][1]
+        assert search[0][3] == "s@example.com"
+
+    @patch("merkato.weekly_report.get_store")
+    @patch("merkato.weekly_report.load_converter")
+    @patch("merkato.weekly_report.open_rollups")
+    @patch("merkato.weekly_report.queue_email")
+    @patch("merkato.weekly_report.load_prices")
+    def test_send_weekly_report_reporting_currency(
+        self, mock_load_data, mock_queue_email, mock_open_rollups, mock_converter, mock_get_store
+    ):
+        """Test that prices are converted from their stored currency into the reporting currency"""
+        now = datetime.now() + timedelta(hours=1)
+        mock_load_data.return_value = pd.DataFrame(
+            {
+                "timestamp": [(now - timedelta(days=7)).isoformat(), now.isoformat()] * 2,
+                "symbol": ["CHSPI.SW", "CHSPI.SW", "CTEC.SW", "CTEC.SW"],
+                "price": [100.0, 110.0, 10.0, 12.0],
+            }
+        )
+        mock_get_store.return_value.currencies.return_value = {"CTEC.SW": "EUR"}
+        mock_converter.return_value = Converter("USD", {"CHF": 1.25})
+        config = {"stocks": [{"symbol": "CHSPI.SW"}, {"symbol": "CTEC.SW"}], "fx": {"currency": "USD"}}
+
+        send_weekly_report(config)
+
+        assert sorted(mock_converter.call_args[0][0]) == ["CHF", "EUR"]
+        body = mock_queue_email.call_args[0][1]
+        assert "$137.50" in body  # CHSPI.SW end price in USD
+        assert "▲ $12.50" in body
+        assert "€12.00" in body  # no EUR rate, stays in its stored currency
+        assert "+10.00%" in body
+
+    def test_calculate_long_term_trends(self, tmp_path):
+        """Test 30-day, YTD and 52-week windows read from the rollup cache"""
+        with RollupCache(tmp_path / "rollups.sqlite") as cache:
+            cache.record(
+                [
+                    ("2025-06-01T21:00:00", "AAPL", 80.0),
+                    ("2026-01-02T15:00:00", "AAPL", 100.0),
+                    ("2026-01-02T21:00:00", "AAPL", 102.0),
+                    ("2026-02-20T21:00:00", "AAPL", 110.0),
+                    ("2026-03-10T21:00:00", "AAPL", 121.0),
+                ]
+            )
+
+            trends = calculate_long_term_trends(cache, ["AAPL"], today="2026-03-15")
+
+        assert trends["30-Day"].loc["AAPL", "start_price"] == 110.0
+        assert trends["30-Day"].loc["AAPL", "percent_change"] == pytest.approx(10.0)
+        assert trends["YTD"].loc["AAPL", "start_price"] == 100.0
+        assert trends["52-Week"].loc["AAPL", "min_price"] == 80.0
+        assert trends["52-Week"].loc["AAPL", "max_price"] == 121.0
+
+        body = render_long_term_trends(trends, ["AAPL", "GOOGL"])
+        assert "+10.00%" in body
+        assert "$80.00" in body
+        assert "<td><strong>GOOGL</strong></td><td>–</td>" in body
+
+    def test_render_analytics(self, tmp_path):
+        """Test the analytics table and correlation matrix from rollup daily closes"""
+        rng = np.random.default_rng(3)
+        rows = []
+        for symbol in ("AAPL", "VT"):
+            prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 30)))
+            for day, price in zip(pd.date_range("2026-02-01", periods=30), prices):
+                rows.append((f"{day.date()}T21:00:00", symbol, float(price)))
+        settings = AnalyticsSettings(windows=[5])
+        with RollupCache(tmp_path / "rollups.sqlite") as cache:
+            cache.record(rows)
+            metrics, correlations = calculate_analytics(cache, ["AAPL", "VT"], settings, today="2026-03-03")
+
+        body = render_analytics(metrics, correlations, ["AAPL", "VT", "GOOGL"], settings, {"VT": "CHF"})
+
+        assert "<h3>90-Day Analytics</h3>" in body
+        assert "<th>5-Day MA</th>" in body
+        assert "CHF " in body and "GOOGL" not in body
+        assert "Correlation of Daily Returns" in body
+
+        many = render_analytics(metrics, correlations, ["AAPL", "VT"], AnalyticsSettings(windows=[5], correlations=1))
+        assert "Most Correlated Pairs" in many
+        assert "<li>AAPL / VT: " in many